@@ -0,0 +1,100 @@
+"""I/O 线程数量基准
+
+启动不同数量的子进程并全部交给共享的 IOLoop，统计运行期间的线程数、
+收到的行数和耗时，用来确认线程数量不随控制台数量增长。
+
+用法：
+    python benchmarks/bench_io_threads.py [--counts 1,10,50,200] [--lines 2000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from console_manager.io_loop import IOLoop
+
+CHILD_CODE = """
+import sys
+for i in range(int(sys.argv[1])):
+    print('line', i, flush=(i % 50 == 0))
+    if i % 10 == 0:
+        print('err', i, file=sys.stderr)
+"""
+
+
+def native_thread_count():
+    """读取进程的系统线程数（仅 Linux），其他平台返回 Python 线程数"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return threading.active_count()
+
+
+def run_case(count, lines):
+    loop = IOLoop()
+    loop.start()
+
+    received = [0]
+    lock = threading.Lock()
+    finished = threading.Event()
+    exited = [0]
+
+    def on_output(stream, data, seq, timestamp):
+        with lock:
+            received[0] += data.count(b'\n')
+
+    def on_exit(returncode):
+        with lock:
+            exited[0] += 1
+            if exited[0] == count:
+                finished.set()
+
+    started = time.perf_counter()
+    for _ in range(count):
+        process = subprocess.Popen(
+            [sys.executable, '-c', CHILD_CODE, str(lines)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL
+        )
+        loop.add_process(process, on_output, on_exit)
+
+    peak_threads = threading.active_count()
+    peak_native = native_thread_count()
+    while not finished.wait(0.05):
+        peak_threads = max(peak_threads, threading.active_count())
+        peak_native = max(peak_native, native_thread_count())
+    elapsed = time.perf_counter() - started
+    loop.stop()
+
+    return {
+        'consoles': count,
+        'python_threads': peak_threads,
+        'native_threads': peak_native,
+        'lines': received[0],
+        'seconds': round(elapsed, 3),
+        'lines_per_second': round(received[0] / elapsed) if elapsed else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counts', default='1,10,50,100,200')
+    parser.add_argument('--lines', type=int, default=2000)
+    options = parser.parse_args()
+
+    results = [run_case(int(c), options.lines) for c in options.counts.split(',')]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
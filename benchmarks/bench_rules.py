@@ -0,0 +1,193 @@
+"""输出规则基准
+
+在 I/O 线程的处理路径上（ConsoleTab.on_process_output：解码、规则匹配、
+ANSI 解析、写入回滚缓冲区）比较没有规则和配置大量规则时的吞吐量：
+  - max：不限速处理，测每秒能处理的行数和处理所用的 CPU 时间
+  - paced：按目标速率（默认 5 万行/秒）分块输入，测每秒输出占用的 CPU 时间
+控制台用真实的构造函数创建，只是不创建标签页框架，不需要 Tk 和显示器；
+标签页不显示，只测 I/O 线程这一侧。
+
+两种配置交替运行 --repeat 次，max 取 CPU 时间最短的一次，减少机器上其他负载的干扰；
+开销按 CPU 时间计算。
+
+用法：
+    python benchmarks/bench_rules.py [--rules 100] [--lines 200000] [--rate 50000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 包的 __init__ 会导入托盘（pystray），基准不用托盘，没有图形环境时使用它自带的空后端
+os.environ.setdefault('PYSTRAY_BACKEND', 'dummy')
+
+WORDS = [
+    'request', 'handled', 'user', 'id', 'ok', 'GET', '/api/v1/items', '200',
+    'latency', 'ms', 'cache', 'miss', 'worker', 'started', 'queue', 'flushed',
+]
+
+
+def make_rules(count):
+    """生成规则：字面文本、带字面文本的正则、忽略大小写的规则各占一部分"""
+    rules = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 6:
+            rules.append({'pattern': f'KEYWORD{i}', 'literal': True, 'tag': 'warning'})
+        elif kind < 9:
+            rules.append({'pattern': rf'error code \d{{3}}-{i}\b', 'tag': 'error'})
+        else:
+            rules.append({'pattern': rf'timeout{i} after \d+ ?ms', 'ignore_case': True, 'foreground': '#ff8800'})
+    # 常见的告警规则
+    rules[:3] = [
+        {'name': 'ERROR', 'pattern': r'\bERROR\b', 'tag': 'error'},
+        {'name': 'WARN', 'pattern': r'[Ww]arn(ing)?', 'tag': 'warning'},
+        {'name': 'slow', 'pattern': r'latency \d{4,}ms', 'foreground': '#ff0000'},
+    ]
+    return rules
+
+
+def make_data(lines, seed=1):
+    """生成测试输出，约 1% 的行会命中规则"""
+    rng = random.Random(seed)
+    out = []
+    for i in range(lines):
+        words = [rng.choice(WORDS) for _ in range(10)]
+        roll = rng.random()
+        if roll < 0.005:
+            words.append('ERROR')
+        elif roll < 0.01:
+            words.append(f'KEYWORD{rng.randrange(60)}')
+        out.append(f"{' '.join(words)} {i}\n")
+    return ''.join(out).encode('utf-8')
+
+
+class BenchProcess:
+    """代替子进程，on_process_output 只处理当前进程的输出"""
+
+
+class BenchApp:
+    """提供 ConsoleTab 在 I/O 线程一侧用到的主程序接口
+
+    调度器和 I/O 循环都不启动：不可见的标签页不向界面队列提交输出，
+    半行计时器在每次输入后取消。
+    """
+    def __init__(self, rule_configs):
+        from console_manager.output_dispatcher import OutputDispatcher
+        from console_manager.io_loop import IOLoop
+
+        self.scrollback_settings = {}
+        self.rule_settings = rule_configs
+        self.output_spool = None
+        self.tray_manager = None
+        self.output_dispatcher = OutputDispatcher(None)
+        self.io_loop = IOLoop()
+
+
+def make_tab(rule_configs):
+    """用真实的构造函数创建控制台，规则按全局规则配置"""
+    from console_manager.console_tab import ConsoleTab
+
+    class HeadlessTab(ConsoleTab):
+        def create_frame(self, parent):
+            return None
+
+    tab = HeadlessTab(None, 'bench', {'encoding': 'utf-8'}, BenchApp(rule_configs))
+    tab.process = BenchProcess()
+    tab.create_decoders()
+    return tab
+
+
+def feed(tab, chunks):
+    timestamp = time.time()
+    for chunk in chunks:
+        tab.on_process_output(tab.process, 'stdout', chunk, tab.next_seq(), timestamp)
+    if tab.partial_timer is not None:
+        tab.partial_timer.cancel()
+        tab.partial_timer = None
+
+
+def split_chunks(data, size=64 * 1024):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def run_max(rule_configs, data, lines):
+    tab = make_tab(rule_configs)
+    chunks = split_chunks(data)
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    feed(tab, chunks)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    return {
+        'seconds': round(elapsed, 3),
+        'cpu_seconds': round(cpu, 3),
+        'lines_per_second': int(lines / elapsed),
+    }
+
+
+def run_paced(rule_configs, data, lines, rate, tick=0.02):
+    """按目标速率每 tick 输入一块，返回处理所用 CPU 时间占墙钟时间的比例"""
+    tab = make_tab(rule_configs)
+    per_tick = max(1, int(rate * tick))
+    text_lines = data.split(b'\n')[:-1]
+    batches = [
+        b'\n'.join(text_lines[i:i + per_tick]) + b'\n'
+        for i in range(0, len(text_lines), per_tick)
+    ]
+
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    late = 0
+    for index, batch in enumerate(batches):
+        feed(tab, [batch])
+        target = wall_start + (index + 1) * tick
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            late += 1
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    return {
+        'seconds': round(wall, 3),
+        'achieved_lines_per_second': int(lines / wall),
+        'cpu_fraction': round(cpu / wall, 4),
+        'late_ticks': late,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rules', type=int, default=100)
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--rate', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data = make_data(args.lines)
+    rules = make_rules(args.rules)
+
+    modes = (('no_rules', []), ('rules', rules))
+    runs = {mode: [] for mode, _ in modes}
+    for _ in range(max(1, args.repeat)):
+        for mode, configs in modes:
+            runs[mode].append(run_max(configs, data, args.lines))
+
+    result = {'rule_count': args.rules, 'lines': args.lines, 'rate': args.rate, 'repeat': args.repeat}
+    for mode, configs in modes:
+        result[mode] = {
+            'max': min(runs[mode], key=lambda run: run['cpu_seconds']),
+            'paced': run_paced(configs, data, args.lines, args.rate),
+        }
+
+    base = result['no_rules']['max']['cpu_seconds']
+    result['cpu_overhead'] = round(result['rules']['max']['cpu_seconds'] / base - 1, 4)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
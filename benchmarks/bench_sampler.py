@@ -0,0 +1,83 @@
+"""资源采样开销基准
+
+启动若干个模拟控制台（每个是一个 shell 及其两个子进程），用 ResourceSampler
+按固定间隔采样，测量采样线程占用的 CPU 比例和每轮采样的耗时。
+测量期间主线程只在等待，进程 CPU 时间基本都来自采样线程。
+
+用法：
+    python benchmarks/bench_sampler.py [--consoles 200] [--interval 2] [--duration 20]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from console_manager.resource_sampler import ResourceSampler, ProcBackend, create_backend
+
+CHILD_COMMAND = 'sleep 3600 & sleep 3600 & wait'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--consoles', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=2.0, help='采样间隔（秒）')
+    parser.add_argument('--duration', type=float, default=20, help='测量时长（秒）')
+    parser.add_argument('--scan', action='store_true', help='强制扫描整个 /proc（不使用 children 文件）')
+    args = parser.parse_args()
+
+    backend = create_backend()
+    if backend is None:
+        sys.exit('当前平台没有可用的采样方式（需要 /proc 或 psutil）')
+    if args.scan and isinstance(backend, ProcBackend):
+        backend.children_supported = False
+
+    processes = [
+        subprocess.Popen(['sh', '-c', CHILD_COMMAND], start_new_session=True)
+        for _ in range(args.consoles)
+    ]
+    try:
+        # 等待子进程都启动
+        time.sleep(1)
+        sampler = ResourceSampler(interval=args.interval, backend=backend)
+        for index, process in enumerate(processes):
+            sampler.track(index, process.pid)
+
+        durations = []
+        sampler.sample_once()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        while time.perf_counter() - wall_start < args.duration:
+            time.sleep(args.interval)
+            sampler.sample_once()
+            durations.append(sampler.last_duration)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+
+        usages = [sampler.usage(index) for index in range(args.consoles)]
+        result = {
+            'backend': type(backend).__name__,
+            'proc_children_file': getattr(backend, 'children_supported', None),
+            'consoles': args.consoles,
+            'processes_sampled': sum(usage.processes for usage in usages if usage),
+            'interval': args.interval,
+            'passes': len(durations),
+            'pass_ms_mean': round(sum(durations) / len(durations) * 1000, 2),
+            'pass_ms_max': round(max(durations) * 1000, 2),
+            'cpu_fraction': round(cpu / wall, 5),
+        }
+        print(json.dumps(result, indent=2))
+    finally:
+        for process in processes:
+            try:
+                os.killpg(process.pid, 9)
+            except OSError:
+                pass
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,12 @@ from .console_manager import ConsoleManager
 from .tray_manager import TrayManager
 from .scrolled_notebook import ScrolledNotebook
 from .console_tab import ConsoleTab
+from .output_dispatcher import OutputDispatcher
+from .scrollback import ScrollbackBuffer
+from .virtual_output_view import VirtualOutputView
+from .output_spool import OutputSpool
+from .io_loop import IOLoop
+from .ansi import AnsiParser
 from .constants import FLAT_THEME, CONFIG_FILE, SETTINGS_FILE
 
 __all__ = [
@@ -9,6 +15,12 @@ __all__ = [
     'TrayManager',
     'ScrolledNotebook',
     'ConsoleTab',
+    'OutputDispatcher',
+    'ScrollbackBuffer',
+    'VirtualOutputView',
+    'OutputSpool',
+    'IOLoop',
+    'AnsiParser',
     'FLAT_THEME',
     'CONFIG_FILE',
     'SETTINGS_FILE'
@@ -0,0 +1,177 @@
+import re
+
+# 转义序列：CSI（ESC [ ... 终止字节）、OSC（ESC ] ... BEL 或 ESC \）、其他两字节序列
+ESCAPE_RE = re.compile(
+    r'\x1b\[([0-?]*)[ -/]*([@-~])'
+    r'|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)'
+    r'|\x1b[@-Z\\-_]'
+)
+# 可能被拆在两段输入之间的不完整转义序列
+INCOMPLETE_RE = re.compile(r'\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*)?$')
+# 需要处理的控制字符
+SPECIAL_RE = re.compile(r'[\x1b\r]')
+
+# 16 色对应的 RGB，用于把 256 色和真彩色映射到最接近的预置标签
+BASIC_RGB = [
+    (0, 0, 0), (205, 49, 49), (13, 188, 121), (229, 229, 16),
+    (36, 114, 200), (188, 63, 188), (17, 168, 205), (229, 229, 229),
+    (102, 102, 102), (241, 76, 76), (35, 209, 139), (245, 245, 67),
+    (59, 142, 234), (214, 112, 214), (41, 184, 219), (255, 255, 255),
+]
+# 16 色标签使用的颜色
+ANSI_COLORS = [f'#{r:02x}{g:02x}{b:02x}' for r, g, b in BASIC_RGB]
+
+
+def nearest_basic_color(r, g, b):
+    """找到与 RGB 最接近的 16 色下标"""
+    return min(
+        range(16),
+        key=lambda i: (BASIC_RGB[i][0] - r) ** 2 + (BASIC_RGB[i][1] - g) ** 2 + (BASIC_RGB[i][2] - b) ** 2
+    )
+
+
+def xterm_256_to_basic(n):
+    """把 256 色下标映射到 16 色"""
+    if n < 16:
+        return n
+    if n >= 232:
+        level = 8 + (n - 232) * 10
+        return nearest_basic_color(level, level, level)
+    n -= 16
+    steps = [0, 95, 135, 175, 215, 255]
+    return nearest_basic_color(steps[n // 36], steps[(n // 6) % 6], steps[n % 6])
+
+
+class AnsiParser:
+    """流式 ANSI 转义和回车解析器
+
+    每个输出流一个实例。SGR 颜色/粗体/下划线转换成预置的文本标签
+    （ansi_fg_N、ansi_bg_N、ansi_bold、ansi_underline），其余转义序列直接丢弃。
+    行内的回车表示从行首重写，只保留最后一次重写的内容，
+    进度条刷出的大量中间状态不会进入界面。
+    """
+    def __init__(self):
+        self.fg = None
+        self.bg = None
+        self.bold = False
+        self.underline = False
+        # 上一段输入末尾不完整的转义序列
+        self.pending = ''
+        # 遇到回车但还没有新内容覆盖
+        self.carriage_return = False
+
+    def tags(self):
+        """当前样式对应的标签"""
+        tags = []
+        if self.fg is not None:
+            tags.append(f'ansi_fg_{self.fg}')
+        if self.bg is not None:
+            tags.append(f'ansi_bg_{self.bg}')
+        if self.bold:
+            tags.append('ansi_bold')
+        if self.underline:
+            tags.append('ansi_underline')
+        return tuple(tags)
+
+    def end_line(self):
+        """一行结束，回车状态不跨行保留"""
+        self.carriage_return = False
+
+    def feed(self, text):
+        """解析一段同一行内的文本
+
+        返回 (rewrite, segments)：segments 为 [(文本, 标签元组), ...]；
+        rewrite 为 True 表示这段文本中出现了回车，segments 应替换该行已有的内容。
+        """
+        if self.pending:
+            text = self.pending + text
+            self.pending = ''
+
+        # 快速路径：没有转义和回车
+        if not SPECIAL_RE.search(text):
+            if not text:
+                return False, []
+            if self.carriage_return:
+                self.carriage_return = False
+                return True, [(text, self.tags())]
+            return False, [(text, self.tags())]
+
+        incomplete = INCOMPLETE_RE.search(text)
+        if incomplete:
+            self.pending = incomplete.group(0)
+            text = text[:incomplete.start()]
+
+        rewrite = False
+        segments = []
+        position = 0
+        for match in ESCAPE_RE.finditer(text):
+            rewrite = self._add_text(text[position:match.start()], segments) or rewrite
+            if match.group(2) == 'm':
+                self._apply_sgr(match.group(1))
+            position = match.end()
+        rewrite = self._add_text(text[position:], segments) or rewrite
+        return rewrite, segments
+
+    def _add_text(self, text, segments):
+        """加入普通文本并处理回车，返回是否发生了重写"""
+        rewrite = False
+        parts = text.split('\r')
+        for i, part in enumerate(parts):
+            if i > 0:
+                self.carriage_return = True
+            if not part:
+                continue
+            if self.carriage_return:
+                segments.clear()
+                self.carriage_return = False
+                rewrite = True
+            tags = self.tags()
+            if segments and segments[-1][1] == tags:
+                segments[-1] = (segments[-1][0] + part, tags)
+            else:
+                segments.append((part, tags))
+        return rewrite
+
+    def _apply_sgr(self, params):
+        """应用 SGR 参数"""
+        codes = [int(p) if p.isdigit() else 0 for p in params.split(';')] if params else [0]
+        i = 0
+        while i < len(codes):
+            code = codes[i]
+            if code == 0:
+                self.fg = self.bg = None
+                self.bold = self.underline = False
+            elif code == 1:
+                self.bold = True
+            elif code == 22:
+                self.bold = False
+            elif code == 4:
+                self.underline = True
+            elif code == 24:
+                self.underline = False
+            elif 30 <= code <= 37:
+                self.fg = code - 30
+            elif 90 <= code <= 97:
+                self.fg = code - 90 + 8
+            elif code == 39:
+                self.fg = None
+            elif 40 <= code <= 47:
+                self.bg = code - 40
+            elif 100 <= code <= 107:
+                self.bg = code - 100 + 8
+            elif code == 49:
+                self.bg = None
+            elif code in (38, 48) and i + 1 < len(codes):
+                # 256 色和真彩色映射到最接近的 16 色
+                color = None
+                if codes[i + 1] == 5 and i + 2 < len(codes):
+                    color = xterm_256_to_basic(codes[i + 2] % 256)
+                    i += 2
+                elif codes[i + 1] == 2 and i + 4 < len(codes):
+                    color = nearest_basic_color(*codes[i + 2:i + 5])
+                    i += 4
+                if code == 38:
+                    self.fg = color
+                else:
+                    self.bg = color
+            i += 1
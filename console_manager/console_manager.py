@@ -1,7 +1,7 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, scrolledtext
-import subprocess
 import threading
+import time
 import os
 import sys
 import yaml
@@ -9,24 +9,41 @@ import json
 from pathlib import Path
 import logging
 from datetime import datetime
-import winshell
-import winreg
+if sys.platform == 'win32':
+    import winshell
+    import winreg
 from .constants import FLAT_THEME, CONFIG_FILE, SETTINGS_FILE, APP_DIR
 from .tray_manager import TrayManager
 from .scrolled_notebook import ScrolledNotebook
 from .console_tab import ConsoleTab
+from .output_dispatcher import OutputDispatcher
+from .output_spool import OutputSpool
+from .io_loop import IOLoop
+from .render_budget import format_size
+from .watchdog import StallWatchdog
+from .startup import StartupScheduler
+from .resource_sampler import ResourceSampler
+from .services import ServiceMonitor, PollSchedule, create_service_backend, state_text, RUNNING, STOPPED
 
 # 设置日志
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler(APP_DIR / 'app.log'),
+        # 第一次写日志时才创建文件；已配置过日志（如测试）时这个处理器不会被使用
+        logging.FileHandler(APP_DIR / 'app.log', delay=True),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
+# 服务操作的显示名称
+SERVICE_ACTIONS = {
+    'start': '启动',
+    'stop': '停止',
+    'restart': '重启',
+}
+
 class ConsoleManager:
     def __init__(self, root):
         self.root = root
@@ -38,8 +55,20 @@ class ConsoleManager:
         # 控制台配置
         self.consoles = {}
         self.services = []
+        # 最近一次查询到的服务状态 {服务名: ServiceStatus 或 None（服务不存在）}
+        self.service_states = {}
+        # 服务列表当前显示的内容 {服务名: (values, tags)} 和行的顺序
+        self.service_rows = {}
+        self.service_order = []
+        # 进行中的服务操作 {服务名: 'start' / 'stop' / 'restart'}
+        self.service_operations = {}
         self.current_tabs = {}
         self.settings = {}
+        self.scrollback_settings = {}
+        self.rule_settings = []
+        self.startup_settings = {}
+        # 正在退出（等待控制台停止）
+        self.exiting = False
         
         # 加载配置
         self.load_config()
@@ -53,6 +82,11 @@ class ConsoleManager:
             # 默认大小
             self.root.geometry("800x580")
         
+        # 界面卡顿检测，并统计可能耗时的主线程回调
+        self.watchdog = StallWatchdog(self.root, threshold=self.settings.get('stall_threshold', 1.0))
+        self.instrument_handlers()
+        self.watchdog.start()
+        
         # 绑定窗口大小改变事件
         self.root.bind('<Configure>', self.on_window_configure)
         
@@ -69,6 +103,43 @@ class ConsoleManager:
         
         self.create_statusbar()
         
+        # 输出调度器：批量刷新所有控制台的输出
+        self.output_dispatcher = OutputDispatcher(self.root)
+        self.output_dispatcher.stats = self.watchdog.stats
+        self.output_dispatcher.start()
+        
+        # 输出落盘写线程
+        self.output_spool = OutputSpool()
+        self.output_spool.start()
+        
+        # 共享的 I/O 线程：读取所有控制台的输出并回收退出的进程
+        self.io_loop = IOLoop()
+        self.io_loop.start()
+        
+        # 资源采样线程：按间隔统计各控制台进程树的 CPU 和内存
+        self.resource_sampler = ResourceSampler(interval=self.settings.get('sample_interval', 2.0))
+        self.resource_sampler.start()
+        if self.resource_sampler.available:
+            self.root.after(int(self.resource_sampler.interval * 1000), self.update_resource_status)
+        
+        # 服务状态查询线程：一次枚举得到所有服务的状态，不在主线程等待 sc
+        self.service_monitor = ServiceMonitor(
+            create_service_backend(self.settings.get('service_backend')),
+            self.output_dispatcher.post
+        )
+        self.service_monitor.start()
+        # 服务状态自适应轮询：状态刚变化或有服务处于等待状态时快速轮询，稳定后逐渐放慢，
+        # 窗口隐藏且托盘菜单最近没有使用时暂停
+        self.service_schedule = PollSchedule.from_config(self.settings.get('service_poll'))
+        self.service_poll_timer = None
+        # 服务状态变化的订阅者，参数为 {服务名: (原状态, 新状态)}
+        self.service_listeners = []
+        self.refresh_services()
+        
+        # 按依赖关系并行启动控制台
+        self.startup = StartupScheduler(self)
+        self.startup.configure(self.startup_settings)
+        
         # 启动时自动运行保存的控制台
         self.start_saved_consoles()
         
@@ -88,6 +159,13 @@ class ConsoleManager:
         if self.settings.get('auto_start_app', False):
             self.set_auto_start(True)
     
+    def instrument_handlers(self):
+        """为可能卡住界面的回调记录耗时，结果显示在内部状态窗口中"""
+        for name in ('refresh_services', 'refresh_consoles', 'save_config', 'save_settings',
+                     'update_status', 'update_suppressed_status', 'update_resource_status',
+                     'on_window_configure'):
+            setattr(self, name, self.watchdog.stats.timed(name, getattr(self, name)))
+    
     def setup_flat_theme(self):
         """设置扁平化主题"""
         style = ttk.Style()
@@ -314,6 +392,7 @@ class ConsoleManager:
         menubar.add_cascade(label="帮助", menu=help_menu)
         help_menu.add_command(label="使用说明", command=self.show_help)
         help_menu.add_command(label="检查更新", command=self.check_for_updates)
+        help_menu.add_command(label="内部状态", command=self.show_internals)
         help_menu.add_separator()
         help_menu.add_command(label="关于", command=self.show_about)
         
@@ -671,8 +750,8 @@ class ConsoleManager:
         )
         remove_service_btn.pack(side=tk.LEFT, padx=5)
         
-        # 初始刷新服务列表
-        self.refresh_services()
+        # 先显示服务列表，状态在后台查询完成后更新
+        self.render_services()
     
     def scroll_tabs_left(self):
         """向左滚动标签页"""
@@ -738,6 +817,62 @@ class ConsoleManager:
             font=('微软雅黑', 9)
         )
         running_label.pack(side=tk.LEFT, padx=5)
+        
+        # 超出刷新预算而省略的输出
+        self.suppressed_var = tk.StringVar()
+        suppressed_label = tk.Label(
+            info_frame,
+            textvariable=self.suppressed_var,
+            bg=FLAT_THEME['bg_darker'],
+            fg=FLAT_THEME['warning'],
+            font=('微软雅黑', 9)
+        )
+        suppressed_label.pack(side=tk.LEFT, padx=5)
+        self.root.after(1000, self.update_suppressed_status)
+        
+        # 所有控制台的 CPU 和内存合计
+        self.resource_var = tk.StringVar()
+        resource_label = tk.Label(
+            info_frame,
+            textvariable=self.resource_var,
+            bg=FLAT_THEME['bg_darker'],
+            fg=FLAT_THEME['text_light'],
+            font=('微软雅黑', 9)
+        )
+        resource_label.pack(side=tk.LEFT, padx=5)
+    
+    def update_suppressed_status(self):
+        """定期汇总各控制台省略的输出量"""
+        lines = 0
+        size = 0
+        consoles = 0
+        for tab in self.current_tabs.values():
+            budget = tab.render_budget
+            if budget and budget.suppressed_lines:
+                lines += budget.suppressed_lines
+                size += budget.suppressed_bytes
+                consoles += 1
+        if lines:
+            self.suppressed_var.set(f"省略: {lines:,} 行 / {format_size(size)} ({consoles} 个控制台)")
+        else:
+            self.suppressed_var.set("")
+        self.root.after(1000, self.update_suppressed_status)
+    
+    def update_resource_status(self):
+        """按采样间隔刷新各控制台工具栏和状态栏的 CPU、内存占用"""
+        cpu = 0.0
+        rss = 0
+        for tab in self.current_tabs.values():
+            usage = self.resource_sampler.usage(tab) if tab.is_running else None
+            tab.update_usage(usage)
+            if usage is not None:
+                cpu += usage.cpu_percent or 0.0
+                rss += usage.rss
+        if rss:
+            self.resource_var.set(f"CPU: {cpu:.1f}%  内存: {format_size(rss)}")
+        else:
+            self.resource_var.set("")
+        self.root.after(int(self.resource_sampler.interval * 1000), self.update_resource_status)
     
     def new_console_dialog(self):
         """新建控制台对话框"""
@@ -996,23 +1131,38 @@ class ConsoleManager:
             entry_widget.delete(0, tk.END)
             entry_widget.insert(0, directory)
     
-    def add_console_tab(self, name, config):
-        """添加控制台标签页"""
+    def add_console_tab(self, name, config, start=True, refresh=True):
+        """添加控制台标签页
+        
+        start 为 False 时由调用方统一启动；批量添加时 refresh 为 False，
+        由调用方最后统一刷新标签栏、状态栏和托盘菜单。
+        """
         if name in self.current_tabs:
             return
         
         tab = ConsoleTab(self.notebook.notebook, name, config, self)
         self.current_tabs[name] = tab
         
-        self.notebook.add(tab.tab_frame, text=name)
-        self.update_status()
-        self.update_tab_buttons_state()
+        self.notebook.add(tab.tab_frame, text=name, update=refresh)
+        if refresh:
+            self.update_status()
+            self.update_tab_buttons_state()
         
-        # 自动启动
-        if config.get('auto_start', False):
-            tab.run()
+        # 自动启动（等待依赖就绪）
+        if start and config.get('auto_start', False):
+            self.startup.start([name])
         
         # 刷新系统托盘
+        if refresh and hasattr(self, 'tray_manager') and self.tray_manager:
+            self.tray_manager.update_menu()
+    
+    def add_console_tabs(self):
+        """批量添加所有控制台的标签页（控件在第一次显示时才创建），再按依赖启动自动启动的控制台"""
+        for name, config in self.consoles.items():
+            self.add_console_tab(name, config, start=False, refresh=False)
+        self.notebook.refresh_tabs()
+        self.update_tab_buttons_state()
+        self.startup.start([name for name, config in self.consoles.items() if config.get('auto_start', False)])
         if hasattr(self, 'tray_manager') and self.tray_manager:
             self.tray_manager.update_menu()
     
@@ -1237,12 +1387,13 @@ class ConsoleManager:
                     tab_index = self.get_tab_id(original_name)
                     if tab_index is not None:
                         self.notebook.forget(tab_index)
-                        if self.current_tabs[original_name].process:
-                            self.current_tabs[original_name].process.terminate()
+                        self.current_tabs[original_name].stop()
                         del self.current_tabs[original_name]
+                        self.output_spool.close(original_name)
             
-            # 更新配置
+            # 更新配置，保留对话框中没有的配置项（依赖、就绪条件、停止策略等）
             self.consoles[new_name] = {
+                **config,
                 'program': program,
                 'args': args,
                 'work_dir': work_dir or '.',
@@ -1272,9 +1423,9 @@ class ConsoleManager:
                     tab_index = self.get_tab_id(original_name)
                     if tab_index is not None:
                         self.notebook.forget(tab_index)
-                        if self.current_tabs[original_name].process:
-                            self.current_tabs[original_name].process.terminate()
+                        self.current_tabs[original_name].stop()
                         del self.current_tabs[original_name]
+                        self.output_spool.close(original_name)
                 
                 self.save_config()
                 dialog.destroy()
@@ -1365,9 +1516,9 @@ class ConsoleManager:
                 tab_index = self.get_tab_id(original_name)
                 if tab_index is not None:
                     self.notebook.forget(tab_index)
-                    if self.current_tabs[original_name].process:
-                        self.current_tabs[original_name].process.terminate()
+                    self.current_tabs[original_name].stop()
                     del self.current_tabs[original_name]
+                    self.output_spool.close(original_name)
             
             # 刷新系统托盘
             if hasattr(self, 'tray_manager') and self.tray_manager:
@@ -1393,8 +1544,7 @@ class ConsoleManager:
             if tab_text.startswith(name):
                 tab = self.current_tabs[name]
                 if not tab.is_running:
-                    # 在新线程中运行
-                    threading.Thread(target=tab.run, daemon=True).start()
+                    tab.run()
                     self.status_var.set(f"正在启动: {name}")
                 else:
                     self.status_var.set(f"{name} 已在运行中")
@@ -1436,8 +1586,8 @@ class ConsoleManager:
             if tab_text.startswith(name):
                 tab = self.current_tabs[name]
                 if tab.is_running:
-                    tab.stop()
-                    self.root.after(500, tab.run)  # 0.5秒后重启
+                    # 进程退出后再启动
+                    tab.restart()
                     self.status_var.set(f"正在重启: {name}")
                 else:
                     tab.run()
@@ -1445,18 +1595,14 @@ class ConsoleManager:
                 break
     
     def run_all_consoles(self):
-        """运行所有控制台"""
-        for name, tab in self.current_tabs.items():
-            if not tab.is_running:
-                threading.Thread(target=tab.run, daemon=True).start()
+        """按依赖顺序运行所有控制台"""
+        self.startup.start(list(self.current_tabs))
         
         self.status_var.set("正在启动所有控制台...")
     
     def stop_all_consoles(self):
-        """停止所有控制台"""
-        for name, tab in self.current_tabs.items():
-            if tab.is_running:
-                tab.stop()
+        """按依赖的逆序停止所有控制台"""
+        self.startup.stop()
         
         self.status_var.set("正在停止所有控制台...")
     
@@ -1467,14 +1613,13 @@ class ConsoleManager:
         for name, tab in self.current_tabs.items():
             if tab.auto_start:
                 auto_start_consoles.append(name)
-            if tab.process:
-                tab.process.terminate()
+            tab.stop()
+        self.startup.cancel()
         
         self.current_tabs.clear()
         
         # 重新添加所有控制台
-        for name, config in self.consoles.items():
-            self.add_console_tab(name, config)
+        self.add_console_tabs()
         
         self.status_var.set("已刷新所有控制台")
         self.update_status()
@@ -1500,8 +1645,7 @@ class ConsoleManager:
     
     def start_saved_consoles(self):
         """启动保存的控制台"""
-        for name, config in self.consoles.items():
-            self.add_console_tab(name, config)
+        self.add_console_tabs()
         
         self.update_status()
         self.status_var.set("就绪")
@@ -1514,18 +1658,16 @@ class ConsoleManager:
         self.update_tab_buttons_state()
         current_tab = self.notebook.select()
         if current_tab:
-            tab_index = self.notebook.index(current_tab)
-            tab_text = self.notebook.tab(tab_index, 'text')
-            
-            # 从标签文本中提取名称
-            for name in self.current_tabs:
-                if tab_text.startswith(name):
-                    tab = self.current_tabs[name]
-                    status = "运行中" if tab.is_running else "已停止"
-                    if tab.exit_code is not None and tab.exit_code != 0:
-                        status = "异常退出"
-                    self.status_var.set(f"{name} - {status}")
-                    break
+            # 只有选中的控制台刷新文本控件，其余只写回滚缓冲区
+            for name, tab in self.current_tabs.items():
+                if str(tab.tab_frame) != str(current_tab):
+                    tab.hide()
+                    continue
+                tab.show()
+                status = "运行中" if tab.is_running else "已停止"
+                if tab.exit_code is not None and tab.exit_code != 0:
+                    status = "异常退出"
+                self.status_var.set(f"{name} - {status}")
     
     def update_status(self):
         """更新状态栏"""
@@ -1961,6 +2103,31 @@ class ConsoleManager:
         button_frame = tk.Frame(dialog, bg=FLAT_THEME['bg_dark'])
         button_frame.pack(pady=20)
         
+        def add_service(service_name, display_name):
+            self.services.append({
+                'name': service_name,
+                'display_name': display_name or service_name
+            })
+            self.refresh_services()
+            self.save_config()  # 保存配置到文件
+            dialog.destroy()
+            self.status_var.set(f"已添加服务: {service_name}")
+            
+            # 刷新系统托盘
+            if hasattr(self, 'tray_manager') and self.tray_manager:
+                self.tray_manager.update_menu()
+        
+        def on_service_checked(service_name, display_name, statuses, error):
+            # 查询期间对话框可能已关闭
+            if not dialog.winfo_exists():
+                return
+            save_btn.config(state=tk.NORMAL)
+            if error is None and statuses.get(service_name) is None:
+                messagebox.showerror("错误", f"服务 '{service_name}' 不存在", parent=dialog)
+                return
+            # 查询失败时无法确认，照常添加，列表中会显示查询错误
+            add_service(service_name, display_name)
+        
         def save_service():
             service_name = service_name_var.get().strip()
             display_name = display_name_var.get().strip()
@@ -1969,27 +2136,21 @@ class ConsoleManager:
                 messagebox.showwarning("警告", "服务名称不能为空")
                 return
             
-            # 检查服务是否存在
-            if self.get_service_status(service_name) is None:
-                messagebox.showerror("错误", f"服务 '{service_name}' 不存在")
+            if service_name in [s['name'] for s in self.services]:
+                messagebox.showinfo("提示", "服务已存在")
                 return
             
-            # 添加到服务列表
-            if service_name not in [s['name'] for s in self.services]:
-                self.services.append({
-                    'name': service_name,
-                    'display_name': display_name or service_name
-                })
-                self.refresh_services()
-                self.save_config()  # 保存配置到文件
-                dialog.destroy()
-                self.status_var.set(f"已添加服务: {service_name}")
-                
-                # 刷新系统托盘
-                if hasattr(self, 'tray_manager') and self.tray_manager:
-                    self.tray_manager.update_menu()
-            else:
-                messagebox.showinfo("提示", "服务已存在")
+            if not self.service_monitor_available():
+                add_service(service_name, display_name)
+                return
+            
+            # 在后台线程检查服务是否存在，查询期间界面不等待
+            save_btn.config(state=tk.DISABLED)
+            self.status_var.set(f"正在检查服务: {service_name}")
+            self.service_monitor.refresh(
+                [service_name],
+                lambda statuses, error: on_service_checked(service_name, display_name, statuses, error)
+            )
         
         # 保存按钮
         save_btn = tk.Button(
@@ -2022,77 +2183,171 @@ class ConsoleManager:
         service_name_entry.focus_set()
     
     def refresh_services(self):
-        """刷新服务列表"""
-        # 清空树状视图
-        for item in self.service_tree.get_children():
-            self.service_tree.delete(item)
-        
-        # 更新服务状态
-        for index, service in enumerate(self.services):
-            status = self.get_service_status(service['name'])
+        """刷新服务列表：立即显示列表，在后台查询所有服务的状态，完成后更新"""
+        self.render_services()
+        self.service_schedule.boost(time.monotonic())
+        self.request_service_status()
+    
+    def request_service_status(self):
+        """请求后台查询所有服务的状态，结果由 on_services_refreshed 处理"""
+        if self.service_poll_timer is not None:
+            self.root.after_cancel(self.service_poll_timer)
+            self.service_poll_timer = None
+        if self.service_monitor.available:
+            self.service_monitor.refresh([service['name'] for service in self.services], self.on_services_refreshed)
+    
+    def schedule_service_poll(self, delay):
+        if self.service_poll_timer is not None:
+            self.root.after_cancel(self.service_poll_timer)
+        self.service_poll_timer = self.root.after(int(delay * 1000), self.poll_services)
+    
+    def poll_services(self):
+        """定时查询服务状态，暂停期间只检查是否需要恢复"""
+        self.service_poll_timer = None
+        if self.exiting:
+            return
+        if self.service_polling_paused():
+            self.schedule_service_poll(self.service_schedule.fast_interval)
+            return
+        self.request_service_status()
+    
+    def service_polling_paused(self):
+        """窗口隐藏且最近没有使用托盘菜单时暂停轮询
+        
+        pystray 不会通知菜单何时打开，以最近一次托盘操作后的一段时间代替。
+        """
+        if self.root.state() not in ('withdrawn', 'iconic'):
+            return False
+        tray = self.tray_manager if hasattr(self, 'tray_manager') else None
+        return tray is None or not tray.recently_used(self.service_schedule.settle)
+    
+    def on_services_refreshed(self, statuses, error):
+        """后台查询完成（主线程）：比较状态变化，通知订阅者，安排下一次查询"""
+        now = time.monotonic()
+        if statuses is None:
+            self.status_var.set(f"查询服务状态失败: {error}")
+            self.schedule_service_poll(self.service_schedule.slow_interval)
+            return
+        changes = {}
+        for name, status in statuses.items():
+            old = self.service_states.get(name)
+            old_state = old.state if old is not None else None
+            new_state = status.state if status is not None else None
+            if name not in self.service_states or old_state != new_state:
+                changes[name] = (old_state, new_state)
+        self.service_states.update(statuses)
+        for service in self.services:
+            if service['name'] not in changes:
+                continue
+            state = changes[service['name']][1]
             # 更新服务字典中的状态，确保托盘管理器能获取到正确状态
-            if status == '运行中':
+            if state == RUNNING:
                 service['status'] = 'running'
-            elif status == '已停止':
+            elif state == STOPPED:
                 service['status'] = 'stopped'
             else:
                 service['status'] = 'unknown'
-            
-            # 根据状态选择图标
-            if status == '运行中':
-                icon = '▶'
-            elif status == '已停止':
-                icon = '■'
-            else:
-                icon = '⏸'
-            
-            # 合并图标和状态文本
-            status_with_icon = f'  {icon} {status}'
-            
-            # 应用奇偶行样式和状态颜色标签
-            row_tag = 'even' if index % 2 == 0 else 'odd'
-            
-            # 根据状态选择颜色标签
-            if status == '运行中':
-                status_tag = 'running'
-            elif status == '已停止':
-                status_tag = 'stopped'
-            else:
-                status_tag = 'other'
-            
-            self.service_tree.insert('', tk.END, values=(
-                f'  {service["name"]}',
-                status_with_icon,
-                f'  {service["display_name"]}'
-            ), tags=(row_tag, status_tag))
-    
-    def get_service_status(self, service_name):
-        """获取服务状态"""
-        try:
-            result = subprocess.run(
-                ['sc', 'query', service_name],
-                capture_output=True,
-                text=True,
-                check=True,
-                stdin=subprocess.DEVNULL,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            
-            for line in result.stdout.split('\n'):
-                if 'STATE' in line:
-                    state_part = line.split(':')[1].strip()
-                    if 'RUNNING' in state_part:
-                        return '运行中'
-                    elif 'STOPPED' in state_part:
-                        return '已停止'
-                    else:
-                        return state_part
-            return '未知'
-        except subprocess.CalledProcessError:
-            return None
-        except Exception as e:
-            logger.error(f"获取服务状态失败: {e}")
-            return '错误'
+        if changes:
+            self.on_services_changed(changes)
+            self.notify_service_listeners(changes)
+        self.schedule_service_poll(self.service_schedule.next_interval(statuses, bool(changes), now))
+    
+    def notify_service_listeners(self, changes):
+        for listener in self.service_listeners:
+            try:
+                listener(changes)
+            except Exception as e:
+                logger.error(f"处理服务状态变化失败: {e}")
+    
+    def on_services_changed(self, changes):
+        """服务状态变化：只更新变化的行，外部变化写入状态栏"""
+        self.render_services()
+        if len(changes) == 1:
+            name, (old, new) = next(iter(changes.items()))
+            # 自己发起的操作由操作完成时显示结果
+            if old is not None and name not in self.service_operations:
+                self.status_var.set(f"服务 {name}: {state_text(old)} → {state_text(new)}")
+    
+    def render_services(self):
+        """按最近一次查询到的状态更新服务列表
+        
+        行的 iid 即服务名，与上次显示的内容比较，只更新有变化的行，
+        不清空重建，选中项和滚动位置保持不变。
+        """
+        tree = self.service_tree
+        rows = {}
+        for service in self.services:
+            if service['name'] not in rows:
+                rows[service['name']] = self.service_row(len(rows), service)
+        
+        # 删除已移除的服务
+        for name in [name for name in self.service_rows if name not in rows]:
+            tree.delete(name)
+            del self.service_rows[name]
+        
+        order = list(rows)
+        for index, (name, row) in enumerate(rows.items()):
+            shown = self.service_rows.get(name)
+            if shown is None:
+                tree.insert('', index, iid=name, values=row[0], tags=row[1])
+            elif shown != row:
+                tree.item(name, values=row[0], tags=row[1])
+            self.service_rows[name] = row
+        
+        # 只在顺序改变时移动行
+        if order != self.service_order:
+            for index, name in enumerate(order):
+                if tree.index(name) != index:
+                    tree.move(name, '', index)
+        self.service_order = order
+    
+    def service_row(self, index, service):
+        """服务列表中一行的 (values, tags)"""
+        operation = self.service_operations.get(service['name'])
+        if operation is not None:
+            # 操作进行中，不显示轮询得到的中间状态
+            state = None
+            text = f"{SERVICE_ACTIONS[operation]}中..."
+        elif service['name'] in self.service_states:
+            status = self.service_states[service['name']]
+            state = status.state if status is not None else None
+            text = state_text(state)
+        else:
+            state = None
+            text = '查询中' if self.service_monitor_available() else '未知'
+        
+        # 根据状态选择图标
+        if operation is not None:
+            icon = '⏳'
+        elif state == RUNNING:
+            icon = '▶'
+        elif state == STOPPED:
+            icon = '■'
+        else:
+            icon = '⏸'
+        
+        # 应用奇偶行样式和状态颜色标签
+        row_tag = 'even' if index % 2 == 0 else 'odd'
+        
+        # 根据状态选择颜色标签
+        if state == RUNNING:
+            status_tag = 'running'
+        elif state == STOPPED:
+            status_tag = 'stopped'
+        else:
+            status_tag = 'other'
+        
+        values = (
+            f'  {service["name"]}',
+            f'  {icon} {text}',
+            f'  {service["display_name"]}'
+        )
+        return values, (row_tag, status_tag)
+    
+    def service_monitor_available(self):
+        """服务状态查询线程是否可用（界面创建时查询线程尚未创建）"""
+        monitor = getattr(self, 'service_monitor', None)
+        return monitor is not None and monitor.available
     
     def start_service(self):
         """启动服务"""
@@ -2101,9 +2356,8 @@ class ConsoleManager:
             messagebox.showinfo("提示", "请选择一个服务")
             return
         
-        item = selected_item[0]
-        service_name_with_spaces = self.service_tree.item(item, 'values')[0]
-        service_name = service_name_with_spaces.strip()
+        # 行的 iid 即服务名
+        service_name = selected_item[0]
         # 移除固定的成功提示，因为 start_service_by_name 已经会根据执行结果显示相应的提示
         self.start_service_by_name(service_name)
 
@@ -2114,102 +2368,64 @@ class ConsoleManager:
             messagebox.showinfo("提示", "请选择一个服务")
             return
         
-        item = selected_item[0]
-        service_name_with_spaces = self.service_tree.item(item, 'values')[0]
-        service_name = service_name_with_spaces.strip()
+        # 行的 iid 即服务名
+        service_name = selected_item[0]
         # 移除固定的成功提示，因为 stop_service_by_name 已经会根据执行结果显示相应的提示
         self.stop_service_by_name(service_name)
     
     def start_service_by_name(self, service_name):
         """通过服务名启动服务"""
-        try:
-            result = subprocess.run(
-                ['net', 'start', service_name],
-                capture_output=True,
-                text=True,
-                stdin=subprocess.DEVNULL,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            
-            if result.returncode == 0:
-                self.refresh_services()
-                self.status_var.set(f"服务启动成功: {service_name}")
-            else:
-                error_msg = f"服务启动失败: {result.stderr}"
-                logger.error(error_msg)
-                messagebox.showerror("错误", error_msg)
-                self.status_var.set(f"服务启动失败: {service_name}")
-        except Exception as e:
-            error_msg = f"启动服务失败: {str(e)}"
-            logger.error(error_msg)
-            messagebox.showerror("错误", error_msg)
-            self.status_var.set(f"服务启动失败: {service_name}")
+        self.control_service(service_name, 'start')
 
     def stop_service_by_name(self, service_name):
         """通过服务名停止服务"""
-        try:
-            result = subprocess.run(
-                ['net', 'stop', service_name],
-                capture_output=True,
-                text=True,
-                stdin=subprocess.DEVNULL,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            
-            if result.returncode == 0:
-                self.refresh_services()
-                self.status_var.set(f"服务停止成功: {service_name}")
-            else:
-                error_msg = f"服务停止失败: {result.stderr}"
-                logger.error(error_msg)
-                messagebox.showerror("错误", error_msg)
-                self.status_var.set(f"服务停止失败: {service_name}")
-        except Exception as e:
-            error_msg = f"停止服务失败: {str(e)}"
-            logger.error(error_msg)
-            messagebox.showerror("错误", error_msg)
-            self.status_var.set(f"服务停止失败: {service_name}")
+        self.control_service(service_name, 'stop')
 
     def restart_service_by_name(self, service_name):
         """通过服务名重启服务"""
-        try:
-            # 先停止服务
-            stop_result = subprocess.run(
-                ['net', 'stop', service_name],
-                capture_output=True,
-                text=True,
-                stdin=subprocess.DEVNULL,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            
-            # 等待服务停止
-            import time
-            time.sleep(2)
-            
-            # 再启动服务
-            start_result = subprocess.run(
-                ['net', 'start', service_name],
-                capture_output=True,
-                text=True,
-                stdin=subprocess.DEVNULL,
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-            
-            if start_result.returncode == 0:
-                # 等待服务完全启动
-                time.sleep(1)
-                self.refresh_services()
-                self.status_var.set(f"服务重启成功: {service_name}")
-            else:
-                error_msg = f"服务重启失败: {start_result.stderr}"
-                logger.error(error_msg)
-                messagebox.showerror("错误", error_msg)
-                self.status_var.set(f"服务重启失败: {service_name}")
-        except Exception as e:
-            error_msg = f"重启服务失败: {str(e)}"
-            logger.error(error_msg)
-            messagebox.showerror("错误", error_msg)
-            self.status_var.set(f"服务重启失败: {service_name}")
+        self.control_service(service_name, 'restart')
+    
+    def control_service(self, service_name, action):
+        """在后台启动、停止或重启服务（主线程调用）
+        
+        操作期间该服务的行显示为进行中，服务到达目标状态（或超时）后显示结果并刷新列表，
+        同一服务的操作完成前不接受新的操作。
+        """
+        if not self.service_monitor_available():
+            messagebox.showerror("错误", "当前平台没有可用的服务管理方式")
+            return
+        text = SERVICE_ACTIONS[action]
+        if service_name in self.service_operations:
+            self.status_var.set(f"服务 {service_name} 正在{SERVICE_ACTIONS[self.service_operations[service_name]]}，请稍候")
+            return
+        self.service_operations[service_name] = action
+        self.status_var.set(f"正在{text}服务: {service_name}")
+        self.on_service_operation_changed(service_name)
+        self.service_monitor.control(
+            service_name, action, self.on_service_controlled,
+            timeout=float(self.settings.get('service_timeout', 30))
+        )
+    
+    def on_service_controlled(self, service_name, action, error):
+        """服务操作完成（主线程）"""
+        self.service_operations.pop(service_name, None)
+        text = SERVICE_ACTIONS[action]
+        if error is None:
+            self.status_var.set(f"服务{text}成功: {service_name}")
+        else:
+            self.status_var.set(f"服务{text}失败: {service_name}")
+        self.on_service_operation_changed(service_name)
+        # 立即查询最新状态，之后一段时间内快速轮询
+        self.refresh_services()
+        if error is not None and not self.exiting:
+            messagebox.showerror("错误", f"服务{text}失败: {error}")
+    
+    def on_service_operation_changed(self, service_name):
+        """服务操作开始或结束：更新该服务的行，通知订阅者（状态本身没有变化）"""
+        self.render_services()
+        state = self.service_states.get(service_name)
+        state = state.state if state is not None else None
+        self.notify_service_listeners({service_name: (state, state)})
     
     def remove_service(self):
         """删除服务"""
@@ -2218,9 +2434,8 @@ class ConsoleManager:
             messagebox.showinfo("提示", "请选择一个服务")
             return
         
-        item = selected_item[0]
-        service_name_with_spaces = self.service_tree.item(item, 'values')[0]
-        service_name = service_name_with_spaces.strip()
+        # 行的 iid 即服务名
+        service_name = selected_item[0]
         
         if messagebox.askyesno("确认", f"确定要删除服务 '{service_name}' 吗？"):
             # 从服务列表中删除
@@ -2325,6 +2540,103 @@ class ConsoleManager:
         )
         close_btn.pack(pady=15)
     
+    def show_internals(self):
+        """内部状态窗口：事件循环延迟、队列积压、线程数、最慢的回调和最近的卡顿"""
+        if getattr(self, 'internals_window', None) and self.internals_window.winfo_exists():
+            self.internals_window.lift()
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("内部状态")
+        dialog.geometry("760x560")
+        dialog.configure(bg=FLAT_THEME['bg_dark'])
+        self.internals_window = dialog
+        
+        text_widget = scrolledtext.ScrolledText(
+            dialog,
+            wrap=tk.NONE,
+            bg=FLAT_THEME['bg_darker'],
+            fg=FLAT_THEME['text_light'],
+            font=('Consolas', 10),
+            relief='flat',
+            borderwidth=0
+        )
+        text_widget.pack(fill=tk.BOTH, expand=True, padx=10, pady=(10, 5))
+        
+        btn_frame = tk.Frame(dialog, bg=FLAT_THEME['bg_dark'])
+        btn_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        for text, command, color in (
+            ("重置统计", self.watchdog.stats.reset, FLAT_THEME['warning']),
+            ("关闭", dialog.destroy, FLAT_THEME['primary']),
+        ):
+            tk.Button(
+                btn_frame,
+                text=text,
+                command=command,
+                bg=color,
+                fg=FLAT_THEME['text_light'],
+                font=('Segoe UI', 10, 'bold'),
+                relief='flat',
+                padx=20,
+                pady=6,
+                cursor='hand2',
+                activebackground=self.adjust_color(color, -20),
+                borderwidth=0
+            ).pack(side=tk.RIGHT, padx=(10, 0))
+        
+        def refresh():
+            if not dialog.winfo_exists():
+                return
+            position = text_widget.yview()[0]
+            text_widget.configure(state='normal')
+            text_widget.delete(1.0, tk.END)
+            text_widget.insert(1.0, self.internals_report())
+            text_widget.configure(state='disabled')
+            text_widget.yview_moveto(position)
+            dialog.after(1000, refresh)
+        
+        refresh()
+    
+    def internals_report(self):
+        """生成内部状态文本"""
+        watchdog = self.watchdog
+        lines = []
+        
+        lags = watchdog.lag_percentiles()
+        lines.append(f"事件循环延迟（最近 {len(watchdog.lags)} 次心跳，间隔 {watchdog.interval * 1000:.0f} ms）")
+        if lags:
+            lines.append("  " + "  ".join(f"{key}: {value * 1000:.1f} ms" for key, value in lags.items()))
+        lines.append(f"待执行的界面回调: {self.output_dispatcher.pending_callbacks()}")
+        lines.append(f"线程数: {threading.active_count()}")
+        sampler = self.resource_sampler
+        if sampler.available:
+            lines.append(f"资源采样: 每 {sampler.interval:g} 秒，上次耗时 {sampler.last_duration * 1000:.1f} ms")
+        if self.service_monitor.available:
+            monitor = self.service_monitor
+            lines.append(f"服务查询: {type(monitor.backend).__name__}，上次耗时 {monitor.last_duration * 1000:.1f} ms")
+        lines.append("")
+        
+        depths = self.output_dispatcher.queue_depths()
+        lines.append(f"等待刷新的输出片段（共 {sum(depths.values())}）")
+        for tab, depth in sorted(depths.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"  {tab.name:<30} {depth:>10,}")
+        lines.append("")
+        
+        lines.append("最慢的回调")
+        lines.append(f"  {'名称':<36}{'次数':>8}{'平均 ms':>12}{'最长 ms':>12}{'总计 s':>10}")
+        for name, count, total, longest in watchdog.stats.slowest():
+            lines.append(f"  {name[:38]:<38}{count:>10,}{total / count * 1000:>14.2f}{longest * 1000:>14.2f}{total:>12.2f}")
+        lines.append("")
+        
+        lines.append(f"最近的卡顿（阈值 {watchdog.threshold:.1f} 秒）")
+        if not watchdog.stalls:
+            lines.append("  无")
+        for stall in reversed(watchdog.stalls):
+            started = datetime.fromtimestamp(stall['time']).strftime("%H:%M:%S")
+            lines.append(f"  [{started}] {stall['duration']:.2f} 秒")
+            lines.extend("    " + line for line in stall['stack'].rstrip().splitlines())
+        return "\n".join(lines) + "\n"
+    
     def import_config(self):
         """导入配置"""
         filename = filedialog.askopenfilename(
@@ -2394,19 +2706,46 @@ class ConsoleManager:
                 break
     
     def exit_app(self):
-        """退出应用程序"""
-        # 停止所有控制台
-        for name, tab in self.current_tabs.items():
-            if tab.process and tab.is_running:
-                try:
-                    tab.process.terminate()
-                    # 等待进程退出
-                    tab.process.wait(timeout=2)
-                except subprocess.TimeoutExpired:
-                    # 强制终止
-                    tab.process.kill()
-                except Exception as e:
-                    logger.error(f"终止进程 {name} 失败: {e}")
+        """退出应用程序
+        
+        所有控制台同时按各自的停止策略开始停止，共用一个截止时间：
+        取各控制台停止策略的最长时间（可用设置 exit_timeout 覆盖），
+        到时仍未退出的进程直接强制结束，退出总耗时不随控制台数量增加。
+        """
+        if self.exiting:
+            return
+        self.exiting = True
+        
+        running = [tab for tab in self.current_tabs.values() if tab.is_running]
+        names = [tab.name for tab in running]
+        self.startup.stop(names)
+        
+        timeout = self.settings.get('exit_timeout')
+        if timeout is None:
+            timeout = self.startup.stop_timeout(names) + 1
+        self.status_var.set(f"正在停止 {len(running)} 个控制台...")
+        self.wait_for_exit(running, time.monotonic() + float(timeout))
+    
+    def wait_for_exit(self, tabs, deadline):
+        """等待控制台进程退出，超过截止时间后强制结束"""
+        remaining = [tab for tab in tabs if tab.process and tab.process.poll() is None]
+        if remaining and time.monotonic() < deadline:
+            self.root.after(100, self.wait_for_exit, remaining, deadline)
+            return
+        for tab in remaining:
+            logger.warning(f"控制台 {tab.name} 未在超时时间内退出，强制结束")
+            tab.kill()
+        self.finish_exit()
+    
+    def finish_exit(self):
+        """停止后台线程、保存配置并退出"""
+        # 停止 I/O 线程和输出刷新，并把剩余输出写入磁盘
+        self.watchdog.stop()
+        self.resource_sampler.stop()
+        self.service_monitor.stop()
+        self.io_loop.stop()
+        self.output_dispatcher.stop()
+        self.output_spool.stop()
         
         # 保存配置
         self.save_config()
@@ -2414,9 +2753,8 @@ class ConsoleManager:
         
         # 停止托盘图标
         if self.tray_manager:
-            self.tray_manager.exit_app()
-        else:
-            self.root.quit()
+            self.tray_manager.shutdown()
+        self.root.quit()
     
     def save_config(self):
         """保存配置到文件"""
@@ -2426,6 +2764,12 @@ class ConsoleManager:
                 'consoles': self.consoles,
                 'services': self.services
             }
+            if self.scrollback_settings:
+                config_data['scrollback'] = self.scrollback_settings
+            if self.rule_settings:
+                config_data['rules'] = self.rule_settings
+            if self.startup_settings:
+                config_data['startup'] = self.startup_settings
             with open(CONFIG_FILE, 'w', encoding='utf-8') as f:
                 yaml.dump(config_data, f, default_flow_style=False, allow_unicode=True)
             logger.info("配置已保存")
@@ -2441,6 +2785,9 @@ class ConsoleManager:
                     config_data = yaml.safe_load(f) or {}
                 self.consoles = config_data.get('consoles', {})
                 self.services = config_data.get('services', [])
+                self.scrollback_settings = config_data.get('scrollback', {}) or {}
+                self.rule_settings = config_data.get('rules', []) or []
+                self.startup_settings = config_data.get('startup', {}) or {}
                 logger.info(f"已加载配置: {CONFIG_FILE}")
                 logger.info(f"已加载 {len(self.services)} 个服务")
             else:
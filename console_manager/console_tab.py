@@ -1,10 +1,23 @@
 import tkinter as tk
-from tkinter import ttk, scrolledtext
+from tkinter import ttk, scrolledtext, filedialog
 import subprocess
 import threading
+import itertools
 import os
+import locale
+import time
+from collections import deque
 from datetime import datetime
 from .constants import FLAT_THEME
+from .scrollback import ScrollbackBuffer, DEFAULT_MAX_LINES, DEFAULT_MAX_BYTES
+from .virtual_output_view import VirtualOutputView
+from .line_decoder import LineDecoder
+from .ansi import AnsiParser, ANSI_COLORS
+from .output_rules import RuleSet, highlight_segments
+from .render_budget import RenderBudget, format_size
+from .stop_policy import StopPolicy
+from .process_tree import ProcessTree, popen_options
+from .restart_policy import RestartPolicy
 
 class ConsoleTab:
     def __init__(self, parent, name, config, app):
@@ -12,20 +25,107 @@ class ConsoleTab:
         self.config = config
         self.app = app
         self.process = None
+        # I/O 线程中登记的进程，stdin 的发送队列也在其中
+        self.watch = None
+        # 控制台进程及其后代，停止时整棵树一起结束
+        self.tree = None
+        # 按依赖启动时等待的就绪条件（ReadinessCheck），由启动调度器设置
+        self.ready_check = None
+        self.pending_after_id = None
         self.is_running = False
+        # 已开始停止、尚未回收到进程退出
+        self.is_stopping = False
+        self.stop_policy = StopPolicy.from_config(config.get('stop'))
+        self.stop_timer = None
+        # 进程退出后在主线程执行的回调（如重启）
+        self.after_stop = []
+        # 自动重启：计时器在 I/O 线程的定时器堆中，不为每个控制台单独开线程
+        self.restart_policy = RestartPolicy.from_config(config.get('restart'))
+        self.restart_timer = None
+        self.restart_count = 0
+        # 连续重启的次数（决定退避时间）和窗口内的重启时间（判断崩溃循环）
+        self.restart_attempt = 0
+        self.restart_history = deque()
+        self.crash_looping = False
+        self.last_exit_code = None
+        self.started_at = 0.0
         self.auto_start = config.get('auto_start', False)
         self.exit_code = None
+        # 子进程输出编码，未配置时使用系统默认编码
+        self.encoding = config.get('encoding') or locale.getpreferredencoding(False)
+        # 未以换行结束的内容空闲多久后提前显示（秒）
+        self.partial_timeout = float(config.get('partial_timeout', 0.15))
+        self.decoders = {}
+        self.parsers = {}
+        self.output_lock = threading.Lock()
+        # 当前未结束的行属于哪个流、它的时间戳前缀，以及尚未落盘的半行内容
+        self.open_stream = None
+        self.open_prefix = ''
+        self.spool_partial = {'stdout': '', 'stderr': ''}
+        self.partial_timer = None
+        # 控制台内单调递增的输出顺序号，读取时打上，跨进程重启也不重置
+        self.sequence = itertools.count()
         
-        # 创建标签页框架
-        self.tab_frame = ttk.Frame(parent)
+        # 回滚缓冲区（输出的唯一来源），单个控制台的配置覆盖全局配置
+        scrollback_config = dict(getattr(app, 'scrollback_settings', {}) or {})
+        scrollback_config.update(config.get('scrollback') or {})
+        self.scrollback = ScrollbackBuffer(
+            max_lines=scrollback_config.get('max_lines', DEFAULT_MAX_LINES),
+            max_bytes=scrollback_config.get('max_bytes', DEFAULT_MAX_BYTES)
+        )
+        # 控件已包含的缓冲区版本，版本号不大于它的片段不再插入
+        self.widget_version = 0
+        # 标签页不可见时只写缓冲区，不刷新控件，选中时再从缓冲区重放
+        self.visible = False
+        self.render_stale = False
+        
+        # 界面刷新预算：超出的输出只写缓冲区和落盘，界面上显示汇总
+        self.render_budget = RenderBudget.from_config(config.get('render_budget'))
+        # 当前未结束的行是否显示在界面上
+        self.rendering = True
+        
+        # 高亮/告警规则：全局规则在前，控制台自己的规则在后
+        rule_configs = list(getattr(app, 'rule_settings', []) or [])
+        rule_configs.extend(config.get('rules') or [])
+        self.rules = RuleSet(rule_configs)
+        self.rule_counts = {}
+        self.rule_counts_dirty = False
+        self.rule_last_action = {}
+        
+        # 输出落盘（按控制台配置开启）
+        spool_config = config.get('spool') or {}
+        self.spool_enabled = bool(spool_config) and spool_config.get('enabled', True)
+        if self.spool_enabled:
+            app.output_spool.open(name, spool_config)
+        
+        # 标签页框架，其中的控件在第一次显示时才创建，
+        # 隐藏启动或从未打开的控制台只保留运行状态和回滚缓冲区
+        self.tab_frame = self.create_frame(parent)
+        self.materialized = False
+        self.status_indicator = None
+        self.text_widget = None
+        self.output_view = None
+        self.cmd_entry = None
+        self.pending_var = None
+        self.rule_var = None
+        self.usage_var = None
+    
+    def create_frame(self, parent):
+        """创建标签页框架（不需要界面的场合，如基准测试，可以覆盖）"""
+        return ttk.Frame(parent)
+    
+    def materialize(self):
+        """创建标签页中的控件，之后由调用方从回滚缓冲区重放"""
+        if self.materialized:
+            return
+        self.materialized = True
+        config = self.config
         
         # 创建工具栏
         self.create_toolbar()
         
         # 创建文本显示区域
-        self.text_widget = scrolledtext.ScrolledText(
-            self.tab_frame,
-            wrap=tk.WORD,
+        text_options = dict(
             bg=FLAT_THEME['bg_dark'],
             fg=FLAT_THEME['text_light'],
             insertbackground=FLAT_THEME['text_light'],
@@ -35,7 +135,19 @@ class ConsoleTab:
             relief='flat',
             borderwidth=1
         )
-        self.text_widget.pack(fill=tk.BOTH, expand=True, padx=1, pady=1)
+        if config.get('virtual_view', False):
+            # 虚拟化视图：只装载可见的一屏，适合超长历史
+            self.output_view = VirtualOutputView(self.tab_frame, self.scrollback, **text_options)
+            self.output_view.pack(fill=tk.BOTH, expand=True, padx=1, pady=1)
+            self.text_widget = self.output_view.text
+        else:
+            self.output_view = None
+            self.text_widget = scrolledtext.ScrolledText(
+                self.tab_frame,
+                wrap=tk.WORD,
+                **text_options
+            )
+            self.text_widget.pack(fill=tk.BOTH, expand=True, padx=1, pady=1)
         
         # 创建输入框和按钮
         input_frame = ttk.Frame(self.tab_frame, style='Flat.TFrame')
@@ -54,13 +166,15 @@ class ConsoleTab:
         btn_frame.pack(side=tk.RIGHT)
         
         self.create_button(btn_frame, "发送", self.send_command, FLAT_THEME['primary'])
+        self.create_button(btn_frame, "发送文件", self.send_file, FLAT_THEME['info'])
         self.create_button(btn_frame, "停止", self.stop, FLAT_THEME['error'])
         self.create_button(btn_frame, "清除", self.clear_output, FLAT_THEME['warning'])
         
         # 应用文本标签样式
         self.setup_text_tags()
-        
-
+        if self.rules:
+            self.update_rule_counts()
+        self.update_pending()
     
     def create_toolbar(self):
         """创建标签页工具栏"""
@@ -87,6 +201,34 @@ class ConsoleTab:
         )
         title_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
         
+        # 进程树的 CPU 和内存占用
+        self.usage_var = tk.StringVar()
+        ttk.Label(
+            toolbar,
+            textvariable=self.usage_var,
+            style='Title.TLabel',
+            font=('Segoe UI', 9)
+        ).pack(side=tk.RIGHT, padx=(10, 0))
+        
+        # 待写入 stdin 的字节数
+        self.pending_var = tk.StringVar()
+        ttk.Label(
+            toolbar,
+            textvariable=self.pending_var,
+            style='Title.TLabel',
+            font=('Segoe UI', 9)
+        ).pack(side=tk.RIGHT, padx=(10, 0))
+        
+        # 规则命中计数
+        self.rule_var = tk.StringVar()
+        if self.rules:
+            ttk.Label(
+                toolbar,
+                textvariable=self.rule_var,
+                style='Title.TLabel',
+                font=('Segoe UI', 9)
+            ).pack(side=tk.RIGHT)
+        
         # 移除自动启动复选框
     
     def create_button(self, parent, text, command, color):
@@ -137,12 +279,43 @@ class ConsoleTab:
         
         for tag_name, tag_config in tags_config.items():
             self.text_widget.tag_configure(tag_name, **tag_config)
+        
+        # ANSI 颜色标签，后创建的标签优先级更高，会覆盖 output/error 的前景色
+        for index, color in enumerate(ANSI_COLORS):
+            self.text_widget.tag_configure(f'ansi_fg_{index}', foreground=color)
+            self.text_widget.tag_configure(f'ansi_bg_{index}', background=color)
+        self.text_widget.tag_configure('ansi_bold', font=('Consolas', 10, 'bold'))
+        self.text_widget.tag_configure('ansi_underline', underline=True)
+        
+        # 规则的标签最后创建，优先级最高；指定了已有标签的规则复制它的样式
+        for rule in self.rules.rules:
+            if rule.tag is None:
+                continue
+            style = {}
+            if rule.base_tag:
+                for option in ('foreground', 'background', 'font', 'underline'):
+                    try:
+                        value = self.text_widget.tag_cget(rule.base_tag, option)
+                    except tk.TclError:
+                        break
+                    if value:
+                        style[option] = value
+            style.update(rule.style)
+            if rule.bold:
+                style['font'] = ('Consolas', 10, 'bold')
+            self.text_widget.tag_configure(rule.tag, **style)
     
     def update_status_indicator(self):
         """更新状态指示灯"""
+        if self.status_indicator is None:
+            return
         self.status_indicator.delete("all")
         
-        if self.is_running:
+        if self.is_stopping or (self.restart_timer is not None and not self.is_running):
+            color = FLAT_THEME['warning']
+        elif self.crash_looping:
+            color = FLAT_THEME['error_tab']
+        elif self.is_running:
             color = FLAT_THEME['running']
         elif self.exit_code is not None and self.exit_code != 0:
             color = FLAT_THEME['error_tab']
@@ -159,35 +332,44 @@ class ConsoleTab:
     
     def update_tab_title(self):
         """更新标签页标题"""
-        if self.is_running:
+        if self.is_stopping:
+            status_text = "[停止中]"
+        elif self.is_running:
             status_text = "[运行中]"
+        elif self.crash_looping:
+            status_text = f"[崩溃循环 {self.last_exit_code}]"
+        elif self.restart_timer is not None:
+            status_text = "[等待重启]"
         elif self.exit_code is not None and self.exit_code != 0:
-            status_text = "[异常退出]"
+            status_text = f"[异常退出 {self.exit_code}]"
         else:
             status_text = "[停止]"
         
         full_title = f"{self.name} {status_text}"
+        if self.restart_count:
+            full_title += f" ↻{self.restart_count}"
         
-        # 更新标签页标题
-        tab_id = self.app.get_tab_id(self.name)
-        if tab_id is not None:
-            self.app.notebook.notebook.tab(tab_id, text=full_title)
-            
-            # 如果异常退出，设置标签页颜色
-            if self.exit_code is not None and self.exit_code != 0:
-                # 尝试设置标签页颜色，但避免使用不支持的foreground选项
-                try:
-                    self.app.notebook.notebook.tab(tab_id, text=full_title)
-                except:
-                    pass
-            else:
-                # 正常状态，直接更新标签页标题
-                self.app.notebook.notebook.tab(tab_id, text=full_title)
+        # 直接按框架更新标签页标题，不按名称逐个查找标签页
+        try:
+            self.app.notebook.notebook.tab(self.tab_frame, text=full_title)
+        except tk.TclError:
+            # 标签页已被移除
+            pass
     
     # 移除 toggle_auto_start 方法，因为自动启动复选框已被移除
     
     def clear_output(self):
         """清除输出"""
+        self.scrollback.clear()
+        if self.rules:
+            self.rule_counts = {}
+            self.update_rule_counts()
+        if not self.materialized:
+            return
+        if self.output_view:
+            self.output_view.clear()
+            return
+        self.widget_version = self.scrollback.version
         self.text_widget.delete(1.0, tk.END)
     
     def send_command(self, event=None):
@@ -200,37 +382,393 @@ class ConsoleTab:
                     timestamp = datetime.now().strftime("%H:%M:%S")
                     self.append_output(f"\n[{timestamp}] > {command}\n", 'timestamp')
                     
-                    # 发送命令
-                    self.process.stdin.write(command + '\n')
-                    self.process.stdin.flush()
+                    # 发送命令：排入发送队列，由 I/O 线程在管道可写时写入，不阻塞界面
+                    self.app.io_loop.write(self.watch, (command + '\n').encode(self.encoding, 'replace'))
                     self.cmd_entry.delete(0, tk.END)
+                    self.update_pending()
                 except Exception as e:
                     self.append_output(f"无法发送命令: {str(e)}\n", 'error')
     
-    def stop(self):
-        """停止控制台"""
-        if self.process and self.is_running:
+    def send_file(self):
+        """把文件内容分块写入子进程 stdin"""
+        if not (self.process and self.is_running and self.watch):
+            return
+        path = filedialog.askopenfilename(title="选择要发送到标准输入的文件")
+        if not path:
+            return
+        
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.append_output(f"\n[{timestamp}] > 发送文件: {path}\n", 'timestamp')
+        process = self.process
+        self.app.io_loop.send_file(
+            self.watch, path,
+            lambda error: self.on_file_sent(process, path, error)
+        )
+        self.update_pending()
+    
+    def on_file_sent(self, process, path, error):
+        """文件发送结束（在 I/O 线程中调用）"""
+        if process is not self.process:
+            return
+        if error is None:
+            self.append_output(f"文件已发送: {path}\n", 'info')
+        else:
+            self.append_output(f"文件发送失败: {path}: {error}\n", 'error')
+    
+    def on_stdin_error(self, process, error):
+        """写入 stdin 失败（在 I/O 线程中调用）"""
+        if process is self.process:
+            self.append_output(f"无法发送到标准输入: {error}\n", 'error')
+    
+    def update_pending(self):
+        """刷新待发送字节数，队列清空前每 200 毫秒刷新一次"""
+        if self.pending_var is None:
+            return
+        pending = self.watch.pending_bytes if self.watch else 0
+        self.pending_var.set(f"待发送: {format_size(pending)}" if pending else "")
+        if pending and self.pending_after_id is None:
+            self.pending_after_id = self.tab_frame.after(200, self.on_pending_timer)
+    
+    def update_usage(self, usage):
+        """显示资源采样结果，usage 为 None 时清空"""
+        if self.usage_var is None:
+            return
+        if usage is None:
+            self.usage_var.set("")
+            return
+        cpu = '-' if usage.cpu_percent is None else f"{usage.cpu_percent:.1f}%"
+        text = f"CPU: {cpu}  内存: {format_size(usage.rss)}"
+        if usage.processes > 1:
+            text += f"  进程: {usage.processes}"
+        self.usage_var.set(text)
+    
+    def on_pending_timer(self):
+        self.pending_after_id = None
+        self.update_pending()
+    
+    def stop(self, then=None):
+        """按停止策略异步停止控制台，then 在进程真正退出后于主线程调用
+        
+        依次发送停止命令、终止信号、强制结束，由 I/O 线程的定时器推进，
+        不阻塞界面；进程退出被回收前标签页显示为“停止中”。
+        等待中的自动重启会被取消。
+        """
+        if self.cancel_restart():
+            self.update_status_indicator()
+            self.update_tab_title()
+        if not (self.process and self.is_running):
+            if then is not None:
+                then()
+            return
+        if then is not None:
+            self.after_stop.append(then)
+        if self.is_stopping:
+            return
+        
+        self.is_stopping = True
+        self.update_status_indicator()
+        self.update_tab_title()
+        
+        process = self.process
+        policy = self.stop_policy
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        if policy.command and self.watch and self.watch.stdin is not None:
+            self.append_output(f"[{timestamp}] 正在停止，发送命令: {policy.command}\n", 'warning')
+            self.app.io_loop.write(self.watch, (policy.command + '\n').encode(self.encoding, 'replace'))
+            self.stop_timer = self.app.io_loop.call_later(
+                policy.command_timeout, self.escalate_stop, process, 'terminate'
+            )
+        else:
+            self.append_output(f"[{timestamp}] 正在停止\n", 'warning')
+            self.escalate_stop(process, 'terminate')
+    
+    def escalate_stop(self, process, step):
+        """停止的下一步：terminate 发送终止信号，kill 强制结束（可在任意线程调用）"""
+        if process is not self.process or not self.is_stopping or process.poll() is not None:
+            return
+        try:
+            if step == 'terminate':
+                self.tree.terminate()
+                self.stop_timer = self.app.io_loop.call_later(
+                    self.stop_policy.terminate_timeout, self.escalate_stop, process, 'kill'
+                )
+            else:
+                self.tree.kill()
+                self.append_output("进程未在超时时间内退出，已强制结束\n", 'error')
+        except OSError as e:
+            self.append_output(f"无法停止进程: {str(e)}\n", 'error')
+    
+    def kill(self):
+        """立即强制结束进程及其后代"""
+        if self.process and self.process.poll() is None:
             try:
-                self.process.terminate()
-                self.is_running = False
-                self.exit_code = None
-                self.update_status_indicator()
-                self.update_tab_title()
-                self.append_output("进程已停止\n", 'warning')
-            except Exception as e:
-                self.append_output(f"无法停止进程: {str(e)}\n", 'error')
-    
-    def append_output(self, text, tag=None):
-        """添加输出到文本区域"""
-        self.text_widget.insert(tk.END, text)
-        if tag:
-            start = self.text_widget.index(f"end-{len(text)}c")
-            end = self.text_widget.index("end")
-            self.text_widget.tag_add(tag, start, end)
+                self.tree.kill()
+            except OSError as e:
+                self.append_output(f"无法结束进程: {str(e)}\n", 'error')
+    
+    def restart(self):
+        """停止后重新启动"""
+        self.stop(then=self.run)
+    
+    def schedule_restart(self, returncode):
+        """进程意外退出后按重启策略安排重启（在 I/O 线程或主线程中调用）"""
+        policy = self.restart_policy
+        if not policy.should_restart(returncode) or getattr(self.app, 'exiting', False):
+            return
+        now = time.monotonic()
+        if now - self.started_at >= policy.reset_after:
+            # 运行了足够长的时间，不再视为连续崩溃
+            self.restart_attempt = 0
+        
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        if policy.crash_looping(self.restart_history, now):
+            self.crash_looping = True
+            self.append_output(
+                f"[{timestamp}] {policy.window:g} 秒内已重启 {len(self.restart_history)} 次，"
+                f"判定为崩溃循环，停止自动重启\n", 'error'
+            )
+            self.app.output_dispatcher.post(self.on_restart_state_changed)
+            return
+        
+        delay = policy.next_delay(self.restart_attempt)
+        self.restart_attempt += 1
+        self.restart_history.append(now)
+        self.append_output(f"[{timestamp}] 将在 {delay:.1f} 秒后自动重启\n", 'warning')
+        self.restart_timer = self.app.io_loop.call_later(
+            delay, self.app.output_dispatcher.post, self.auto_restart
+        )
+        self.app.output_dispatcher.post(self.on_restart_state_changed)
+    
+    def auto_restart(self):
+        """到时间后自动重启（主线程）"""
+        if self.restart_timer is None:
+            # 已被取消
+            return
+        self.restart_timer = None
+        if self.is_running or getattr(self.app, 'exiting', False):
+            return
+        self.restart_count += 1
+        self.run(automatic=True)
+        self.on_restart_state_changed()
+    
+    def cancel_restart(self):
+        """取消等待中的自动重启，返回是否有等待中的重启"""
+        timer, self.restart_timer = self.restart_timer, None
+        if timer is None:
+            return False
+        timer.cancel()
+        return True
+    
+    def on_restart_state_changed(self):
+        """重启状态变化后刷新标签页和托盘菜单（主线程）"""
+        self.update_status_indicator()
+        self.update_tab_title()
+        tray_manager = getattr(self.app, 'tray_manager', None)
+        if tray_manager:
+            tray_manager.update_menu()
+    
+    def next_seq(self):
+        """取下一个输出顺序号（itertools.count 的 next 是原子操作，可在任意线程调用）"""
+        return next(self.sequence)
+    
+    def append_output(self, text, tag=None, seq=None, timestamp=None, render=True):
+        """添加输出（可在任意线程调用，由输出调度器统一批量刷新）
+        
+        render 为 False 时只写入回滚缓冲区，不刷新到界面。
+        标签页不可见时同样只写缓冲区，选中时再从缓冲区重放。
+        """
+        if seq is None:
+            seq = self.next_seq()
+        # 追加和入队在同一把锁内完成，保证队列中的版本号与追加顺序一致
+        with self.scrollback.lock:
+            self.scrollback.append(text, tag, timestamp)
+            if not render:
+                return
+            if not self.visible:
+                self.render_stale = True
+                return
+            self.app.output_dispatcher.put(self, text, tag, seq, self.scrollback.version)
+    
+    def append_notice(self, text, tag, seq=None):
+        """只显示在界面上的提示，不写入回滚缓冲区"""
+        if seq is None:
+            seq = self.next_seq()
+        with self.scrollback.lock:
+            # 隐藏的标签页不会显示提示，不必入队
+            if self.visible:
+                self.app.output_dispatcher.put(self, text, tag, seq, self.scrollback.version)
+    
+    def flush_suppressed(self, seq=None):
+        """显示上次汇总之后被省略的输出量（在 I/O 线程中调用）"""
+        if not self.render_budget:
+            return
+        summary = self.render_budget.pop_summary()
+        if summary:
+            lines, size = summary
+            self.append_notice(f"… 已省略 {lines:,} 行，{format_size(size)}\n", 'warning', seq)
+    
+    def spool(self, stream, text, timestamp=None):
+        """把输出交给后台写线程落盘"""
+        if self.spool_enabled:
+            self.app.output_spool.write(self.name, stream, text, timestamp)
+    
+    def flush_output(self, chunks):
+        """批量写入一帧内积累的输出，只滚动一次"""
+        if self.rule_counts_dirty:
+            self.update_rule_counts()
+        
+        if not self.visible:
+            # 不可见时内容已在回滚缓冲区中，选中时再重放
+            self.render_stale = True
+            return
+        
+        if self.output_view:
+            # 虚拟化视图直接从回滚缓冲区读取
+            self.output_view.refresh()
+            return
+        
+        # 合并相邻的同标签片段，减少插入参数数量
+        merged = []
+        for text, tag, version in chunks:
+            if version <= self.widget_version:
+                # 已经通过重放写入控件
+                continue
+            if text.startswith('\r'):
+                # 回车重写：先插入之前的内容，再删除未结束的最后一行
+                self.insert_merged(merged)
+                merged = []
+                self.text_widget.delete('end-1c linestart', 'end-1c')
+                text = text[1:]
+                if not text:
+                    continue
+            if merged and merged[-1][1] == tag:
+                merged[-1][0].append(text)
+            else:
+                merged.append(([text], tag))
+        
+        self.insert_merged(merged)
+        self.trim_widget()
+        self.text_widget.see(tk.END)
+    
+    def show(self):
+        """标签页被选中，第一次显示时创建控件，补上隐藏期间的输出"""
+        # 与 append_output 共用缓冲区的锁：之后的输出都会入队，之前的输出都由重放补上
+        with self.scrollback.lock:
+            self.visible = True
+            stale = self.render_stale
+            self.render_stale = False
+        if not self.materialized:
+            self.materialize()
+            stale = True
+        # 隐藏期间输出不入队，规则计数也没有随刷新更新
+        if self.rule_counts_dirty:
+            self.update_rule_counts()
+        if not stale:
+            return
+        if self.output_view:
+            self.output_view.refresh()
+        else:
+            self.replay()
+    
+    def hide(self):
+        """标签页不再可见"""
+        self.visible = False
+    
+    def replay(self):
+        """用回滚缓冲区的内容重建文本控件"""
+        with self.scrollback.lock:
+            version = self.scrollback.version
+            first = self.scrollback.first_serial
+            lines = self.scrollback.get_segments(first, len(self.scrollback))
+            line_open = self.scrollback.line_open
+        
+        args = []
+        for index, (segments, _) in enumerate(lines):
+            for text, tag in segments:
+                args.append(text)
+                args.append(tag or ())
+            # 未结束的最后一行不加换行，后续输出接着写
+            if index < len(lines) - 1 or not line_open:
+                args.append('\n')
+                args.append(())
+        
+        self.text_widget.delete('1.0', tk.END)
+        if args:
+            self.text_widget.insert(tk.END, *args)
+        self.widget_version = version
         self.text_widget.see(tk.END)
     
-    def run(self):
-        """运行控制台"""
+    def update_rule_counts(self):
+        """刷新工具栏上的规则命中计数"""
+        self.rule_counts_dirty = False
+        if self.rule_var is None:
+            return
+        counts = dict(self.rule_counts)
+        self.rule_var.set('  '.join(f"{name}: {count}" for name, count in counts.items()))
+    
+    def on_rule_hits(self, hits, line):
+        """记录规则命中并触发动作（在 I/O 线程中调用）"""
+        now = time.monotonic()
+        seen = set()
+        for _, _, rule in hits:
+            if rule.index in seen:
+                continue
+            seen.add(rule.index)
+            # 按行计数
+            self.rule_counts[rule.name] = self.rule_counts.get(rule.name, 0) + 1
+            if rule.action:
+                last = self.rule_last_action.get(rule.index)
+                if last is None or now - last >= rule.cooldown:
+                    self.rule_last_action[rule.index] = now
+                    self.app.output_dispatcher.post(self.run_rule_action, rule, line)
+        self.rule_counts_dirty = True
+    
+    def run_rule_action(self, rule, line):
+        """执行规则动作（主线程）"""
+        if rule.action == 'bell':
+            self.tab_frame.bell()
+        elif rule.action == 'notify':
+            tray_manager = getattr(self.app, 'tray_manager', None)
+            if tray_manager and tray_manager.tray_icon:
+                try:
+                    tray_manager.tray_icon.notify(line[:200], f"{self.name}: {rule.name}")
+                except Exception:
+                    pass
+    
+    def insert_merged(self, merged):
+        """一次插入多段文本"""
+        args = []
+        for texts, tag in merged:
+            args.append(''.join(texts))
+            args.append(tag or ())
+        if args:
+            self.text_widget.insert(tk.END, *args)
+    
+    def trim_widget(self):
+        """删除文本控件顶部超出回滚缓冲区行数的行
+        
+        缓冲区可能按字节上限淘汰，行数少于 max_lines，按缓冲区实际的行数裁剪。
+        省略的输出不进入控件，控件的行可能少于缓冲区，这时不需要裁剪。
+        """
+        with self.scrollback.lock:
+            limit = len(self.scrollback)
+            if not self.scrollback.line_open:
+                # 最后一行已结束时，控件末尾还有一个空行
+                limit += 1
+        widget_lines = int(self.text_widget.index('end-1c').split('.')[0])
+        excess = widget_lines - limit
+        if excess > 0:
+            self.text_widget.delete('1.0', f'{excess + 1}.0')
+    
+    def run(self, automatic=False):
+        """运行控制台，automatic 为 True 表示由重启策略自动重启"""
+        self.cancel_restart()
+        if not automatic:
+            # 手动启动时清除崩溃循环状态，重新计算重启次数
+            self.crash_looping = False
+            self.restart_attempt = 0
+            self.restart_history.clear()
+        self.started_at = time.monotonic()
         try:
             # 创建工作目录
             work_dir = self.config.get('work_dir', '.')
@@ -255,81 +793,230 @@ class ConsoleTab:
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 stdin=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True,
-                creationflags=subprocess.CREATE_NO_WINDOW
+                # POSIX 上在独立的会话中运行，Windows 上不创建窗口
+                **popen_options()
             )
+            self.tree = ProcessTree(self.process)
+            self.ready_check = None
             
             self.is_running = True
             self.exit_code = None
+            self.create_decoders()
             
             # 更新状态
             self.update_status_indicator()
             self.update_tab_title()
             
-            # 启动输出读取线程
-            threading.Thread(target=self.read_output, daemon=True).start()
-            threading.Thread(target=self.read_error, daemon=True).start()
-            
-            # 启动进程监控线程
-            threading.Thread(target=self.monitor_process, daemon=True).start()
-            
             # 添加启动信息
             timestamp = datetime.now().strftime("%H:%M:%S")
             self.append_output(f"[{timestamp}] 启动命令: {' '.join(cmd)}\n", 'timestamp')
+            self.spool('system', f"启动命令: {' '.join(cmd)} (工作目录: {work_dir})")
             self.append_output(f"[{timestamp}] 工作目录: {work_dir}\n\n", 'timestamp')
             
+            # 交给共享的 I/O 线程读取输出并回收进程
+            process = self.process
+            self.watch = self.app.io_loop.add_process(
+                process,
+                lambda stream, data, seq, timestamp: self.on_process_output(process, stream, data, seq, timestamp),
+                lambda returncode: self.on_process_exit(process, returncode),
+                sequence=self.sequence
+            )
+            self.watch.on_write_error = lambda error: self.on_stdin_error(process, error)
+            sampler = getattr(self.app, 'resource_sampler', None)
+            if sampler is not None:
+                sampler.track(self, process.pid)
+            
         except Exception as e:
             self.append_output(f"[{datetime.now().strftime('%H:%M:%S')}] 启动失败: {str(e)}\n", 'error')
             self.is_running = False
             self.exit_code = -1
+            self.last_exit_code = -1
+            if automatic:
+                self.schedule_restart(-1)
             self.update_status_indicator()
             self.update_tab_title()
     
-    def read_output(self):
-        """读取标准输出"""
-        while self.process and self.is_running:
-            try:
-                line = self.process.stdout.readline()
-                if line:
-                    timestamp = datetime.now().strftime("%H:%M:%S")
-                    formatted_line = f"[{timestamp}] {line}"
-                    self.text_widget.after(0, self.append_output, formatted_line, 'output')
-                elif self.process.poll() is not None:
-                    break
-            except:
-                break
-    
-    def read_error(self):
-        """读取错误输出"""
-        while self.process and self.is_running:
-            try:
-                line = self.process.stderr.readline()
-                if line:
-                    timestamp = datetime.now().strftime("%H:%M:%S")
-                    formatted_line = f"[{timestamp}] {line}"
-                    self.text_widget.after(0, self.append_output, formatted_line, 'error')
-                elif self.process.poll() is not None:
-                    break
-            except:
-                break
-    
-    def monitor_process(self):
-        """监控进程状态"""
-        self.process.wait()
-        self.exit_code = self.process.returncode
-        self.is_running = False
+    def create_decoders(self):
+        """为新进程创建 stdout/stderr 解码器"""
+        try:
+            self.decoders = {stream: LineDecoder(self.encoding) for stream in ('stdout', 'stderr')}
+        except LookupError:
+            self.append_output(f"未知编码 {self.encoding}，改用 utf-8\n", 'warning')
+            self.encoding = 'utf-8'
+            self.decoders = {stream: LineDecoder('utf-8') for stream in ('stdout', 'stderr')}
+        self.parsers = {stream: AnsiParser() for stream in ('stdout', 'stderr')}
+        self.open_stream = None
+        self.open_prefix = ''
+        self.spool_partial = {'stdout': '', 'stderr': ''}
+    
+    def on_process_output(self, process, stream, data, seq, timestamp):
+        """处理 I/O 线程读到的输出块，seq/timestamp 为读取时打上的顺序号和时间"""
+        with self.output_lock:
+            if process is not self.process:
+                return
+            decoder = self.decoders[stream]
+            lines = decoder.feed(data)
+            if self.rules and lines:
+                # 规则按整块预先匹配，比逐行匹配省掉大部分调用开销
+                found = self.rules.scan_lines(lines)
+                for number, line in enumerate(lines):
+                    self.write_stream(stream, line, True, seq, timestamp, found.get(number, ()))
+            else:
+                for line in lines:
+                    self.write_stream(stream, line, True, seq, timestamp)
+            
+            # 一直没有换行的超长内容不再等待，直接提前显示
+            if decoder.partial_full:
+                text = decoder.flush_partial()
+                if text:
+                    self.write_stream(stream, text, False, seq, timestamp)
+            
+            # 有未完成的行时，这一行开始一段时间后提前显示
+            if decoder.partial_time is not None and self.partial_timer is None:
+                self.partial_timer = self.app.io_loop.call_later(
+                    self.partial_timeout, self.flush_partials, process
+                )
+    
+    def flush_partials(self, process):
+        """显示空闲超时的未完成行（在 I/O 线程中调用）"""
+        with self.output_lock:
+            self.partial_timer = None
+            if process is not self.process:
+                return
+            waiting = False
+            for stream, decoder in self.decoders.items():
+                text = decoder.flush_partial(self.partial_timeout)
+                if text:
+                    self.write_stream(stream, text, False, self.next_seq(), time.time())
+                waiting = waiting or decoder.partial_time is not None
+            if waiting:
+                self.partial_timer = self.app.io_loop.call_later(
+                    self.partial_timeout, self.flush_partials, process
+                )
+    
+    def write_stream(self, stream, text, complete, seq, timestamp, hits=None):
+        """显示并落盘一段解码后的输出，complete 表示以换行结束
+        
+        ANSI 颜色转换成文本标签；回车重写只保留最后的内容，
+        已显示的未结束行会被整行替换。hits 为按原始文本预先匹配的规则命中
+        （RuleSet.scan_lines 的结果），为 None 时在这里匹配。
+        """
+        if self.open_stream is not None and self.open_stream != stream:
+            # 另一个流的行还没结束，先换行
+            self.append_output('\n', None, seq, timestamp, self.rendering)
+            self.open_stream = None
+        
+        parser = self.parsers[stream]
+        rewrite, segments = parser.feed(text)
+        plain = ''.join(part for part, _ in segments)
+        tag = 'output' if stream == 'stdout' else 'error'
+        
+        if self.open_stream == stream:
+            # 续写的行沿用行首时的刷新决定
+            if self.render_budget:
+                if self.rendering:
+                    self.render_budget.take_bytes(len(text))
+                else:
+                    self.render_budget.suppress(len(text))
+            if rewrite:
+                # 以回车开头的片段替换整行，保留原来的时间戳前缀
+                self.append_output('\r' + self.open_prefix, tag, seq, timestamp, self.rendering)
+                self.spool_partial[stream] = ''
+        else:
+            # 新的一行：按刷新预算决定是否显示，恢复显示时先补一行省略汇总
+            if self.render_budget:
+                self.rendering = self.render_budget.take_line(len(text))
+                if self.rendering:
+                    self.flush_suppressed(seq)
+            self.open_prefix = f"[{datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')}] "
+            self.append_output(self.open_prefix, tag, seq, timestamp, self.rendering)
+        
+        if complete and self.rules:
+            # 规则在整行结束时匹配一次，已提前显示的部分只计数不再高亮
+            line = self.spool_partial[stream] + plain
+            if hits is None or line != text:
+                # 行首已提前显示过一部分，或转义/回车处理改变了文本，预先匹配的位置不适用
+                hits = self.rules.scan(line)
+            if hits:
+                segments = highlight_segments(segments, hits, len(line) - len(plain))
+                self.on_rule_hits(hits, line)
+        
+        for part, ansi_tags in segments:
+            self.append_output(part, (tag,) + ansi_tags if ansi_tags else tag, seq, timestamp, self.rendering)
+        
+        if complete:
+            if self.ready_check is not None:
+                self.ready_check.feed_line(self.spool_partial[stream] + plain)
+            self.append_output('\n', tag, seq, timestamp, self.rendering)
+            self.spool(stream, self.spool_partial[stream] + plain, timestamp)
+            self.spool_partial[stream] = ''
+            self.open_stream = None
+            parser.end_line()
+        else:
+            self.spool_partial[stream] += plain
+            self.open_stream = stream
+    
+    def on_process_exit(self, process, returncode):
+        """进程退出（在 I/O 线程中调用）"""
+        # 输出最后不带换行的内容
+        with self.output_lock:
+            if process is self.process:
+                if self.partial_timer is not None:
+                    self.partial_timer.cancel()
+                    self.partial_timer = None
+                for stream, decoder in self.decoders.items():
+                    text = decoder.finish()
+                    if text or self.open_stream == stream:
+                        self.write_stream(stream, text, True, self.next_seq(), time.time())
+                # 进程结束后不会再有新行触发汇总
+                self.flush_suppressed()
         
         timestamp = datetime.now().strftime("%H:%M:%S")
+        stopped = process is self.process and self.is_stopping
         
-        if self.process.returncode == 0:
-            message = f"[{timestamp}] 进程正常退出，退出码: {self.process.returncode}\n"
+        if stopped:
+            message = f"[{timestamp}] 进程已停止，退出码: {returncode}\n"
+            tag = 'warning'
+        elif returncode == 0:
+            message = f"[{timestamp}] 进程正常退出，退出码: {returncode}\n"
             tag = 'success'
         else:
-            message = f"[{timestamp}] 进程异常退出，退出码: {self.process.returncode}\n"
+            message = f"[{timestamp}] 进程异常退出，退出码: {returncode}\n"
             tag = 'error'
         
-        self.text_widget.after(0, self.append_output, message, tag)
-        self.text_widget.after(0, self.update_status_indicator)
-        self.text_widget.after(0, self.update_tab_title)
+        self.append_output(message, tag)
+        self.spool('system', f"进程退出，退出码: {returncode}")
+        
+        ready_check = self.ready_check if process is self.process else None
+        if ready_check is not None:
+            ready_check.process_exited(returncode)
+        
+        # 主动停止时，控制台进程退出后仍残留的后代进程直接结束
+        if stopped and self.tree is not None:
+            survivors = self.tree.survivors()
+            if survivors:
+                self.tree.kill()
+                self.append_output(f"已结束残留的子进程 {len(survivors)} 个: {', '.join(map(str, survivors))}\n", 'warning')
+        
+        # 控制台已重新启动时，旧进程的退出不影响当前状态
+        if process is not self.process:
+            return
+        
+        if self.stop_timer is not None:
+            self.stop_timer.cancel()
+            self.stop_timer = None
+        sampler = getattr(self.app, 'resource_sampler', None)
+        if sampler is not None:
+            sampler.untrack(self)
+        # 主动停止的进程不算异常退出
+        self.exit_code = None if stopped else returncode
+        self.last_exit_code = returncode
+        self.is_running = False
+        self.is_stopping = False
+        if not stopped:
+            self.schedule_restart(returncode)
+        self.app.output_dispatcher.post(self.update_status_indicator)
+        self.app.output_dispatcher.post(self.update_tab_title)
+        callbacks, self.after_stop = self.after_stop, []
+        for callback in callbacks:
+            self.app.output_dispatcher.post(callback)
@@ -0,0 +1,442 @@
+import os
+import sys
+import heapq
+import itertools
+import queue
+from collections import deque
+import selectors
+import socket
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TimerHandle:
+    """call_later 返回的句柄，可用于取消"""
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class ProcessWatch:
+    """在 I/O 线程中登记的一个子进程"""
+    def __init__(self, process, on_output, on_exit, sequence=None):
+        self.process = process
+        self.on_output = on_output
+        self.on_exit = on_exit
+        # 读取序号，可由调用方传入以便跨进程重启保持单调递增
+        self.sequence = sequence if sequence is not None else itertools.count()
+        self.sequence_lock = threading.Lock()
+        self.streams = {}
+        self.returncode = None
+        self.exited_at = None
+
+        # stdin 发送队列：每项是一个产生字节块的迭代器
+        self.stdin = process.stdin
+        self.outbox = deque()
+        self.write_buffer = None
+        self.write_registered = False
+        self.write_queue = None
+        self.pending_lock = threading.Lock()
+        # 已排队但尚未写入管道的字节数（可在任意线程读取）
+        self.pending_bytes = 0
+        # 写入失败时在 I/O 线程中调用 on_write_error(error)
+        self.on_write_error = None
+
+    def add_pending(self, size):
+        with self.pending_lock:
+            self.pending_bytes = max(0, self.pending_bytes + size)
+
+
+class IOLoop:
+    """所有控制台共用的 I/O 线程
+
+    用 selectors 同时监听全部子进程的 stdout/stderr，并定期回收已退出的进程，
+    线程数量不再随控制台数量增长。发往 stdin 的数据先进入队列，
+    管道可写时以非阻塞方式写入，子进程不读取时也不会卡住调用方。
+    Windows 上管道不能被 select，退化为每个管道一个读写线程，
+    进程回收仍由本线程统一完成。
+    """
+    def __init__(self, reap_interval=0.2, exit_grace=0.5, chunk_size=64 * 1024):
+        self.reap_interval = reap_interval
+        self.exit_grace = exit_grace
+        self.chunk_size = chunk_size
+        self.use_threads = sys.platform == 'win32'
+
+        self.selector = selectors.DefaultSelector()
+        self.wakeup_r, self.wakeup_w = socket.socketpair()
+        self.wakeup_r.setblocking(False)
+        self.wakeup_w.setblocking(False)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ, None)
+
+        # 读取用的复用缓冲区，避免每次读取都分配一块 chunk_size 大小的内存
+        self.buffer = bytearray(chunk_size)
+        self.view = memoryview(self.buffer)
+
+        self.pending = queue.SimpleQueue()
+        self.timers = []
+        self.timer_seq = itertools.count()
+        self.watches = []
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        """启动 I/O 线程"""
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, name='IOLoop', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=2):
+        """停止 I/O 线程"""
+        if self.thread is not None:
+            self.running = False
+            self.wakeup()
+            self.thread.join(timeout)
+            self.thread = None
+
+    def wakeup(self):
+        """唤醒阻塞在 select 上的 I/O 线程"""
+        try:
+            self.wakeup_w.send(b'\0')
+        except OSError:
+            pass
+
+    def call_soon(self, callback, *args):
+        """在 I/O 线程中执行回调（可在任意线程调用）"""
+        self.pending.put((callback, args))
+        self.wakeup()
+
+    def call_later(self, delay, callback, *args):
+        """延迟执行回调（可在任意线程调用），返回可取消的句柄"""
+        handle = TimerHandle(time.monotonic() + delay, callback, args)
+        self.call_soon(self._add_timer, handle)
+        return handle
+
+    def add_process(self, process, on_output, on_exit, sequence=None):
+        """登记子进程
+
+        on_output(stream, data, seq, timestamp) 在读到数据时调用，stream 为
+        'stdout' 或 'stderr'，seq 和 timestamp 在读取完成时打上，回调按 seq 顺序执行；
+        on_exit(returncode) 在进程退出且管道读完（或超过宽限时间）后调用。
+        两个回调都在 I/O 线程中执行。
+        """
+        watch = ProcessWatch(process, on_output, on_exit, sequence)
+        self.call_soon(self._add_process, watch)
+        return watch
+
+    def write(self, watch, data):
+        """把数据排入子进程 stdin 的发送队列（可在任意线程调用）"""
+        if not data or watch.stdin is None:
+            return
+        watch.add_pending(len(data))
+        self.call_soon(self._queue_write, watch, iter((data,)))
+
+    def send_file(self, watch, path, on_done=None):
+        """把文件分块写入子进程 stdin，不会一次读入内存（可在任意线程调用）
+
+        on_done(error) 在文件发送完成或打开/读取失败时调用（I/O 线程，Windows 下为写入线程），
+        成功时 error 为 None；进程退出或写入失败导致中止时不调用。
+        """
+        if watch.stdin is None:
+            return
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        watch.add_pending(size)
+        self.call_soon(self._queue_write, watch, self._read_file(watch, path, size, on_done))
+
+    def _read_file(self, watch, path, size, on_done):
+        """逐块读取文件的生成器，结束时按实际发送量校正待发送字节数"""
+        sent = 0
+        error = None
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    sent += len(chunk)
+                    yield chunk
+        except OSError as e:
+            error = e
+        watch.add_pending(sent - size)
+        if on_done is not None:
+            try:
+                on_done(error)
+            except Exception as e:
+                logger.error(f"处理文件发送结果失败: {e}")
+
+    def _queue_write(self, watch, source):
+        if watch not in self.watches or watch.stdin is None:
+            # 进程已回收或 stdin 已不可写
+            watch.add_pending(-watch.pending_bytes)
+            return
+        if self.use_threads:
+            if watch.write_queue is None:
+                watch.write_queue = queue.SimpleQueue()
+                threading.Thread(
+                    target=self._stdin_thread,
+                    args=(watch,),
+                    name='IOLoop-stdin',
+                    daemon=True
+                ).start()
+            watch.write_queue.put(source)
+        else:
+            watch.outbox.append(source)
+            self._flush_writes(watch)
+
+    @staticmethod
+    def _next_chunk(watch):
+        while watch.outbox:
+            chunk = next(watch.outbox[0], None)
+            if chunk is None:
+                watch.outbox.popleft()
+            elif chunk:
+                return chunk
+        return None
+
+    def _flush_writes(self, watch):
+        """尽量写出发送队列，管道写满时等待可写事件"""
+        fd = watch.stdin.fileno()
+        while True:
+            if not watch.write_buffer:
+                chunk = self._next_chunk(watch)
+                if chunk is None:
+                    break
+                watch.write_buffer = memoryview(chunk)
+            try:
+                count = os.write(fd, watch.write_buffer)
+            except BlockingIOError:
+                break
+            except (OSError, ValueError) as e:
+                self._write_failed(watch, e)
+                return
+            watch.write_buffer = watch.write_buffer[count:]
+            watch.add_pending(-count)
+
+        waiting = bool(watch.write_buffer) or bool(watch.outbox)
+        if waiting and not watch.write_registered:
+            self.selector.register(watch.stdin, selectors.EVENT_WRITE, (watch, 'stdin'))
+            watch.write_registered = True
+        elif not waiting and watch.write_registered:
+            self._unregister_stdin(watch)
+
+    def _stdin_thread(self, watch):
+        """Windows 下的 stdin 写入线程"""
+        while True:
+            source = watch.write_queue.get()
+            if source is None:
+                break
+            for chunk in source:
+                try:
+                    watch.stdin.write(chunk)
+                    watch.stdin.flush()
+                except (OSError, ValueError) as e:
+                    self.call_soon(self._write_failed, watch, e)
+                    return
+                watch.add_pending(-len(chunk))
+
+    def _write_failed(self, watch, error):
+        """写入失败（通常是子进程关闭了 stdin），丢弃剩余的发送队列，之后的写入直接忽略"""
+        if watch.stdin is None:
+            return
+        self._clear_writes(watch)
+        watch.stdin = None
+        if watch.on_write_error is not None:
+            try:
+                watch.on_write_error(error)
+            except Exception as e:
+                logger.error(f"处理写入失败回调出错: {e}")
+
+    def _clear_writes(self, watch):
+        if watch.stdin is None:
+            return
+        if watch.write_registered:
+            self._unregister_stdin(watch)
+        for source in watch.outbox:
+            close = getattr(source, 'close', None)
+            if close is not None:
+                close()
+        watch.outbox.clear()
+        watch.write_buffer = None
+        if watch.write_queue is not None:
+            watch.write_queue.put(None)
+        watch.add_pending(-watch.pending_bytes)
+
+    def _unregister_stdin(self, watch):
+        try:
+            self.selector.unregister(watch.stdin)
+        except (KeyError, ValueError):
+            pass
+        watch.write_registered = False
+
+    def _add_timer(self, handle):
+        heapq.heappush(self.timers, (handle.when, next(self.timer_seq), handle))
+
+    def _add_process(self, watch):
+        self.watches.append(watch)
+        if watch.stdin is not None and not self.use_threads:
+            try:
+                os.set_blocking(watch.stdin.fileno(), False)
+            except (OSError, ValueError):
+                watch.stdin = None
+        for stream in ('stdout', 'stderr'):
+            pipe = getattr(watch.process, stream)
+            if pipe is None:
+                continue
+            watch.streams[stream] = pipe
+            if self.use_threads:
+                threading.Thread(
+                    target=self._pipe_thread,
+                    args=(watch, stream, pipe),
+                    name=f'IOLoop-{stream}',
+                    daemon=True
+                ).start()
+            else:
+                self.selector.register(pipe, selectors.EVENT_READ, (watch, stream))
+
+    @staticmethod
+    def _read_chunk(pipe, view):
+        """直接从底层文件读入复用缓冲区，返回读到的字节，b'' 表示管道已关闭"""
+        raw = getattr(pipe, 'raw', pipe)
+        try:
+            count = raw.readinto(view)
+        except (OSError, ValueError):
+            return b''
+        if count is None:
+            return None
+        return bytes(view[:count])
+
+    def _pipe_thread(self, watch, stream, pipe):
+        """Windows 下的管道读取线程
+
+        读到的数据打上序号后交回 I/O 线程，按序号顺序回调。
+        """
+        view = memoryview(bytearray(self.chunk_size))
+        while True:
+            data = self._read_chunk(pipe, view)
+            if not data:
+                break
+            timestamp = time.time()
+            with watch.sequence_lock:
+                seq = next(watch.sequence)
+                self.pending.put((self._deliver, (watch, stream, data, seq, timestamp)))
+            self.wakeup()
+        self.call_soon(self._close_stream, watch, stream)
+
+    def _deliver(self, watch, stream, data, seq, timestamp):
+        try:
+            watch.on_output(stream, data, seq, timestamp)
+        except Exception as e:
+            logger.error(f"处理进程输出失败: {e}")
+
+    def _read(self, watch, stream):
+        pipe = watch.streams.get(stream)
+        if pipe is None:
+            return
+        data = self._read_chunk(pipe, self.view)
+        if data:
+            timestamp = time.time()
+            with watch.sequence_lock:
+                seq = next(watch.sequence)
+            self._deliver(watch, stream, data, seq, timestamp)
+        elif data is not None:
+            self._close_stream(watch, stream)
+
+    def _unregister(self, watch, stream):
+        pipe = watch.streams.pop(stream, None)
+        if pipe is not None and not self.use_threads:
+            try:
+                self.selector.unregister(pipe)
+            except (KeyError, ValueError):
+                pass
+
+    def _close_stream(self, watch, stream):
+        self._unregister(watch, stream)
+        if not watch.streams:
+            # 管道都已关闭，尽快回收
+            self._reap_one(watch, time.monotonic())
+
+    def _reap_one(self, watch, now):
+        if watch.returncode is None:
+            returncode = watch.process.poll()
+            if returncode is None:
+                return
+            watch.returncode = returncode
+            watch.exited_at = now
+
+        # 进程已退出，等管道读完；孙进程占用管道时最多等待宽限时间
+        if watch.streams and now - watch.exited_at < self.exit_grace:
+            return
+
+        for stream in list(watch.streams):
+            self._unregister(watch, stream)
+        self._clear_writes(watch)
+        if watch in self.watches:
+            self.watches.remove(watch)
+            try:
+                watch.on_exit(watch.returncode)
+            except Exception as e:
+                logger.error(f"处理进程退出失败: {e}")
+
+    def _run_pending(self):
+        while True:
+            try:
+                callback, args = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.error(f"I/O 线程回调失败: {e}")
+
+    def _run_timers(self, now):
+        while self.timers and self.timers[0][0] <= now:
+            _, _, handle = heapq.heappop(self.timers)
+            if handle.cancelled:
+                continue
+            try:
+                handle.callback(*handle.args)
+            except Exception as e:
+                logger.error(f"I/O 线程定时回调失败: {e}")
+
+    def run(self):
+        """I/O 线程主循环"""
+        next_reap = time.monotonic() + self.reap_interval
+        while self.running:
+            self._run_pending()
+
+            now = time.monotonic()
+            deadline = next_reap
+            if self.timers:
+                deadline = min(deadline, self.timers[0][0])
+            timeout = max(0.0, deadline - now)
+
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    try:
+                        while self.wakeup_r.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                else:
+                    watch, stream = key.data
+                    if stream == 'stdin':
+                        self._flush_writes(watch)
+                    else:
+                        self._read(watch, stream)
+
+            now = time.monotonic()
+            self._run_timers(now)
+            if now >= next_reap:
+                for watch in list(self.watches):
+                    self._reap_one(watch, now)
+                next_reap = now + self.reap_interval
@@ -0,0 +1,68 @@
+import codecs
+import time
+
+# 未完成的行超过这个字节数时不再等待空闲，立即输出
+MAX_PARTIAL = 64 * 1024
+
+
+class LineDecoder:
+    """按字节拆分行并增量解码
+
+    在字节层面按换行拆分，再用增量解码器解码，多字节字符被拆在两次读取之间
+    也能正确拼接；无法解码的字节用替换字符代替，不会抛出异常。
+    没有换行结尾的内容（提示符、进度条）在这一行开始一段时间后或超过 max_partial
+    字节时可以提前输出；用回车不断重绘的进度条不会一直等到换行才显示。
+    """
+    def __init__(self, encoding='utf-8', errors='replace', max_partial=MAX_PARTIAL):
+        self.encoding = codecs.lookup(encoding).name
+        self.decoder = codecs.getincrementaldecoder(self.encoding)(errors)
+        self.partial = b''
+        # 未完成的行开始的时间，None 表示没有等待输出的内容
+        self.partial_time = None
+        self.max_partial = max_partial
+
+    def feed(self, data):
+        """输入一段字节，返回其中完整的行（不含换行符）"""
+        if self.partial:
+            data = self.partial + data
+        lines = data.split(b'\n')
+        self.partial = lines.pop()
+        if not self.partial:
+            self.partial_time = None
+        elif lines or self.partial_time is None:
+            # 只在新的未完成行开始时计时，同一行后续的数据不推迟提前输出
+            self.partial_time = time.monotonic()
+
+        decode = self.decoder.decode
+        result = []
+        for raw in lines:
+            if raw.endswith(b'\r'):
+                raw = raw[:-1]
+            result.append(decode(raw))
+        return result
+
+    @property
+    def partial_full(self):
+        """未完成的行是否已超过大小上限"""
+        return len(self.partial) >= self.max_partial
+
+    def flush_partial(self, idle=0.0):
+        """输出开始已超过 idle 秒（或超过大小上限）的未完成行，没有则返回 None"""
+        if not self.partial or self.partial_time is None:
+            # 只剩留到下一次的 \r 时不计时，也不输出
+            return None
+        if idle and not self.partial_full and time.monotonic() - self.partial_time < idle:
+            return None
+        # 末尾的 \r 可能是被拆开的 \r\n，留到下一次
+        data, self.partial = self.partial, b''
+        if data.endswith(b'\r'):
+            data, self.partial = data[:-1], b'\r'
+        self.partial_time = None
+        return self.decoder.decode(data)
+
+    def finish(self):
+        """流结束时输出剩余内容"""
+        text = self.decoder.decode(self.partial, final=True)
+        self.partial = b''
+        self.partial_time = None
+        return text
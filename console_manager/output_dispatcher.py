@@ -0,0 +1,112 @@
+import time
+import queue
+import logging
+import threading
+from operator import itemgetter
+
+logger = logging.getLogger(__name__)
+
+class OutputDispatcher:
+    """输出调度器
+
+    读取线程只把输出放入线程安全队列，由主线程按固定帧率统一取出，
+    每个控制台每帧只做一次批量插入和一次自动滚动。
+    每段输出带有回滚缓冲区的版本号，控件从缓冲区重放后据此丢弃已包含的片段。
+    """
+    def __init__(self, root, fps=30, max_items_per_tick=20000):
+        self.root = root
+        self.interval = max(1, int(1000 / fps))
+        self.max_items_per_tick = max_items_per_tick
+        self.queue = queue.SimpleQueue()
+        self.callbacks = queue.SimpleQueue()
+        self.running = False
+        self.after_id = None
+        # 各控制台在队列中等待刷新的片段数
+        self.depth_lock = threading.Lock()
+        self.depths = {}
+        # 回调耗时统计（HandlerStats），为 None 时不统计
+        self.stats = None
+
+    def put(self, tab, text, tag=None, seq=0, version=0):
+        """提交一段输出（可在任意线程调用），seq 为控制台内的顺序号，version 为缓冲区版本号"""
+        with self.depth_lock:
+            self.depths[tab] = self.depths.get(tab, 0) + 1
+        self.queue.put((tab, text, tag, seq, version))
+
+    def post(self, callback, *args):
+        """在下一帧由主线程执行回调（可在任意线程调用）"""
+        self.callbacks.put((callback, args))
+
+    def pending_callbacks(self):
+        """等待执行的回调数"""
+        return self.callbacks.qsize()
+    
+    def queue_depths(self):
+        """各控制台等待刷新的片段数 {控制台: 数量}"""
+        with self.depth_lock:
+            return {tab: depth for tab, depth in self.depths.items() if depth}
+    
+    def start(self):
+        """启动刷新循环"""
+        if not self.running:
+            self.running = True
+            self.after_id = self.root.after(self.interval, self.drain)
+
+    def stop(self):
+        """停止刷新循环"""
+        self.running = False
+        if self.after_id is not None:
+            try:
+                self.root.after_cancel(self.after_id)
+            except Exception:
+                pass
+            self.after_id = None
+
+    def drain(self):
+        """取出待处理的输出，按控制台分组后批量刷新"""
+        pending = {}
+        count = 0
+        # 单帧处理量设上限，剩余的留到下一帧，避免一次刷新卡住界面
+        while count < self.max_items_per_tick:
+            try:
+                tab, text, tag, seq, version = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            pending.setdefault(tab, []).append((seq, text, tag, version))
+            count += 1
+
+        if pending:
+            with self.depth_lock:
+                for tab, records in pending.items():
+                    self.depths[tab] -= len(records)
+                    if not self.depths[tab]:
+                        del self.depths[tab]
+
+        stats = self.stats
+        for tab, records in pending.items():
+            # 按读取时的顺序号排序，保证 stdout/stderr 的真实交错顺序
+            records.sort(key=itemgetter(0))
+            start = time.perf_counter()
+            try:
+                tab.flush_output([(text, tag, version) for _, text, tag, version in records])
+            except Exception as e:
+                logger.error(f"刷新控制台输出失败 {tab.name}: {e}")
+            if stats is not None:
+                stats.record('flush_output', time.perf_counter() - start)
+
+        # 输出刷新之后再执行状态回调，保证退出提示等排在已有输出之后
+        while True:
+            try:
+                callback, args = self.callbacks.get_nowait()
+            except queue.Empty:
+                break
+            start = time.perf_counter()
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.error(f"执行界面回调失败: {e}")
+            if stats is not None:
+                stats.record(getattr(callback, '__qualname__', repr(callback)), time.perf_counter() - start)
+
+        if self.running:
+            self.after_id = self.root.after(self.interval, self.drain)
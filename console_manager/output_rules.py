@@ -0,0 +1,471 @@
+import re
+import logging
+from bisect import bisect_right
+from collections import Counter
+from itertools import accumulate, repeat
+from operator import add
+
+# 正则的语法树来自标准库的私有模块，各版本可能变动；取不到时不做预筛选，
+# 每条规则都在每行上直接匹配
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    try:
+        import sre_parse
+        import sre_constants
+    except ImportError:
+        sre_parse = sre_constants = None
+
+logger = logging.getLogger(__name__)
+
+# 规则触发动作
+RULE_ACTIONS = ('notify', 'bell')
+
+# 日志中常见的字符，越靠前越常见；不在其中的字符（大写字母、少见符号）视为少见
+COMMON_CHARS = ' etaoinsrhldcumfpgwybvkxjqz0123456789:.-/_,=[]()'
+
+# 整块匹配时，字面文本出现超过这么多次的规则直接在整块文本上确认，否则逐行确认
+BLOCK_MATCH_THRESHOLD = 16
+# 字面文本的首字符种类不超过这个数时，整块扫描按首字符拆成多个正则
+PREFIX_GROUP_LIMIT = 6
+
+
+class OutputRule:
+    """一条高亮/告警规则
+
+    配置项：
+        pattern      正则表达式或字面文本
+        literal      为 True 时 pattern 按字面文本匹配
+        ignore_case  忽略大小写
+        name         规则名称，用于计数显示，默认为 pattern
+        tag          沿用已有文本标签（error/warning/success/info 等）的样式
+        foreground / background / bold  自定义高亮样式（与 tag 同时指定时覆盖对应样式）
+        action       命中时的动作：notify（托盘通知）或 bell（提示音）
+        cooldown     动作最短间隔（秒），默认 10
+    """
+    def __init__(self, config, index):
+        self.config = config
+        self.index = index
+        self.pattern = str(config['pattern'])
+        self.literal = bool(config.get('literal', False))
+        self.ignore_case = bool(config.get('ignore_case', False))
+        self.name = str(config.get('name') or self.pattern)
+        self.action = config.get('action')
+        if self.action not in RULE_ACTIONS:
+            self.action = None
+        self.cooldown = float(config.get('cooldown', 10))
+
+        source = re.escape(self.pattern) if self.literal else self.pattern
+        self.regex = re.compile(source, re.IGNORECASE if self.ignore_case else 0)
+        # 正则里用 (?i) 写的忽略大小写
+        self.ignore_case = bool(self.regex.flags & re.IGNORECASE)
+
+        # 高亮都使用规则自己的标签（rule_N），它在 ANSI 标签之后创建，优先级高于
+        # output/error，指定 tag 时复制该标签的样式；直接加已有标签会被 output 盖住
+        self.base_tag = config.get('tag') or None
+        self.style = {}
+        if config.get('foreground'):
+            self.style['foreground'] = config['foreground']
+        if config.get('background'):
+            self.style['background'] = config['background']
+        self.bold = bool(config.get('bold', False))
+        if self.base_tag or self.style or self.bold:
+            self.tag = f'rule_{index}'
+        else:
+            self.tag = None
+
+        # 匹配前必须出现的字面文本，用于预筛选
+        anchor = self.pattern if self.literal else required_literal(self.pattern)
+        if self.ignore_case:
+            anchor = anchor.lower()
+        self.anchor = rare_suffix(anchor)
+        # 能否在多行拼接的文本上匹配
+        self.line_local = line_local(self.pattern) if not self.literal else True
+
+
+def required_literal(pattern):
+    """找出正则匹配时一定会出现的最长字面文本，找不到返回空字符串"""
+    if sre_parse is None:
+        return ''
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return ''
+
+    best = ''
+    run = []
+
+    def walk(items):
+        nonlocal best, run
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                run.append(chr(av))
+                continue
+            if op is sre_constants.SUBPATTERN:
+                # 普通分组是必经的，继续拼接；带局部标志的分组不做处理
+                group, add_flags, del_flags, sub = av
+                if not add_flags and not del_flags:
+                    walk(sub)
+                    continue
+            elif op is sre_constants.AT:
+                # 锚点（^ $ \b）不占字符，不打断字面文本
+                continue
+            if len(run) > len(best):
+                best = ''.join(run)
+            run = []
+        return best
+
+    try:
+        walk(parsed)
+    except Exception:
+        # 语法树结构与预期不符，按没有字面文本处理
+        logger.debug("无法分析正则 %r 的字面文本", pattern, exc_info=True)
+        return ''
+    if len(run) > len(best):
+        best = ''.join(run)
+    return best
+
+
+def line_local(pattern):
+    """判断正则在多行拼接的文本上的匹配是否与逐行匹配一致
+
+    断言（前后查找、^ $ \\A \\Z）会看到相邻的行，原子组和占有量词吞下换行后
+    不会回退，都可能让结果不同；跨行的匹配在扫描时另行检查。
+    """
+    if sre_parse is None:
+        return False
+    try:
+        parsed = sre_parse.parse(pattern)
+        unsafe = {
+            getattr(sre_constants, name) for name in
+            ('ASSERT', 'ASSERT_NOT', 'ATOMIC_GROUP', 'POSSESSIVE_REPEAT')
+            if hasattr(sre_constants, name)
+        }
+        boundaries = (sre_constants.AT_BOUNDARY, sre_constants.AT_NON_BOUNDARY)
+    except Exception:
+        return False
+
+    def subpatterns(value):
+        if isinstance(value, sre_parse.SubPattern):
+            yield value
+        elif isinstance(value, (tuple, list)):
+            for item in value:
+                yield from subpatterns(item)
+
+    def walk(items):
+        for op, av in items:
+            if op in unsafe or (op is sre_constants.AT and av not in boundaries):
+                return False
+            if not all(walk(sub) for sub in subpatterns(av)):
+                return False
+        return True
+
+    try:
+        return walk(parsed)
+    except Exception:
+        logger.debug("无法分析正则 %r 能否逐行匹配", pattern, exc_info=True)
+        return False
+
+
+def rare_suffix(text, min_length=3):
+    """从首字符最少见的位置截取字面文本
+
+    前缀树正则在每个位置先比较首字符，首字符越少见，进入分支比较的次数越少。
+    截取后的文本仍是必现文本的一部分，预筛选结果不会漏掉。
+    """
+    if len(text) <= min_length:
+        return text
+
+    def rarity(char):
+        index = COMMON_CHARS.find(char)
+        return len(COMMON_CHARS) if index < 0 else index
+
+    start = max(range(len(text) - min_length + 1), key=lambda i: rarity(text[i]))
+    return text[start:]
+
+
+def literal_trie_pattern(words):
+    """把一组字面文本按前缀树合并成正则
+
+    同一位置只需沿一条分支比较，比逐个尝试的平铺 a|b|c 快得多；
+    可选分支是贪婪的，同一位置总是匹配最长的文本。
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class AnchorIndex:
+    """按必现字面文本查找候选规则"""
+    def __init__(self, rules, ignore_case=False):
+        self.ignore_case = ignore_case
+        self.rules = {}
+        for rule in rules:
+            self.rules.setdefault(rule.anchor, []).append(rule)
+        # 忽略大小写的文本已转成小写，匹配时把行转成小写，
+        # 比 re.IGNORECASE 快（后者会让正则引擎放弃首字符快速筛选）
+        self.matcher = re.compile(literal_trie_pattern(self.rules))
+        # findall 的结果互不重叠，被较长文本覆盖或与之部分重叠的文本可能被跳过，
+        # 预先算出每个文本可能遮住的其他文本，命中时再单独确认
+        self.shadowed = {}
+        for anchor in self.rules:
+            self.shadowed[anchor] = [
+                other for other in self.rules
+                if other != anchor and (other in anchor or any(
+                    other.startswith(anchor[i:]) for i in range(1, len(anchor))
+                ))
+            ]
+
+        # 整块扫描：正则以固定字面文本开头时 sre 走快速查找，比按首字符集合在
+        # 每个位置进入匹配快得多，首字符种类不多时按首字符拆开分别扫描
+        groups = {}
+        for anchor in self.rules:
+            groups.setdefault(anchor[0], []).append(anchor)
+        if len(groups) <= PREFIX_GROUP_LIMIT:
+            self.block_matchers = [re.compile(literal_trie_pattern(group)) for group in groups.values()]
+        else:
+            self.block_matchers = [self.matcher]
+
+    def find(self, line):
+        """返回这一行可能命中的规则"""
+        if self.ignore_case:
+            line = line.lower()
+        found = self.matcher.findall(line)
+        if not found:
+            return []
+        anchors = set(found)
+        for anchor in found:
+            for other in self.shadowed[anchor]:
+                if other not in anchors and other in line:
+                    anchors.add(other)
+        result = []
+        for anchor in anchors:
+            result.extend(self.rules[anchor])
+        return result
+
+    def count(self, text):
+        """统计整块文本中出现的字面文本及次数（忽略大小写时 text 须已转成小写）
+
+        被遮住的文本按 str.count 补上；次数只用于选择确认方式。
+        """
+        counts = Counter()
+        for matcher in self.block_matchers:
+            counts.update(matcher.findall(text))
+        for anchor in list(counts):
+            for other in self.shadowed[anchor]:
+                if other not in counts:
+                    occurrences = text.count(other)
+                    if occurrences:
+                        counts[other] = occurrences
+        return counts
+
+
+class RuleSet:
+    """编译后的规则集合
+
+    所有规则的必现字面文本按前缀树合并成一个正则，每行只扫描一次；
+    只有命中字面文本的行才用对应规则的正则确认，绝大多数不相关的行
+    只付出一次字面匹配的代价。提取不到字面文本的规则合并成一个备用正则。
+    忽略大小写的规则单独合并，在转成小写的行上匹配。
+    """
+    def __init__(self, configs):
+        self.rules = []
+        for config in configs or []:
+            if not isinstance(config, dict) or not config.get('pattern'):
+                continue
+            try:
+                self.rules.append(OutputRule(config, len(self.rules)))
+            except (re.error, TypeError, ValueError) as e:
+                logger.warning(f"忽略无效的输出规则 {config.get('pattern')!r}: {e}")
+
+        anchored = [rule for rule in self.rules if rule.anchor and not rule.ignore_case]
+        anchored_nocase = [rule for rule in self.rules if rule.anchor and rule.ignore_case]
+        self.indexes = []
+        if anchored:
+            self.indexes.append(AnchorIndex(anchored))
+        if anchored_nocase:
+            self.indexes.append(AnchorIndex(anchored_nocase, ignore_case=True))
+
+        # 没有字面文本的规则只能逐条确认，先用一个合并的正则判断是否可能命中
+        self.unanchored = [rule for rule in self.rules if not rule.anchor]
+        self.fallback_matcher = None
+        if self.unanchored:
+            try:
+                self.fallback_matcher = re.compile('|'.join(
+                    f'(?:{rule.regex.pattern})' if not rule.ignore_case
+                    else f'(?i:{rule.regex.pattern})'
+                    for rule in self.unanchored
+                ))
+            except re.error:
+                # 含反向引用等无法合并的写法时，逐条匹配
+                self.fallback_matcher = None
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def candidates(self, line):
+        """返回这一行可能命中的规则"""
+        result = []
+        for index in self.indexes:
+            result.extend(index.find(line))
+        if self.unanchored and (self.fallback_matcher is None or self.fallback_matcher.search(line)):
+            result.extend(self.unanchored)
+        return result
+
+    def scan(self, line):
+        """匹配一行，返回 [(起点, 终点, 规则), ...]，按起点排序且互不重叠
+
+        同一位置有多条规则命中时，配置中靠前的规则优先。
+        """
+        candidates = self.candidates(line)
+        if not candidates:
+            return []
+
+        spans = []
+        for rule in candidates:
+            for match in rule.regex.finditer(line):
+                if match.end() > match.start():
+                    spans.append((match.start(), rule.index, match.end(), rule))
+        return select_hits(spans)
+
+    def scan_each(self, lines):
+        """逐行匹配，返回 {行号: 命中列表}"""
+        result = {}
+        for number, line in enumerate(lines):
+            hits = self.scan(line)
+            if hits:
+                result[number] = hits
+        return result
+
+    def scan_lines(self, lines):
+        """匹配一组完整的行，返回 {行号: 命中列表}，结果与逐行调用 scan 相同
+
+        各行拼成一块文本，每个字面文本正则只扫描一遍，省掉逐行调用的开销；
+        字面文本出现多的规则直接在整块文本上确认，其余规则只确认出现字面文本的行。
+        有提取不到字面文本的规则时逐行匹配。
+        """
+        if len(lines) < 2 or self.unanchored:
+            return self.scan_each(lines)
+
+        text = '\n'.join(lines)
+        lowered = None
+        if any(index.ignore_case for index in self.indexes):
+            lowered = text.lower()
+            if len(lowered) != len(text):
+                # 个别字符转小写后长度改变，位置无法对应回各行
+                return self.scan_each(lines)
+
+        starts = None
+        spans = {}
+        for index in self.indexes:
+            source = lowered if index.ignore_case else text
+            counts = index.count(source)
+            if not counts:
+                continue
+            if starts is None:
+                starts = line_starts(lines)
+            for anchor, count in counts.items():
+                for rule in index.rules[anchor]:
+                    if not (count > BLOCK_MATCH_THRESHOLD and rule.line_local
+                            and block_spans(rule, text, starts, spans)):
+                        for number in lines_containing(source, anchor, starts):
+                            for match in rule.regex.finditer(lines[number]):
+                                if match.end() > match.start():
+                                    spans.setdefault(number, []).append(
+                                        (match.start(), rule.index, match.end(), rule))
+        return {number: select_hits(found) for number, found in spans.items()}
+
+
+def select_hits(spans):
+    """从 [(起点, 规则序号, 终点, 规则), ...] 中选出互不重叠的命中
+
+    按起点排序，同一位置配置中靠前的规则优先，返回 [(起点, 终点, 规则), ...]。
+    """
+    spans.sort(key=lambda span: (span[0], span[1]))
+    hits = []
+    position = 0
+    for start, _, end, rule in spans:
+        if start >= position:
+            hits.append((start, end, rule))
+            position = end
+    return hits
+
+
+def line_starts(lines):
+    """各行在用换行拼接后的文本中的起点，最后多一项为文本末尾之后的位置"""
+    return list(accumulate(map(add, map(len, lines), repeat(1)), initial=0))
+
+
+def lines_containing(text, anchor, starts):
+    """返回包含字面文本的行号，每行只出现一次"""
+    numbers = []
+    position = text.find(anchor)
+    while position >= 0:
+        number = bisect_right(starts, position) - 1
+        numbers.append(number)
+        position = text.find(anchor, starts[number + 1])
+    return numbers
+
+
+def block_spans(rule, text, starts, spans):
+    """在整块文本上匹配一条规则，命中按行加入 spans
+
+    出现跨行的匹配时不加入任何结果并返回 False，由调用方逐行确认。
+    """
+    found = []
+    for match in rule.regex.finditer(text):
+        start, end = match.span()
+        if start == end:
+            continue
+        if text.find('\n', start, end) >= 0:
+            return False
+        found.append((start, end))
+    for start, end in found:
+        number = bisect_right(starts, start) - 1
+        offset = starts[number]
+        spans.setdefault(number, []).append((start - offset, rule.index, end - offset, rule))
+    return True
+
+
+def highlight_segments(segments, hits, offset=0):
+    """把命中区间的规则标签加到分段上
+
+    segments 为 [(文本, 标签元组), ...]，hits 的区间相对整行，
+    offset 为这些分段在整行中的起点（行的前半部分已提前显示时不为 0）。
+    """
+    result = []
+    hit_index = 0
+    position = offset
+    for text, tags in segments:
+        end = position + len(text)
+        cursor = position
+        while cursor < end:
+            while hit_index < len(hits) and hits[hit_index][1] <= cursor:
+                hit_index += 1
+            if hit_index >= len(hits) or hits[hit_index][0] >= end:
+                result.append((text[cursor - position:], tags))
+                break
+            start, stop, rule = hits[hit_index]
+            if start > cursor:
+                result.append((text[cursor - position:start - position], tags))
+                cursor = start
+            stop = min(stop, end)
+            result.append((text[cursor - position:stop - position], tags + (rule.tag,) if rule.tag else tags))
+            cursor = stop
+        position = end
+    return result
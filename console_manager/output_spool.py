@@ -0,0 +1,198 @@
+import os
+import re
+import gzip
+import queue
+import shutil
+import threading
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+from .constants import APP_DIR
+
+logger = logging.getLogger(__name__)
+
+# 默认落盘配置
+DEFAULT_SPOOL_DIR = APP_DIR / 'logs'
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_ROTATE_INTERVAL = 24 * 3600
+DEFAULT_BACKUPS = 5
+
+class SpoolFile:
+    """单个控制台的落盘文件，负责按大小或时间轮转"""
+    def __init__(self, name, config):
+        self.name = name
+        safe_name = re.sub(r'[^\w.-]+', '_', name) or 'console'
+        self.directory = Path(config.get('dir') or DEFAULT_SPOOL_DIR)
+        if not self.directory.is_absolute():
+            self.directory = APP_DIR / self.directory
+        self.path = self.directory / f"{safe_name}.log"
+        self.max_bytes = int(config.get('max_bytes', DEFAULT_MAX_BYTES))
+        self.rotate_interval = float(config.get('rotate_interval', DEFAULT_ROTATE_INTERVAL))
+        self.backups = int(config.get('backups', DEFAULT_BACKUPS))
+        self.compress = bool(config.get('compress', False))
+
+        # 本文件归档的名称：<名称>.<时间戳>.log，压缩后加 .gz
+        self.archive_pattern = re.compile(
+            rf"{re.escape(self.path.stem)}\.\d{{8}}-\d{{6}}-\d{{6}}\.log(\.gz)?"
+        )
+
+        self.file = None
+        # 当前文件的字节数（按 UTF-8 编码计算，与 max_bytes 比较）
+        self.size = 0
+        self.opened_at = 0.0
+
+    def open(self):
+        """打开（或续写）当前文件"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, 'ab', buffering=64 * 1024)
+        self.size = self.path.stat().st_size
+        self.opened_at = time.time()
+
+    def write(self, data):
+        """写入已格式化的文本（按 UTF-8 编码写入，大小按字节计算）"""
+        if self.file is None:
+            self.open()
+        elif self.needs_rotate():
+            self.rotate()
+        encoded = data.encode('utf-8', 'replace')
+        self.file.write(encoded)
+        self.size += len(encoded)
+
+    def needs_rotate(self):
+        if self.max_bytes > 0 and self.size >= self.max_bytes:
+            return True
+        if self.rotate_interval > 0 and time.time() - self.opened_at >= self.rotate_interval:
+            return self.size > 0
+        return False
+
+    def rotate(self):
+        """关闭当前文件并改名归档，超出保留数量的旧文件会被删除"""
+        self.close()
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        rotated = self.path.with_name(f"{self.path.stem}.{stamp}.log")
+        try:
+            os.replace(self.path, rotated)
+            if self.compress:
+                with open(rotated, 'rb') as src, gzip.open(f"{rotated}.gz", 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(rotated)
+        except Exception as e:
+            logger.error(f"轮转输出文件失败 {self.path}: {e}")
+        self.prune()
+        self.open()
+
+    def prune(self):
+        """删除超出保留数量的归档"""
+        if self.backups <= 0:
+            return
+        # 只匹配本文件自己的归档，名称以本控制台名称开头的其他控制台（如 app 与 app.1）不受影响
+        archives = sorted(
+            p for p in self.directory.glob(f"{self.path.stem}.*.log*")
+            if self.archive_pattern.fullmatch(p.name)
+        )
+        for old in archives[:-self.backups]:
+            try:
+                old.unlink()
+            except Exception as e:
+                logger.error(f"删除旧输出文件失败 {old}: {e}")
+
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+class OutputSpool:
+    """输出落盘写入器
+
+    所有控制台共用一个后台写线程。读取线程和主线程只向无界队列放入记录，
+    永远不会因为磁盘慢而阻塞；写线程批量写入并定期刷新到磁盘。
+    """
+    def __init__(self, flush_interval=1.0):
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+
+    def start(self):
+        """启动写线程"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='OutputSpool', daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=5):
+        """刷新剩余数据并停止写线程"""
+        if self.thread is not None:
+            self.queue.put(('stop',))
+            self.thread.join(timeout)
+            self.thread = None
+
+    def open(self, name, config):
+        """为控制台开启落盘"""
+        self.queue.put(('open', name, dict(config)))
+
+    def close(self, name):
+        """关闭控制台的落盘文件"""
+        self.queue.put(('close', name))
+
+    def write(self, name, stream, text, timestamp=None):
+        """提交一段输出（可在任意线程调用）"""
+        self.queue.put(('write', name, stream, text, timestamp or time.time()))
+
+    def run(self):
+        """写线程主循环"""
+        files = {}
+        last_flush = time.time()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is not None:
+                try:
+                    action = item[0]
+                    if action == 'write':
+                        _, name, stream, text, timestamp = item
+                        spool_file = files.get(name)
+                        if spool_file is not None:
+                            spool_file.write(self.format(stream, text, timestamp))
+                    elif action == 'open':
+                        _, name, config = item
+                        if name in files:
+                            files.pop(name).close()
+                        files[name] = SpoolFile(name, config)
+                    elif action == 'close':
+                        spool_file = files.pop(item[1], None)
+                        if spool_file is not None:
+                            spool_file.close()
+                    elif action == 'stop':
+                        break
+                except Exception as e:
+                    logger.error(f"写入输出文件失败: {e}")
+
+            now = time.time()
+            if now - last_flush >= self.flush_interval:
+                for spool_file in files.values():
+                    try:
+                        spool_file.flush()
+                    except Exception as e:
+                        logger.error(f"刷新输出文件失败 {spool_file.path}: {e}")
+                last_flush = now
+
+        for spool_file in files.values():
+            try:
+                spool_file.close()
+            except Exception as e:
+                logger.error(f"关闭输出文件失败 {spool_file.path}: {e}")
+
+    @staticmethod
+    def format(stream, text, timestamp):
+        """每行加上时间戳和流标记"""
+        prefix = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        lines = text.splitlines() or ['']
+        return ''.join(f"{prefix} [{stream}] {line}\n" for line in lines)
@@ -0,0 +1,168 @@
+import os
+import sys
+import signal
+import logging
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+PROC_DIR = '/proc'
+
+
+def popen_options():
+    """启动控制台进程时传给 Popen 的平台参数
+
+    POSIX 上每个控制台在新的会话（同时也是新的进程组）中运行，进程组号即进程号，
+    停止时可以向整个进程组发信号；Windows 上不创建控制台窗口。
+    """
+    if sys.platform == 'win32':
+        return {'creationflags': subprocess.CREATE_NO_WINDOW | subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def read_stat(pid):
+    """读取 /proc/<pid>/stat，返回 (父进程号, 会话号, 启动时间)，进程不存在时返回 None"""
+    try:
+        with open(f'{PROC_DIR}/{pid}/stat', 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # 进程名可能包含空格和括号，从最后一个右括号之后解析
+    fields = data[data.rfind(b')') + 2:].split()
+    if len(fields) < 20 or fields[0] in (b'Z', b'X'):
+        # 僵尸进程已经退出，不需要再发信号
+        return None
+    return int(fields[1]), int(fields[3]), int(fields[19])
+
+
+def scan_processes():
+    """扫描 /proc，返回 {进程号: (父进程号, 会话号, 启动时间)}"""
+    result = {}
+    try:
+        names = os.listdir(PROC_DIR)
+    except OSError:
+        return result
+    for name in names:
+        if name.isdigit():
+            stat = read_stat(name)
+            if stat is not None:
+                result[int(name)] = stat
+    return result
+
+
+class ProcessTree:
+    """控制台进程及其所有后代进程
+
+    包装脚本启动的孙进程在脚本退出后会被系统收养，只向直接子进程发信号
+    会让它们继续占用端口和内存。这里同时使用两种方式找到整棵进程树：
+      - 进程组：子进程在自己的会话中启动，默认的后代都在同一个进程组里
+      - /proc：按父进程关系和会话号记录后代，覆盖自行切换了进程组的进程
+    记录的后代带有启动时间，发信号前核对，避免进程号被复用后误伤其他进程。
+    没有 /proc 的平台（如 macOS）只使用进程组，控制台进程被回收后无法确认进程组
+    是否仍属于它，不再发信号；Windows 使用 taskkill /T。
+    """
+    def __init__(self, process):
+        self.process = process
+        self.pid = process.pid
+        # {进程号: 启动时间}
+        self.known = {}
+
+    def refresh(self):
+        """扫描 /proc 记录当前存活的后代进程"""
+        if sys.platform == 'win32' or not os.path.isdir(PROC_DIR):
+            return self.known
+        table = scan_processes()
+        children = {}
+        for pid, (ppid, _, _) in table.items():
+            children.setdefault(ppid, []).append(pid)
+
+        # 控制台进程已被回收后进程号可能被复用，这时存在的同号进程与控制台无关，
+        # 不能再按它的子进程和会话查找后代
+        reused = self.process.returncode is not None and self.pid in table
+        found = set()
+        if not reused:
+            found.update(pid for pid, (_, session, _) in table.items() if session == self.pid)
+        # 之前记录的进程仍然存活（启动时间一致）时保留并继续展开，父进程退出后
+        # 它们会被收养，父子关系断开；启动时间不一致说明进程号已被复用
+        for pid, start in self.known.items():
+            stat = table.get(pid)
+            if stat is not None and stat[2] == start:
+                found.add(pid)
+        stack = list(found) if reused else [self.pid] + list(found)
+        while stack:
+            for child in children.get(stack.pop(), ()):
+                if child not in found:
+                    found.add(child)
+                    stack.append(child)
+        found.discard(self.pid)
+        self.known = {pid: table[pid][2] for pid in found if pid in table}
+        return self.known
+
+    def survivors(self):
+        """仍然存活的后代进程号"""
+        return sorted(self.refresh())
+
+    def terminate(self):
+        """请求整棵进程树退出"""
+        if sys.platform == 'win32':
+            # 没有控制台窗口的进程无法接收 Ctrl+Break，只能直接结束
+            self.process.terminate()
+            return
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        """强制结束整棵进程树"""
+        if sys.platform == 'win32':
+            self.taskkill()
+            return
+        self.send_signal(signal.SIGKILL)
+
+    def send_signal(self, sig):
+        self.refresh()
+        leader_alive = self.process.poll() is None
+        if leader_alive:
+            try:
+                self.process.send_signal(sig)
+            except OSError:
+                pass
+        # 进程组号就是控制台进程的进程号。控制台进程被回收后，只有组内还有进程时
+        # 这个号才不会被复用，所以先确认记录的后代仍在这个进程组中
+        if leader_alive or self.group_alive():
+            try:
+                os.killpg(self.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+        for pid, start in self.known.items():
+            stat = read_stat(pid)
+            if stat is None or stat[2] != start:
+                continue
+            try:
+                os.kill(pid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    def group_alive(self):
+        """记录的后代中是否还有进程（启动时间一致）留在控制台的进程组中"""
+        for pid, start in self.known.items():
+            stat = read_stat(pid)
+            if stat is None or stat[2] != start:
+                continue
+            try:
+                if os.getpgid(pid) == self.pid:
+                    return True
+            except OSError:
+                pass
+        return False
+
+    def taskkill(self):
+        """Windows：连同子进程一起结束，不等待 taskkill 完成"""
+        try:
+            subprocess.Popen(
+                ['taskkill', '/F', '/T', '/PID', str(self.pid)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                creationflags=subprocess.CREATE_NO_WINDOW
+            )
+        except OSError as e:
+            logger.warning(f"taskkill 失败: {e}")
+            self.process.kill()
@@ -0,0 +1,102 @@
+import time
+
+# 默认每个控制台每秒最多刷新到界面的行数和字节数
+DEFAULT_LINES_PER_SECOND = 2000
+DEFAULT_BYTES_PER_SECOND = 1024 * 1024
+
+
+def format_size(size):
+    """把字节数格式化成便于阅读的文本"""
+    if size < 1024:
+        return f"{size} B"
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}"
+
+
+class RenderBudget:
+    """控制台的界面刷新预算（令牌桶）
+
+    行数和字节数各一个令牌桶，按速率持续补充，最多积累 burst 秒的量。
+    令牌用完后进入省略状态，直到两个桶都补满才恢复，这样省略的输出
+    会集中成一段，在界面上只显示一行汇总。被省略的输出照常写入回滚缓冲区和落盘文件。
+    """
+    def __init__(self, lines_per_second=DEFAULT_LINES_PER_SECOND,
+                 bytes_per_second=DEFAULT_BYTES_PER_SECOND, burst=1.0):
+        self.line_rate = max(1.0, float(lines_per_second))
+        self.byte_rate = max(1.0, float(bytes_per_second))
+        burst = max(0.1, float(burst))
+        self.line_capacity = max(1.0, self.line_rate * burst)
+        self.byte_capacity = max(1.0, self.byte_rate * burst)
+        self.line_tokens = self.line_capacity
+        self.byte_tokens = self.byte_capacity
+        self.updated = time.monotonic()
+        self.suppressing = False
+
+        # 上次汇总之后省略的量
+        self.pending_lines = 0
+        self.pending_bytes = 0
+        # 累计省略的量
+        self.suppressed_lines = 0
+        self.suppressed_bytes = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """按配置创建，配置为 False 时返回 None（不限制）"""
+        if config is False:
+            return None
+        config = config if isinstance(config, dict) else {}
+        if not config.get('enabled', True):
+            return None
+        return cls(
+            lines_per_second=config.get('lines_per_second', DEFAULT_LINES_PER_SECOND),
+            bytes_per_second=config.get('bytes_per_second', DEFAULT_BYTES_PER_SECOND),
+            burst=config.get('burst', 1.0)
+        )
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.line_tokens = min(self.line_capacity, self.line_tokens + elapsed * self.line_rate)
+        self.byte_tokens = min(self.byte_capacity, self.byte_tokens + elapsed * self.byte_rate)
+
+    def take_line(self, size):
+        """新的一行是否可以显示，size 为字节数"""
+        self._refill()
+        if self.suppressing:
+            if self.line_tokens < self.line_capacity or self.byte_tokens < self.byte_capacity:
+                self.suppress(size, lines=1)
+                return False
+            self.suppressing = False
+
+        # 字节令牌允许透支，超长的行也能显示，之后多等一会儿
+        if self.line_tokens >= 1 and self.byte_tokens > 0:
+            self.line_tokens -= 1
+            self.byte_tokens -= size
+            return True
+
+        self.suppressing = True
+        self.suppress(size, lines=1)
+        return False
+
+    def take_bytes(self, size):
+        """已显示的行续写的内容"""
+        self.byte_tokens -= size
+
+    def suppress(self, size, lines=0):
+        """记录省略的内容"""
+        self.pending_lines += lines
+        self.pending_bytes += size
+        self.suppressed_lines += lines
+        self.suppressed_bytes += size
+
+    def pop_summary(self):
+        """取出上次汇总之后省略的量，没有则返回 None"""
+        if not self.pending_lines and not self.pending_bytes:
+            return None
+        summary = (self.pending_lines, self.pending_bytes)
+        self.pending_lines = 0
+        self.pending_bytes = 0
+        return summary
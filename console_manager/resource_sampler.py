@@ -0,0 +1,310 @@
+import os
+import sys
+import time
+import logging
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+PROC_DIR = '/proc'
+
+# 默认采样间隔（秒）
+DEFAULT_INTERVAL = 2.0
+# 每隔几轮重新查找一次进程树的成员，其余轮次只读取已知成员的 stat
+TREE_REFRESH_PASSES = 5
+
+
+def read_file(path):
+    """读取 /proc 下的小文件，直接用 os.read 比 open() 少一层缓冲对象，采样大量进程时差别明显"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, 4096)
+    finally:
+        os.close(fd)
+
+
+class ProcBackend:
+    """Linux：直接读取 /proc
+
+    每个进程只读一次 /proc/<pid>/stat（其中已有 CPU 时间和常驻内存页数），
+    后代通过各线程的 /proc/<pid>/task/<tid>/children 沿进程树查找（children 只列出
+    由该线程创建的子进程），开销只与控制台的进程数有关；
+    进程树的成员每 TREE_REFRESH_PASSES 轮（或有成员退出时）才重新查找，
+    其余轮次每个进程只读一个文件。内核不提供 children 文件时退回扫描整个 /proc。
+    """
+    def __init__(self):
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.children_supported = os.path.exists(f'{PROC_DIR}/self/task/{os.getpid()}/children')
+        # {控制台进程号: [(成员进程号, 启动时间), ...]}
+        self.members = {}
+        self.passes = 0
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith('linux') and os.path.isdir(PROC_DIR)
+
+    def read_stat(self, pid):
+        """返回 (父进程号, CPU 时间秒数, 常驻内存字节, 启动时间)，进程不存在时返回 None"""
+        try:
+            data = read_file(f'{PROC_DIR}/{pid}/stat')
+        except OSError:
+            return None
+        fields = data[data.rfind(b')') + 2:].split(None, 22)
+        if len(fields) < 22 or fields[0] in (b'Z', b'X'):
+            return None
+        ticks = int(fields[11]) + int(fields[12])
+        return int(fields[1]), ticks / self.clock_ticks, int(fields[21]) * self.page_size, int(fields[19])
+
+    def read_children(self, pid):
+        try:
+            threads = os.listdir(f'{PROC_DIR}/{pid}/task')
+        except OSError:
+            return []
+        children = []
+        for tid in threads:
+            try:
+                children.extend(int(child) for child in read_file(f'{PROC_DIR}/{pid}/task/{tid}/children').split())
+            except OSError:
+                continue
+        return children
+
+    def read_uptime(self):
+        """系统启动以来的秒数，与 stat 中的启动时间对照得到进程已运行的时间"""
+        try:
+            return float(read_file(f'{PROC_DIR}/uptime').split()[0])
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def sample(self, roots):
+        """roots 为 {键: 进程号}
+
+        返回 {键: {(进程号, 启动时间): (CPU 秒数, 常驻内存字节, 已运行秒数)}}，
+        已运行时间未知时为 None。
+        """
+        uptime = self.read_uptime()
+        result = self.sample_scan(roots) if not self.children_supported else self.sample_tree(roots)
+        for processes in result.values():
+            for ident, (cpu, rss) in processes.items():
+                age = None if uptime is None else uptime - ident[1] / self.clock_ticks
+                processes[ident] = (cpu, rss, age)
+        return result
+
+    def sample_tree(self, roots):
+        self.passes += 1
+        refresh = self.passes % TREE_REFRESH_PASSES == 0
+        members = {}
+        result = {}
+        for key, root in roots.items():
+            processes = {}
+            known = None if refresh else self.members.get(root)
+            if known is not None:
+                for pid, started in known:
+                    stat = self.read_stat(pid)
+                    if stat is None or stat[3] != started:
+                        # 有成员退出（或进程号已被复用），下一轮重新查找
+                        known = None
+                        continue
+                    _, cpu, rss, start = stat
+                    processes[(pid, start)] = (cpu, rss)
+                if known is not None:
+                    members[root] = known
+            else:
+                found = []
+                stack = [root]
+                while stack:
+                    pid = stack.pop()
+                    stat = self.read_stat(pid)
+                    if stat is None:
+                        continue
+                    _, cpu, rss, start = stat
+                    processes[(pid, start)] = (cpu, rss)
+                    found.append((pid, start))
+                    stack.extend(self.read_children(pid))
+                members[root] = found
+            result[key] = processes
+        self.members = members
+        return result
+
+    def sample_scan(self, roots):
+        table = {}
+        try:
+            names = os.listdir(PROC_DIR)
+        except OSError:
+            return {}
+        for name in names:
+            if name.isdigit():
+                stat = self.read_stat(name)
+                if stat is not None:
+                    table[int(name)] = stat
+        children = {}
+        for pid, stat in table.items():
+            children.setdefault(stat[0], []).append(pid)
+        result = {}
+        for key, root in roots.items():
+            processes = {}
+            stack = [root] if root in table else []
+            while stack:
+                pid = stack.pop()
+                _, cpu, rss, start = table[pid]
+                processes[(pid, start)] = (cpu, rss)
+                stack.extend(children.get(pid, ()))
+            result[key] = processes
+        return result
+
+
+class PsutilBackend:
+    """其他平台（包括 Windows）：使用 psutil"""
+    def __init__(self):
+        # 缓存 Process 对象，psutil 据此识别进程号是否被复用
+        self.processes = {}
+
+    @staticmethod
+    def available():
+        return psutil is not None
+
+    def sample(self, roots):
+        result = {}
+        seen = set()
+        for key, root in roots.items():
+            processes = {}
+            try:
+                process = self.processes.get(root)
+                if process is None or not process.is_running():
+                    process = self.processes[root] = psutil.Process(root)
+                members = [process] + process.children(recursive=True)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                members = []
+            now = time.time()
+            for member in members:
+                try:
+                    with member.oneshot():
+                        times = member.cpu_times()
+                        rss = member.memory_info().rss
+                        start = member.create_time()
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+                processes[(member.pid, start)] = (times.user + times.system, rss, now - start)
+            seen.add(root)
+            result[key] = processes
+        for pid in list(self.processes):
+            if pid not in seen:
+                del self.processes[pid]
+        return result
+
+
+def create_backend():
+    """选择当前平台可用的采样方式，没有可用的方式时返回 None"""
+    if ProcBackend.available():
+        return ProcBackend()
+    if PsutilBackend.available():
+        return PsutilBackend()
+    return None
+
+
+class ResourceUsage:
+    """一个控制台（进程及其后代）的资源占用"""
+    __slots__ = ('cpu_percent', 'rss', 'processes')
+
+    def __init__(self, cpu_percent, rss, processes):
+        # 首次采样时没有可比较的数据，CPU 为 None
+        self.cpu_percent = cpu_percent
+        self.rss = rss
+        self.processes = processes
+
+
+class ResourceSampler:
+    """后台资源采样线程
+
+    所有运行中的控制台在同一个线程里按固定间隔一次采样完毕，
+    CPU 占用按两次采样之间的 CPU 时间差计算（多核时可超过 100%），内存为常驻内存之和。
+    上次没有采到的进程，在这段时间内启动的计入它全部的 CPU 时间；更早启动的
+    （进程树尚未重新查找时漏掉的）无法知道这段时间用了多少，留到下一轮按差值计入。
+    控制台通过 track/untrack 登记进程，结果通过 usage 读取（可在任意线程调用）。
+    """
+    def __init__(self, interval=DEFAULT_INTERVAL, backend=None):
+        self.interval = max(0.2, float(interval))
+        self.backend = backend if backend is not None else create_backend()
+        self.lock = threading.Lock()
+        # {键: 进程号}
+        self.roots = {}
+        # {键: ResourceUsage}，每轮采样后整体替换
+        self.results = {}
+        # {键: (采样时间, {(进程号, 启动时间): CPU 秒数})}
+        self.previous = {}
+        # 最近一轮采样的耗时（秒），用于内部状态显示
+        self.last_duration = 0.0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def available(self):
+        return self.backend is not None
+
+    def start(self):
+        if self.backend is None or self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name='ResourceSampler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread = None
+
+    def track(self, key, pid):
+        with self.lock:
+            self.roots[key] = pid
+
+    def untrack(self, key):
+        with self.lock:
+            self.roots.pop(key, None)
+
+    def usage(self, key):
+        """返回控制台的 ResourceUsage，尚未采样或未运行时返回 None"""
+        return self.results.get(key)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample_once()
+            except Exception as e:
+                logger.error(f"资源采样失败: {e}")
+
+    def sample_once(self):
+        with self.lock:
+            roots = dict(self.roots)
+        start = time.perf_counter()
+        now = time.monotonic()
+        samples = self.backend.sample(roots)
+
+        results = {}
+        previous = {}
+        for key, processes in samples.items():
+            if not processes:
+                continue
+            cpu_times = {ident: cpu for ident, (cpu, _, _) in processes.items()}
+            rss = sum(rss for _, rss, _ in processes.values())
+            cpu_percent = None
+            last = self.previous.get(key)
+            if last is not None and now > last[0]:
+                last_time, last_cpu = last
+                elapsed = now - last_time
+                used = 0.0
+                for ident, (cpu, _, age) in processes.items():
+                    previous_cpu = last_cpu.get(ident)
+                    if previous_cpu is not None:
+                        used += max(0.0, cpu - previous_cpu)
+                    elif age is not None and age <= elapsed:
+                        used += cpu
+                cpu_percent = used / elapsed * 100
+            results[key] = ResourceUsage(cpu_percent, rss, len(processes))
+            previous[key] = (now, cpu_times)
+        self.previous = previous
+        self.results = results
+        self.last_duration = time.perf_counter() - start
@@ -0,0 +1,71 @@
+import random
+
+# 重启模式
+RESTART_MODES = ('never', 'on-failure', 'always')
+
+
+class RestartPolicy:
+    """控制台的自动重启策略
+
+    配置项（控制台配置中的 restart，也可以只写模式字符串）：
+        mode          never（默认）、on-failure（非零退出码时重启）、always
+        delay         第一次重启前等待的秒数，默认 1
+        max_delay     等待时间上限（秒），默认 60
+        multiplier    每次连续重启等待时间的倍数，默认 2
+        jitter        等待时间的随机浮动比例，默认 0.1，避免多个控制台同时重启
+        max_restarts  window 秒内最多重启几次，超过后停止重启（崩溃循环），默认 5
+        window        统计重启次数的时间窗口（秒），默认 60
+        reset_after   进程连续运行超过该秒数后，等待时间恢复为 delay，默认 60
+    """
+    def __init__(self, mode='never', delay=1.0, max_delay=60.0, multiplier=2.0, jitter=0.1,
+                 max_restarts=5, window=60.0, reset_after=60.0):
+        self.mode = mode if mode in RESTART_MODES else 'never'
+        self.delay = max(0.0, float(delay))
+        self.max_delay = max(self.delay, float(max_delay))
+        self.multiplier = max(1.0, float(multiplier))
+        self.jitter = min(1.0, max(0.0, float(jitter)))
+        self.max_restarts = max(1, int(max_restarts))
+        self.window = max(0.0, float(window))
+        self.reset_after = max(0.0, float(reset_after))
+
+    @classmethod
+    def from_config(cls, config):
+        """按 restart 配置创建"""
+        if isinstance(config, str):
+            return cls(mode=config)
+        config = config if isinstance(config, dict) else {}
+        return cls(
+            mode=config.get('mode', 'never'),
+            delay=config.get('delay', 1.0),
+            max_delay=config.get('max_delay', 60.0),
+            multiplier=config.get('multiplier', 2.0),
+            jitter=config.get('jitter', 0.1),
+            max_restarts=config.get('max_restarts', 5),
+            window=config.get('window', 60.0),
+            reset_after=config.get('reset_after', 60.0)
+        )
+
+    def should_restart(self, returncode):
+        """进程退出后是否需要重启（主动停止的进程不经过这里）"""
+        if self.mode == 'always':
+            return True
+        return self.mode == 'on-failure' and returncode != 0
+
+    def next_delay(self, attempt):
+        """第 attempt 次连续重启（从 0 开始）前等待的秒数"""
+        # 逐次相乘，到达上限后不再增长；连续重启次数只增不减，直接求幂会溢出
+        delay = self.delay
+        for _ in range(attempt):
+            if delay >= self.max_delay or delay == 0 or self.multiplier == 1.0:
+                break
+            delay *= self.multiplier
+        delay = min(self.max_delay, delay)
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(0.0, delay)
+
+    def crash_looping(self, history, now):
+        """按窗口内的重启时间判断是否进入崩溃循环，会清除窗口外的记录"""
+        while history and now - history[0] > self.window:
+            history.popleft()
+        return len(history) >= self.max_restarts
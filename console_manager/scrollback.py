@@ -0,0 +1,229 @@
+import threading
+import time
+from array import array
+
+# 默认回滚上限
+DEFAULT_MAX_LINES = 10000
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+class ScrollbackBuffer:
+    """控制台回滚缓冲区
+
+    所有行按 UTF-8 连续存放在一块字节区中，另用偏移、时间戳、标签数组记录每一行，
+    不为每行保留一个 Python 字符串。超过行数或字节上限时从头部淘汰旧行。
+    行号使用全局递增的序号（serial），淘汰不会改变剩余行的序号。
+    同一行内有多种标签（如 ANSI 颜色）时，另在稀疏字典中记录分段；
+    以回车开头的文本会替换尚未结束的最后一行。
+    """
+    def __init__(self, max_lines=DEFAULT_MAX_LINES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_lines = max(1, int(max_lines))
+        self.max_bytes = max(1, int(max_bytes))
+        self.lock = threading.RLock()
+
+        self.arena = bytearray()
+        # 字节区第一个字节对应的绝对偏移，压缩时增加
+        self.arena_base = 0
+        # 每行起始的绝对偏移
+        self.offsets = array('Q')
+        self.timestamps = array('d')
+        self.tags = array('H')
+        self.tag_names = [None]
+        self.tag_index = {None: 0}
+        # 多标签行的分段：序号 -> [(字符起点, 标签编号), ...]
+        self.runs = {}
+
+        # 数组中第一个有效行的下标
+        self.head = 0
+        # 第一个有效行的序号
+        self.first_serial = 0
+        # 最后一行是否尚未以换行结束
+        self.line_open = False
+        # 每次追加加一，用于判断某段输出是否已包含在读取到的内容中
+        self.version = 0
+
+    def __len__(self):
+        with self.lock:
+            return len(self.offsets) - self.head
+
+    @property
+    def end_serial(self):
+        """下一行将使用的序号"""
+        with self.lock:
+            return self.first_serial + len(self.offsets) - self.head
+
+    @property
+    def byte_size(self):
+        """当前保存的字节数"""
+        with self.lock:
+            if self.head >= len(self.offsets):
+                return 0
+            return len(self.arena) - (self.offsets[self.head] - self.arena_base)
+
+    def configure(self, max_lines=None, max_bytes=None):
+        """调整上限并立即淘汰超出的行"""
+        with self.lock:
+            if max_lines is not None:
+                self.max_lines = max(1, int(max_lines))
+            if max_bytes is not None:
+                self.max_bytes = max(1, int(max_bytes))
+            self._evict()
+
+    def _tag_id(self, tag):
+        tag_id = self.tag_index.get(tag)
+        if tag_id is None:
+            tag_id = len(self.tag_names)
+            self.tag_names.append(tag)
+            self.tag_index[tag] = tag_id
+        return tag_id
+
+    def append(self, text, tag=None, timestamp=None):
+        """追加一段文本，按换行拆分成行，返回本次淘汰的行数"""
+        if not text:
+            return 0
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self.lock:
+            self.version += 1
+            tag_id = self._tag_id(tag)
+            has_open_line = self.line_open and self.head < len(self.offsets)
+
+            if text.startswith('\r'):
+                # 重写未结束的最后一行
+                text = text[1:]
+                if has_open_line:
+                    last = len(self.offsets) - 1
+                    del self.arena[self.offsets[last] - self.arena_base:]
+                    self.runs.pop(self._serial(last), None)
+                    self.tags[last] = tag_id
+                    self.timestamps[last] = timestamp
+                if not text:
+                    return 0
+
+            parts = text.split('\n')
+
+            for i, part in enumerate(parts):
+                is_last = i == len(parts) - 1
+                if is_last and not part:
+                    # 文本以换行结束
+                    self.line_open = False
+                    break
+
+                data = part.encode('utf-8', 'replace')
+                if i == 0 and has_open_line:
+                    # 续写未结束的最后一行
+                    if part:
+                        self._add_run(len(self.offsets) - 1, tag_id)
+                    self.arena.extend(data)
+                else:
+                    self.offsets.append(self.arena_base + len(self.arena))
+                    self.timestamps.append(timestamp)
+                    self.tags.append(tag_id)
+                    self.arena.extend(data)
+                self.line_open = is_last
+
+            return self._evict()
+
+    def _serial(self, index):
+        return self.first_serial + index - self.head
+
+    def _add_run(self, index, tag_id):
+        """续写的标签与行内已有标签不同时记录分段"""
+        serial = self._serial(index)
+        runs = self.runs.get(serial)
+        if runs is None:
+            if self.tags[index] == tag_id:
+                return
+            runs = self.runs[serial] = [(0, self.tags[index])]
+        if runs[-1][1] == tag_id:
+            return
+        start = self.offsets[index] - self.arena_base
+        runs.append((len(self.arena[start:].decode('utf-8', 'replace')), tag_id))
+
+    def _evict(self):
+        """淘汰超出上限的旧行"""
+        count = len(self.offsets) - self.head
+        total = self.arena_base + len(self.arena)
+        evicted = 0
+        while count > 1 and (
+            count > self.max_lines
+            or total - self.offsets[self.head] > self.max_bytes
+        ):
+            self.head += 1
+            count -= 1
+            evicted += 1
+
+        if evicted:
+            if self.runs:
+                for serial in range(self.first_serial, self.first_serial + evicted):
+                    self.runs.pop(serial, None)
+            self.first_serial += evicted
+            # 已淘汰部分超过一半时压缩，均摊为 O(1)
+            if self.head > 1024 and self.head * 2 > len(self.offsets):
+                self._compact()
+        return evicted
+
+    def _compact(self):
+        """丢弃已淘汰行占用的空间"""
+        cut = self.offsets[self.head] - self.arena_base
+        del self.arena[:cut]
+        self.arena_base += cut
+        del self.offsets[:self.head]
+        del self.timestamps[:self.head]
+        del self.tags[:self.head]
+        self.head = 0
+
+    def _line(self, index):
+        start = self.offsets[index] - self.arena_base
+        if index + 1 < len(self.offsets):
+            end = self.offsets[index + 1] - self.arena_base
+        else:
+            end = len(self.arena)
+        text = self.arena[start:end].decode('utf-8', 'replace')
+        return text, self.tag_names[self.tags[index]], self.timestamps[index]
+
+    def _segments(self, index):
+        text, tag, timestamp = self._line(index)
+        runs = self.runs.get(self._serial(index))
+        if not runs:
+            return [(text, tag)], timestamp
+        segments = []
+        for i, (start, tag_id) in enumerate(runs):
+            end = runs[i + 1][0] if i + 1 < len(runs) else len(text)
+            if end > start:
+                segments.append((text[start:end], self.tag_names[tag_id]))
+        return segments, timestamp
+
+    def get_segments(self, serial, count):
+        """按序号读取若干行的分段，返回 [([(文本, 标签), ...], 时间戳), ...]"""
+        with self.lock:
+            start = max(serial, self.first_serial) - self.first_serial + self.head
+            end = min(start + max(0, count), len(self.offsets))
+            return [self._segments(i) for i in range(start, end)]
+
+    def get_lines(self, serial, count):
+        """按序号读取若干行，返回 [(文本, 标签, 时间戳), ...]"""
+        with self.lock:
+            start = max(serial, self.first_serial) - self.first_serial + self.head
+            end = min(start + max(0, count), len(self.offsets))
+            return [self._line(i) for i in range(start, end)]
+
+    def tail(self, count):
+        """读取最后若干行"""
+        with self.lock:
+            end = self.first_serial + len(self.offsets) - self.head
+            return self.get_lines(max(self.first_serial, end - count), count)
+
+    def clear(self):
+        """清空缓冲区，序号继续递增"""
+        with self.lock:
+            self.first_serial += len(self.offsets) - self.head
+            self.arena = bytearray()
+            self.arena_base = 0
+            self.offsets = array('Q')
+            self.timestamps = array('d')
+            self.tags = array('H')
+            self.runs = {}
+            self.head = 0
+            self.line_open = False
+            self.version += 1
@@ -121,10 +121,15 @@ class ScrolledNotebook(ttk.Frame):
                 self.current_position = index - self.max_visible_tabs + 1
                 self.update_tab_position()
     
-    def add(self, *args, **kwargs):
-        """添加标签页"""
+    def add(self, *args, update=True, **kwargs):
+        """添加标签页，批量添加时传入 update=False，最后调用一次 refresh_tabs"""
         result = self.notebook.add(*args, **kwargs)
-        
+        if update:
+            self.refresh_tabs()
+        return result
+    
+    def refresh_tabs(self):
+        """重新计算标签页数量和可见范围"""
         # 更新标签页计数
         self.tab_count = len(self.notebook.tabs())
         
@@ -133,8 +138,6 @@ class ScrolledNotebook(ttk.Frame):
         
         # 更新标签页位置和按钮状态
         self.update_tab_position()
-        
-        return result
     
     def forget(self, index):
         """删除标签页"""
@@ -0,0 +1,597 @@
+import re
+import abc
+import sys
+import time
+import logging
+import shutil
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# 服务状态（与 sc 输出中 STATE 的名称一致）
+RUNNING = 'RUNNING'
+STOPPED = 'STOPPED'
+START_PENDING = 'START_PENDING'
+STOP_PENDING = 'STOP_PENDING'
+PAUSED = 'PAUSED'
+
+STATE_TEXT = {
+    RUNNING: '运行中',
+    STOPPED: '已停止',
+    START_PENDING: '启动中',
+    STOP_PENDING: '停止中',
+    PAUSED: '已暂停',
+}
+
+# 等待服务到达目标状态的默认超时（秒）
+DEFAULT_TIMEOUT = 30.0
+# 轮询服务状态的间隔：从 POLL_MIN 开始逐次乘以 POLL_FACTOR，不超过 POLL_MAX
+POLL_MIN = 0.1
+POLL_MAX = 1.0
+POLL_FACTOR = 1.5
+
+# sc 枚举服务时的缓冲区大小，太小时需要按 resume index 分多次查询
+SC_BUFFER_SIZE = 262144
+
+RESUME_PATTERN = re.compile(r'resume at index (\d+)', re.IGNORECASE)
+
+# 枚举中没有、单独查询也不存在的名称，这么长时间（秒）内轮询时不再单独查询
+MISSING_TTL = 300.0
+
+
+def state_text(state):
+    """界面上显示的状态文本"""
+    if state is None:
+        return '不存在'
+    return STATE_TEXT.get(state, state)
+
+
+class ServiceError(Exception):
+    """查询或控制服务失败"""
+
+
+class ServiceStatus:
+    """一个服务的状态"""
+    __slots__ = ('name', 'state', 'display_name')
+
+    def __init__(self, name, state, display_name=''):
+        self.name = name
+        self.state = state
+        self.display_name = display_name
+
+    def __repr__(self):
+        return f"ServiceStatus({self.name!r}, {self.state!r})"
+
+
+def parse_sc_query(text):
+    """解析 sc query 的输出，返回 {服务名（小写）: ServiceStatus}
+
+    每个服务以 SERVICE_NAME 开头，STATE 行形如 "STATE : 4  RUNNING"，
+    这些字段名在本地化的 Windows 上也不翻译。
+    """
+    result = {}
+    current = None
+    for line in text.splitlines():
+        key, sep, value = line.partition(':')
+        if not sep:
+            continue
+        key = key.strip()
+        value = value.strip()
+        if key == 'SERVICE_NAME':
+            current = ServiceStatus(value, None)
+            result[value.lower()] = current
+        elif current is None:
+            continue
+        elif key == 'DISPLAY_NAME':
+            current.display_name = value
+        elif key == 'STATE':
+            parts = value.split()
+            if parts:
+                current.state = parts[1] if len(parts) > 1 else parts[0]
+    return result
+
+
+class ServiceBackend(abc.ABC):
+    """服务管理后端的接口
+
+    query 一次查询多个服务；start/stop 只提交请求，不等待服务到达目标状态，
+    需要时用 wait_for_state 轮询；restart 依次停止、等待、启动、等待。
+    除 query 外的方法会阻塞调用线程，不应在主线程调用。失败时抛出 ServiceError。
+    """
+    @abc.abstractmethod
+    def query(self, names):
+        """查询一组服务，返回 {服务名: ServiceStatus 或 None（服务不存在）}"""
+
+    @abc.abstractmethod
+    def start(self, name):
+        """提交启动请求"""
+
+    @abc.abstractmethod
+    def stop(self, name):
+        """提交停止请求"""
+
+    def wait_for_state(self, name, state, timeout=DEFAULT_TIMEOUT):
+        """轮询直到服务到达 state 或超时，返回最后查询到的状态
+
+        轮询间隔逐渐增大，快速完成的操作很快就能确认；
+        已经离开等待状态（*_PENDING）却停在其他稳定状态时（例如启动失败又回到 STOPPED）不再等待。
+        """
+        deadline = time.monotonic() + timeout
+        interval = POLL_MIN
+        left_pending = False
+        while True:
+            status = self.query([name]).get(name)
+            current = status.state if status is not None else None
+            if current == state or current is None:
+                return current
+            if current in (START_PENDING, STOP_PENDING):
+                left_pending = True
+            elif left_pending:
+                return current
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return current
+            time.sleep(min(interval, remaining))
+            interval = min(POLL_MAX, interval * POLL_FACTOR)
+
+    def restart(self, name, timeout=DEFAULT_TIMEOUT):
+        """重启服务（已停止的服务直接启动），等待服务重新运行"""
+        status = self.query([name]).get(name)
+        if status is None:
+            raise ServiceError(f"服务 {name} 不存在")
+        if status.state != STOPPED:
+            self.stop(name)
+            state = self.wait_for_state(name, STOPPED, timeout)
+            if state != STOPPED:
+                raise ServiceError(f"服务 {name} 未能停止，当前状态: {state_text(state)}")
+        self.start(name)
+        state = self.wait_for_state(name, RUNNING, timeout)
+        if state != RUNNING:
+            raise ServiceError(f"服务 {name} 未能启动，当前状态: {state_text(state)}")
+
+
+class ScBackend(ServiceBackend):
+    """Windows：用 sc 查询和控制服务
+
+    所有服务的状态通过一次 sc query state= all 枚举得到，不再每个服务启动一个 sc 进程；
+    枚举结果中没有的名称（例如驱动程序）再单独查询，确认不存在的名称在 MISSING_TTL 内不再重复查询。
+    sc start/stop 提交请求后立即返回（服务处于 START_PENDING/STOP_PENDING），不像 net 那样等待完成。
+    """
+    def __init__(self):
+        # 确认不存在的名称（小写）-> 确认时间
+        self.missing = {}
+
+    def run_sc(self, args, check=False):
+        """执行 sc 并返回输出文本，check 为真时退出码非零抛出 ServiceError"""
+        try:
+            result = subprocess.run(
+                ['sc'] + args,
+                capture_output=True,
+                text=True,
+                stdin=subprocess.DEVNULL,
+                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+            )
+        except OSError as e:
+            raise ServiceError(f"无法执行 sc: {e}")
+        if check and result.returncode != 0:
+            # sc 的错误信息输出在标准输出中
+            raise ServiceError((result.stdout or result.stderr).strip() or f"sc 退出码 {result.returncode}")
+        return result.stdout
+
+    def query_all(self):
+        """枚举所有服务，返回 {服务名（小写）: ServiceStatus}"""
+        statuses = {}
+        resume = 0
+        while True:
+            args = ['query', 'type=', 'service', 'state=', 'all', 'bufsize=', str(SC_BUFFER_SIZE)]
+            if resume:
+                args += ['ri=', str(resume)]
+            output = self.run_sc(args)
+            statuses.update(parse_sc_query(output))
+            match = RESUME_PATTERN.search(output)
+            if match is None or int(match.group(1)) <= resume:
+                return statuses
+            resume = int(match.group(1))
+
+    def query_one(self, name):
+        """单独查询一个服务，不存在时返回 None"""
+        return parse_sc_query(self.run_sc(['query', name])).get(name.lower())
+
+    def query(self, names):
+        if not names:
+            return {}
+        if len(names) == 1:
+            # 只查一个服务（等待状态时）不需要枚举所有服务，也不使用不存在名称的缓存
+            status = self.query_one(names[0])
+            if status is not None:
+                self.missing.pop(names[0].lower(), None)
+            return {names[0]: status}
+        statuses = self.query_all()
+        now = time.monotonic()
+        result = {}
+        for name in names:
+            key = name.lower()
+            status = statuses.get(key)
+            if status is None:
+                checked = self.missing.get(key)
+                if checked is None or now - checked >= MISSING_TTL:
+                    status = self.query_one(name)
+                    if status is None:
+                        self.missing[key] = now
+            if status is not None:
+                self.missing.pop(key, None)
+            result[name] = status
+        return result
+
+    def start(self, name):
+        self.run_sc(['start', name], check=True)
+
+    def stop(self, name):
+        self.run_sc(['stop', name], check=True)
+
+
+class ScReplayBackend(ScBackend):
+    """回放录制的 sc 输出，用于在没有 Windows 的环境中测试
+
+    录制方法：sc query type= service state= all bufsize= 262144 > services.txt
+    """
+    def __init__(self, path=None, text=''):
+        super().__init__()
+        self.path = path
+        self.text = text
+        self.calls = 0
+
+    def run_sc(self, args, check=False):
+        self.calls += 1
+        if args[:1] != ['query']:
+            raise ServiceError("回放的 sc 输出不能控制服务")
+        if self.path is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8', errors='replace') as f:
+                    text = f.read()
+            except OSError as e:
+                raise ServiceError(f"无法读取录制的 sc 输出: {e}")
+        else:
+            text = self.text
+        if len(args) == 2:
+            # 单独查询：只返回该服务的段落
+            status = parse_sc_query(text).get(args[1].lower())
+            if status is None:
+                return "[SC] EnumQueryServicesStatus:OpenService FAILED 1060:\n"
+            return f"SERVICE_NAME: {status.name}\nDISPLAY_NAME: {status.display_name}\n        STATE              : 0  {status.state}\n"
+        return text
+
+
+class SystemdBackend(ServiceBackend):
+    """Linux：通过 systemctl 管理 systemd 单元，user 为真时管理当前用户的单元（systemctl --user）
+
+    一次 systemctl show 查询所有单元；start/stop 使用 --no-block，提交任务后立即返回。
+    """
+    ACTIVE_STATES = {
+        'active': RUNNING,
+        'reloading': RUNNING,
+        'inactive': STOPPED,
+        'failed': STOPPED,
+        'activating': START_PENDING,
+        'deactivating': STOP_PENDING,
+    }
+    PROPERTIES = 'Id,LoadState,ActiveState,Description'
+
+    def __init__(self, user=True):
+        self.user = user
+
+    def run_systemctl(self, args, check=False):
+        command = ['systemctl'] + (['--user'] if self.user else []) + args
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, stdin=subprocess.DEVNULL)
+        except OSError as e:
+            raise ServiceError(f"无法执行 systemctl: {e}")
+        if check and result.returncode != 0:
+            raise ServiceError(result.stderr.strip() or f"systemctl 退出码 {result.returncode}")
+        return result
+
+    def parse_block(self, name, block):
+        properties = {}
+        for line in block.splitlines():
+            key, _, value = line.partition('=')
+            properties[key] = value
+        if properties.get('LoadState') in (None, 'not-found'):
+            return None
+        active = properties.get('ActiveState', '')
+        return ServiceStatus(name, self.ACTIVE_STATES.get(active, active.upper()), properties.get('Description', ''))
+
+    def query(self, names):
+        if not names:
+            return {}
+        result = self.run_systemctl(['show', f'--property={self.PROPERTIES}', '--'] + list(names))
+        # 每个单元一段，按参数顺序以空行分隔
+        blocks = result.stdout.strip('\n').split('\n\n')
+        if result.returncode == 0 and len(blocks) == len(names):
+            return {name: self.parse_block(name, block) for name, block in zip(names, blocks)}
+        if len(names) == 1:
+            if 'not found' in result.stderr or 'not valid' in result.stderr:
+                return {names[0]: None}
+            raise ServiceError(result.stderr.strip() or f"systemctl 退出码 {result.returncode}")
+        # 有无效的单元名时整个命令失败，逐个查询
+        statuses = {}
+        for name in names:
+            statuses.update(self.query([name]))
+        return statuses
+
+    def start(self, name):
+        self.run_systemctl(['start', '--no-block', '--', name], check=True)
+
+    def stop(self, name):
+        self.run_systemctl(['stop', '--no-block', '--', name], check=True)
+
+
+class FakeService:
+    """FakeServiceBackend 中的一个服务"""
+    __slots__ = ('name', 'display_name', 'state', 'target', 'due')
+
+    def __init__(self, name, state=STOPPED, display_name=''):
+        self.name = name
+        self.display_name = display_name or name
+        self.state = state
+        # 正在转换到的状态及到达时间
+        self.target = None
+        self.due = 0.0
+
+
+class FakeServiceBackend(ServiceBackend):
+    """内存中的模拟服务，用于基准测试和在没有服务管理器的环境中调试界面
+
+    start_latency/stop_latency  服务处于 START_PENDING/STOP_PENDING 的秒数
+    query_latency               每次查询的固定耗时（模拟启动 sc 进程）
+    query_cost                  每个服务增加的查询耗时
+    auto_create                 查询不存在的服务时自动创建（初始为 STOPPED）
+    fail_start                  启动后又回到 STOPPED 的服务名
+    状态按时间推算，不需要额外的线程；可在任意线程调用。
+    """
+    def __init__(self, services=(), start_latency=0.5, stop_latency=0.5, query_latency=0.0,
+                 query_cost=0.0, auto_create=True, fail_start=()):
+        self.start_latency = max(0.0, float(start_latency))
+        self.stop_latency = max(0.0, float(stop_latency))
+        self.query_latency = max(0.0, float(query_latency))
+        self.query_cost = max(0.0, float(query_cost))
+        self.auto_create = auto_create
+        self.fail_start = {name.lower() for name in fail_start}
+        self.lock = threading.Lock()
+        self.services = {}
+        self.queries = 0
+        for name in services:
+            self.add(name)
+
+    def add(self, name, state=STOPPED, display_name=''):
+        with self.lock:
+            self.services[name.lower()] = FakeService(name, state, display_name)
+
+    def set_state(self, name, state):
+        """模拟服务在外部被启动或停止"""
+        with self.lock:
+            service = self.services[name.lower()]
+            service.state = state
+            service.target = None
+
+    def lookup(self, name, now):
+        service = self.services.get(name.lower())
+        if service is None and self.auto_create:
+            service = self.services[name.lower()] = FakeService(name)
+        if service is not None and service.target is not None and now >= service.due:
+            service.state = service.target
+            service.target = None
+        return service
+
+    def query(self, names):
+        delay = self.query_latency + self.query_cost * len(names)
+        if delay:
+            time.sleep(delay)
+        now = time.monotonic()
+        result = {}
+        with self.lock:
+            self.queries += 1
+            for name in names:
+                service = self.lookup(name, now)
+                result[name] = ServiceStatus(service.name, service.state, service.display_name) if service else None
+        return result
+
+    def transition(self, name, allowed, pending, target, latency):
+        with self.lock:
+            service = self.lookup(name, time.monotonic())
+            if service is None:
+                raise ServiceError(f"服务 {name} 不存在")
+            if service.state not in allowed:
+                raise ServiceError(f"服务 {name} 当前状态为 {state_text(service.state)}")
+            service.state = pending
+            service.target = target
+            service.due = time.monotonic() + latency
+
+    def start(self, name):
+        target = STOPPED if name.lower() in self.fail_start else RUNNING
+        self.transition(name, (STOPPED,), START_PENDING, target, self.start_latency)
+
+    def stop(self, name):
+        self.transition(name, (RUNNING, PAUSED), STOP_PENDING, STOPPED, self.stop_latency)
+
+
+def create_service_backend(settings=None):
+    """按 service_backend 设置创建服务后端，当前平台不支持时返回 None
+
+    设置可以是后端名称，也可以是 {type: 名称, 其他选项}：
+        sc       Windows 默认
+        systemd  systemctl，其他平台有 systemctl 时默认；user 默认为 true（管理用户单元）
+        fake     内存中的模拟服务，选项见 FakeServiceBackend
+        replay   回放录制的 sc 输出，file 为录制文件路径
+    """
+    settings = settings or {}
+    if isinstance(settings, str):
+        settings = {'type': settings}
+    kind = settings.get('type')
+    if kind is None:
+        if sys.platform == 'win32':
+            kind = 'sc'
+        elif shutil.which('systemctl'):
+            kind = 'systemd'
+    options = {key: value for key, value in settings.items() if key != 'type'}
+    try:
+        if kind == 'sc':
+            return ScBackend()
+        if kind == 'systemd':
+            return SystemdBackend(user=options.get('user', True))
+        if kind == 'fake':
+            return FakeServiceBackend(**options)
+        if kind == 'replay':
+            return ScReplayBackend(path=options.get('file'))
+    except TypeError as e:
+        logger.error(f"服务后端设置无效: {e}")
+        return None
+    if kind is not None:
+        logger.error(f"未知的服务后端: {kind}")
+    return None
+
+
+class PollSchedule:
+    """服务状态轮询的自适应间隔
+
+    配置项（设置中的 service_poll）：
+        fast_interval  状态刚变化、刚操作过服务或有服务处于等待状态（*_PENDING）时的间隔，默认 1 秒
+        slow_interval  状态稳定时的最长间隔，默认 30 秒
+        settle         最近一次变化后保持快速轮询的秒数，默认 10
+    稳定后间隔逐次加倍直到 slow_interval，而不是直接跳到最慢。
+    """
+    def __init__(self, fast_interval=1.0, slow_interval=30.0, settle=10.0):
+        self.fast_interval = max(0.2, float(fast_interval))
+        self.slow_interval = max(self.fast_interval, float(slow_interval))
+        self.settle = max(0.0, float(settle))
+        self.interval = self.fast_interval
+        self.fast_until = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        config = config if isinstance(config, dict) else {}
+        return cls(
+            fast_interval=config.get('fast_interval', 1.0),
+            slow_interval=config.get('slow_interval', 30.0),
+            settle=config.get('settle', 10.0)
+        )
+
+    def boost(self, now):
+        """刚发生变化或刚操作过服务，接下来 settle 秒内快速轮询"""
+        self.fast_until = max(self.fast_until, now + self.settle)
+        self.interval = self.fast_interval
+
+    def next_interval(self, statuses, changed, now):
+        """按本次查询结果计算到下一次查询的秒数"""
+        if changed:
+            self.boost(now)
+        pending = any(
+            status is not None and status.state in (START_PENDING, STOP_PENDING)
+            for status in statuses.values()
+        )
+        if pending or now < self.fast_until:
+            self.interval = self.fast_interval
+        else:
+            self.interval = min(self.slow_interval, self.interval * 2)
+        return self.interval
+
+
+class ServiceMonitor:
+    """在后台线程查询服务状态
+
+    refresh 只登记查询请求，由后台线程执行，查询期间的多个请求合并成一次查询
+    （同一个回调只保留最后一次请求），结果按各自的服务名分给每个回调，
+    通过 post（在主线程执行回调的函数）交回主线程。
+    """
+    def __init__(self, backend, post):
+        self.backend = backend
+        self.post = post
+        self.condition = threading.Condition()
+        # 等待查询的 {回调: 服务名列表}
+        self.pending = {}
+        self.running = False
+        self.thread = None
+        # 最近一次查询的耗时（秒）
+        self.last_duration = 0.0
+
+    @property
+    def available(self):
+        return self.backend is not None
+
+    def start(self):
+        if self.backend is None or self.thread is not None:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='ServiceMonitor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.pending = {}
+            self.condition.notify()
+        self.thread = None
+
+    def refresh(self, names, callback):
+        """请求查询 names，完成后在主线程调用 callback(statuses, error)
+
+        statuses 为 {服务名: ServiceStatus 或 None}，查询失败时为 None 并给出 error。
+        """
+        if self.backend is None:
+            return
+        with self.condition:
+            self.pending[callback] = list(names)
+            self.condition.notify()
+
+    def control(self, name, action, callback, timeout=DEFAULT_TIMEOUT):
+        """在后台线程启动（start）、停止（stop）或重启（restart）服务
+
+        提交请求后轮询服务状态直到到达目标状态或超时，不在调用线程等待；
+        完成后在主线程调用 callback(name, action, error)，成功时 error 为 None。
+        """
+        threading.Thread(
+            target=self.run_control,
+            args=(name, action, callback, timeout),
+            name=f'ServiceControl-{name}',
+            daemon=True
+        ).start()
+
+    def run_control(self, name, action, callback, timeout):
+        try:
+            if action == 'restart':
+                self.backend.restart(name, timeout)
+            else:
+                target, verb = (RUNNING, '启动') if action == 'start' else (STOPPED, '停止')
+                getattr(self.backend, action)(name)
+                state = self.backend.wait_for_state(name, target, timeout)
+                if state != target:
+                    raise ServiceError(f"服务 {name} 未能{verb}，当前状态: {state_text(state)}")
+            error = None
+        except Exception as e:
+            logger.error(f"服务 {name} {action} 失败: {e}")
+            error = str(e)
+        self.post(callback, name, action, error)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                requests = self.pending
+                self.pending = {}
+            names = list(dict.fromkeys(name for names in requests.values() for name in names))
+            start = time.perf_counter()
+            try:
+                statuses = self.backend.query(names)
+                error = None
+            except Exception as e:
+                logger.error(f"查询服务状态失败: {e}")
+                statuses, error = None, str(e)
+            self.last_duration = time.perf_counter() - start
+            for callback, requested in requests.items():
+                if statuses is None:
+                    self.post(callback, None, error)
+                else:
+                    self.post(callback, {name: statuses.get(name) for name in requested}, None)
@@ -0,0 +1,370 @@
+import re
+import socket
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# 默认同时处于启动中（已运行、尚未就绪）的控制台数
+DEFAULT_MAX_PARALLEL = 8
+# 默认等待就绪的时间（秒）
+DEFAULT_READY_TIMEOUT = 60.0
+
+
+def dependencies(config):
+    """控制台配置中的 depends_on，统一成列表"""
+    depends_on = config.get('depends_on') or []
+    if isinstance(depends_on, str):
+        depends_on = [depends_on]
+    return [str(name) for name in depends_on]
+
+
+class ReadinessCheck:
+    """控制台的就绪条件
+
+    配置项（控制台配置中的 ready）：
+        output   输出中出现匹配该正则的行
+        port     端口可以连接，host 默认为 127.0.0.1
+        delay    启动后等待的秒数
+        timeout  等待就绪的最长时间（秒），默认 60
+    没有配置时进程启动即视为就绪。就绪或失败只通知一次，回调可能在任意线程中执行。
+    """
+    def __init__(self, pattern=None, port=None, host='127.0.0.1', delay=0.0,
+                 timeout=DEFAULT_READY_TIMEOUT):
+        self.regex = re.compile(pattern) if pattern else None
+        self.port = int(port) if port else None
+        self.host = host or '127.0.0.1'
+        self.delay = max(0.0, float(delay))
+        self.timeout = max(0.0, float(timeout))
+        self.lock = threading.Lock()
+        self.settled = False
+        self.on_ready = None
+        self.on_failed = None
+        self.timers = []
+
+    @classmethod
+    def from_config(cls, config):
+        """按 ready 配置创建，没有配置时返回 None"""
+        if not isinstance(config, dict) or not config:
+            return None
+        return cls(
+            pattern=config.get('output'),
+            port=config.get('port'),
+            host=config.get('host', '127.0.0.1'),
+            delay=config.get('delay', 0),
+            timeout=config.get('timeout', DEFAULT_READY_TIMEOUT)
+        )
+
+    def describe(self):
+        parts = []
+        if self.regex is not None:
+            parts.append(f"输出匹配 {self.regex.pattern!r}")
+        if self.port:
+            parts.append(f"端口 {self.host}:{self.port} 可连接")
+        if self.delay:
+            parts.append(f"等待 {self.delay:g} 秒")
+        return '，'.join(parts) or '进程启动'
+
+    def begin(self, io_loop, on_ready, on_failed):
+        """开始等待就绪"""
+        self.on_ready = on_ready
+        self.on_failed = on_failed
+        if self.timeout:
+            self.timers.append(io_loop.call_later(self.timeout, self.fail, f"{self.timeout:g} 秒内未就绪"))
+        if self.port:
+            threading.Thread(target=self.wait_port, name='ReadinessCheck', daemon=True).start()
+        elif self.regex is None:
+            self.timers.append(io_loop.call_later(self.delay, self.ready))
+
+    def feed_line(self, line):
+        """检查一行输出（在 I/O 线程中调用）"""
+        if self.regex is not None and not self.settled and self.regex.search(line):
+            self.ready()
+
+    def process_exited(self, returncode):
+        self.fail(f"进程在就绪前退出，退出码: {returncode}")
+
+    def wait_port(self):
+        """轮询端口直到可以连接，连接超时很短，不影响其他控制台"""
+        stop = threading.Event()
+        if self.delay:
+            stop.wait(self.delay)
+        while not self.settled:
+            try:
+                with socket.create_connection((self.host, self.port), timeout=0.5):
+                    self.ready()
+                    return
+            except OSError:
+                stop.wait(0.25)
+
+    def ready(self):
+        self.settle(self.on_ready)
+
+    def fail(self, reason):
+        self.settle(self.on_failed, reason)
+
+    def cancel(self):
+        self.settle(None)
+
+    def settle(self, callback, *args):
+        with self.lock:
+            if self.settled:
+                return
+            self.settled = True
+        for timer in self.timers:
+            timer.cancel()
+        if callback is not None:
+            callback(*args)
+
+
+class StartupScheduler:
+    """按依赖关系启动和停止控制台
+
+    控制台用 depends_on 声明依赖，依赖全部就绪后才启动；互不依赖的控制台并行启动，
+    同时处于启动中（已运行、尚未就绪）的数量不超过 max_parallel，
+    总启动时间取决于依赖链中最长的一条，而不是所有控制台依次启动。
+    依赖启动失败、就绪超时或循环依赖的控制台不会启动。
+    停止按相反的顺序进行：依赖某个控制台的其他控制台都退出后才停止它。
+    所有方法都在主线程调用。
+    """
+    def __init__(self, app, max_parallel=DEFAULT_MAX_PARALLEL):
+        self.app = app
+        self.max_parallel = max(1, int(max_parallel))
+        # 等待启动的控制台（按依赖顺序）
+        self.waiting = []
+        # 已运行、等待就绪的控制台 {名称: ReadinessCheck 或 None}
+        self.starting = {}
+        # 本轮启动已就绪的控制台
+        self.ready = set()
+        # 本轮启动未能就绪的控制台（就绪超时时进程可能仍在运行）
+        self.unready = set()
+        # 等待按依赖逆序停止的控制台
+        self.stopping = set()
+        self.pump_scheduled = False
+
+    def configure(self, settings):
+        """应用配置文件中的 startup 设置"""
+        settings = settings if isinstance(settings, dict) else {}
+        self.max_parallel = max(1, int(settings.get('max_parallel', DEFAULT_MAX_PARALLEL)))
+
+    def config(self, name):
+        tab = self.app.current_tabs.get(name)
+        return tab.config if tab is not None else self.app.consoles.get(name, {})
+
+    def dependency_order(self, names):
+        """展开依赖，返回 (按依赖排序的名称, {无法启动的名称: 原因})"""
+        order = []
+        errors = {}
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return name not in errors
+            if state.get(name) == 'visiting':
+                cycle = path[path.index(name):] + [name]
+                for member in cycle:
+                    errors.setdefault(member, f"循环依赖: {' -> '.join(cycle)}")
+                return False
+            if name not in self.app.current_tabs:
+                errors[name] = "控制台不存在"
+                state[name] = 'done'
+                return False
+            state[name] = 'visiting'
+            ok = True
+            for dependency in dependencies(self.config(name)):
+                if not visit(dependency, path + [name]):
+                    ok = False
+                    errors.setdefault(name, f"依赖 {dependency} 无法启动")
+            state[name] = 'done'
+            if ok and name not in errors:
+                order.append(name)
+            return ok and name not in errors
+
+        for name in names:
+            visit(name, [])
+        return order, errors
+
+    def start(self, names):
+        """按依赖关系启动一组控制台（连同它们未运行的依赖）"""
+        order, errors = self.dependency_order(names)
+        for name, reason in errors.items():
+            self.skip(name, reason)
+        for name in order:
+            tab = self.app.current_tabs[name]
+            self.stopping.discard(name)
+            self.unready.discard(name)
+            if name in self.waiting or name in self.starting:
+                continue
+            if tab.is_running:
+                # 已在运行的视为就绪
+                self.ready.add(name)
+                continue
+            self.ready.discard(name)
+            self.waiting.append(name)
+        self.pump()
+
+    def is_ready(self, name):
+        tab = self.app.current_tabs.get(name)
+        return tab is not None and tab.is_running and name not in self.unready and (
+            name in self.ready or (name not in self.waiting and name not in self.starting)
+        )
+
+    def pump(self):
+        """启动依赖已就绪的控制台，直到达到并行上限
+        
+        没有就绪条件的控制台启动即就绪，每轮同样最多启动 max_parallel 个，
+        其余留到下一次事件循环，避免一次启动大量进程卡住界面。
+        """
+        launched = 0
+        for name in list(self.waiting):
+            if len(self.starting) + launched >= self.max_parallel:
+                break
+            pending = False
+            failed = None
+            for dependency in dependencies(self.config(name)):
+                if self.is_ready(dependency):
+                    continue
+                if dependency in self.waiting or dependency in self.starting:
+                    pending = True
+                else:
+                    failed = dependency
+                    break
+            if failed is not None:
+                self.waiting.remove(name)
+                self.skip(name, f"依赖 {failed} 未就绪")
+                continue
+            if pending:
+                continue
+            self.waiting.remove(name)
+            self.launch(name)
+            launched += 1
+        if launched and self.waiting:
+            if not self.pump_scheduled:
+                self.pump_scheduled = True
+                self.app.root.after(1, self.resume)
+        elif self.waiting and not self.starting:
+            # 剩下的依赖都不会再就绪
+            for name in list(self.waiting):
+                self.waiting.remove(name)
+                self.skip(name, "依赖未就绪")
+
+    def resume(self):
+        self.pump_scheduled = False
+        self.pump()
+
+    def launch(self, name):
+        tab = self.app.current_tabs[name]
+        tab.run()
+        if not tab.is_running:
+            # 依赖它的控制台在后续检查时会因为它未运行而跳过
+            self.skip(name, "启动失败")
+            return
+        try:
+            check = ReadinessCheck.from_config(tab.config.get('ready'))
+        except (re.error, TypeError, ValueError) as e:
+            tab.append_output(f"就绪条件配置无效: {e}\n", 'error')
+            check = None
+        if check is None:
+            self.ready.add(name)
+            return
+        self.starting[name] = check
+        tab.ready_check = check
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        tab.append_output(f"[{timestamp}] 等待就绪: {check.describe()}\n", 'timestamp')
+        post = self.app.output_dispatcher.post
+        check.begin(
+            self.app.io_loop,
+            lambda: post(self.on_ready, name, check),
+            lambda reason: post(self.failed, name, reason, check)
+        )
+
+    def on_ready(self, name, check):
+        if self.starting.get(name) is not check:
+            return
+        del self.starting[name]
+        self.ready.add(name)
+        tab = self.app.current_tabs.get(name)
+        if tab is not None:
+            if tab.ready_check is check:
+                tab.ready_check = None
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            tab.append_output(f"[{timestamp}] 已就绪\n", 'success')
+        self.pump()
+
+    def failed(self, name, reason, check=None):
+        if check is not None:
+            if self.starting.get(name) is not check:
+                return
+            del self.starting[name]
+            self.unready.add(name)
+        tab = self.app.current_tabs.get(name)
+        if tab is not None and check is not None and tab.ready_check is check:
+            tab.ready_check = None
+        self.skip(name, reason)
+        self.pump()
+
+    def skip(self, name, reason):
+        logger.warning(f"控制台 {name} 未能启动就绪: {reason}")
+        tab = self.app.current_tabs.get(name)
+        if tab is not None:
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            tab.append_output(f"[{timestamp}] {reason}\n", 'error')
+
+    def cancel(self, names=None):
+        """取消尚未开始的启动"""
+        names = set(self.app.current_tabs if names is None else names)
+        self.waiting = [name for name in self.waiting if name not in names]
+        for name in [name for name in self.starting if name in names]:
+            self.starting.pop(name).cancel()
+        self.pump()
+
+    def dependents(self, names):
+        """{名称: 依赖它的控制台（限于 names 中）}"""
+        result = {name: set() for name in names}
+        for name in names:
+            for dependency in dependencies(self.config(name)):
+                if dependency in result:
+                    result[dependency].add(name)
+        return result
+
+    def stop(self, names=None):
+        """按依赖的逆序停止控制台"""
+        names = list(self.app.current_tabs if names is None else names)
+        self.cancel(names)
+        for name in names:
+            tab = self.app.current_tabs.get(name)
+            if tab is not None and not tab.is_running:
+                # 取消等待中的自动重启
+                tab.stop()
+        self.stopping.update(name for name in names if name in self.app.current_tabs)
+        self.pump_stop()
+
+    def pump_stop(self):
+        """停止已没有运行中依赖方的控制台"""
+        tabs = self.app.current_tabs
+        self.stopping = {name for name in self.stopping if name in tabs and tabs[name].is_running}
+        dependents = self.dependents(self.stopping)
+        for name in self.stopping:
+            tab = tabs[name]
+            if tab.is_stopping or any(tabs[other].is_running for other in dependents[name]):
+                continue
+            tab.stop(then=self.pump_stop)
+
+    def stop_timeout(self, names):
+        """按依赖逆序停止 names 所需的最长时间（依赖链上停止策略时间之和）"""
+        dependents = self.dependents(names)
+        memo = {}
+
+        def chain(name, visiting):
+            if name in memo:
+                return memo[name]
+            if name in visiting:
+                return 0
+            tab = self.app.current_tabs.get(name)
+            own = tab.stop_policy.total_timeout if tab is not None else 0
+            longest = max((chain(other, visiting | {name}) for other in dependents[name]), default=0)
+            memo[name] = own + longest
+            return memo[name]
+
+        return max((chain(name, frozenset()) for name in names), default=0)
@@ -0,0 +1,34 @@
+# 默认超时（秒）
+DEFAULT_COMMAND_TIMEOUT = 10.0
+DEFAULT_TERMINATE_TIMEOUT = 5.0
+
+
+class StopPolicy:
+    """控制台的停止策略
+
+    依次尝试：向 stdin 发送停止命令（可选，如游戏服务器的 stop）、
+    发送终止信号、强制结束，每一步等待各自的超时时间后才进入下一步。
+    """
+    def __init__(self, command=None, command_timeout=DEFAULT_COMMAND_TIMEOUT,
+                 terminate_timeout=DEFAULT_TERMINATE_TIMEOUT):
+        self.command = command or None
+        self.command_timeout = max(0.0, float(command_timeout))
+        self.terminate_timeout = max(0.0, float(terminate_timeout))
+
+    @classmethod
+    def from_config(cls, config):
+        """按控制台配置中的 stop 项创建"""
+        config = config if isinstance(config, dict) else {}
+        return cls(
+            command=config.get('command'),
+            command_timeout=config.get('command_timeout', DEFAULT_COMMAND_TIMEOUT),
+            terminate_timeout=config.get('terminate_timeout', DEFAULT_TERMINATE_TIMEOUT)
+        )
+
+    @property
+    def total_timeout(self):
+        """从开始停止到强制结束的最长时间"""
+        total = self.terminate_timeout
+        if self.command:
+            total += self.command_timeout
+        return total
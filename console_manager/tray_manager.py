@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 from pathlib import Path
 import pystray
 from PIL import Image, ImageDraw
@@ -10,6 +11,10 @@ class TrayManager:
     def __init__(self, app):
         self.app = app
         self.tray_icon = None
+        # 最近一次点击托盘图标或使用托盘菜单的时间
+        self.last_used = 0.0
+        # 服务状态变化时更新菜单
+        app.service_listeners.append(self.on_services_changed)
         
         # 创建托盘图标
         self.create_tray_icon()
@@ -50,42 +55,7 @@ class TrayManager:
         services = getattr(self.app, 'services', [])
         if services:
             for service in services:
-                # 获取服务状态
-                status = service.get('status', 'stopped')
-                
-                # 根据状态添加标志
-                if status == 'running':
-                    status_icon = '▶ '
-                elif status == 'stopped':
-                    status_icon = '◼ '
-                else:
-                    status_icon = '◾ '
-                
-                # 创建服务子菜单
-                def create_service_start_callback(svc):
-                    def callback(icon=None):
-                        self.start_service(svc)
-                    return callback
-                
-                def create_service_stop_callback(svc):
-                    def callback(icon=None):
-                        self.stop_service(svc)
-                    return callback
-                
-                def create_service_restart_callback(svc):
-                    def callback(icon=None):
-                        self.restart_service(svc)
-                    return callback
-                
-                service_submenu = pystray.Menu(
-                    pystray.MenuItem('启动', create_service_start_callback(service), enabled=status != 'running'),
-                    pystray.MenuItem('停止', create_service_stop_callback(service), enabled=status == 'running'),
-                    pystray.MenuItem('重启', create_service_restart_callback(service), enabled=status == 'running')
-                )
-                
-                menu_items.append(
-                    pystray.MenuItem(f"{status_icon}{service.get('name', '未知服务')}", service_submenu)
-                )
+                menu_items.append(self.service_menu_item(service))
             menu_items.append(pystray.Menu.SEPARATOR)
         else:
             menu_items.append(pystray.MenuItem('无服务', None, enabled=False))
@@ -95,12 +65,6 @@ class TrayManager:
         consoles = self.app.current_tabs
         if consoles:
             for name, tab in consoles.items():
-                # 根据状态添加标志
-                if tab.is_running:
-                    status_icon = '▶ '
-                else:
-                    status_icon = '◼ '
-                
                 # 创建控制台子菜单
                 def create_console_start_callback(t):
                     def callback(icon=None):
@@ -124,7 +88,7 @@ class TrayManager:
                 )
                 
                 menu_items.append(
-                    pystray.MenuItem(f"{status_icon}{name}", console_submenu)
+                    pystray.MenuItem(self.console_label(name, tab), console_submenu)
                 )
             menu_items.append(pystray.Menu.SEPARATOR)
         else:
@@ -166,6 +130,7 @@ class TrayManager:
     
     def on_tray_click(self, icon, item):
         """托盘图标点击事件"""
+        self.last_used = time.monotonic()
         # 点击托盘图标时显示/隐藏主窗口
         self.toggle_window()
     
@@ -216,18 +181,85 @@ class TrayManager:
         
         return pystray.Menu(*service_items)
     
+    def service_menu_item(self, service):
+        """服务菜单项
+        
+        文本和可用状态是在菜单更新时读取的函数，服务状态变化后只需 tray_icon.update_menu()，
+        不需要重建整个菜单。
+        """
+        def busy():
+            return service.get('name') in self.app.service_operations
+        
+        def running(item=None):
+            return not busy() and service.get('status', 'stopped') == 'running'
+        
+        def stopped(item=None):
+            return not busy() and service.get('status', 'stopped') != 'running'
+        
+        def label(item=None):
+            status = service.get('status', 'stopped')
+            # 根据状态添加标志
+            if busy():
+                status_icon = '⏳ '
+            elif status == 'running':
+                status_icon = '▶ '
+            elif status == 'stopped':
+                status_icon = '◼ '
+            else:
+                status_icon = '◾ '
+            return f"{status_icon}{service.get('name', '未知服务')}"
+        
+        def start(icon=None):
+            self.start_service(service)
+        
+        def stop(icon=None):
+            self.stop_service(service)
+        
+        def restart(icon=None):
+            self.restart_service(service)
+        
+        service_submenu = pystray.Menu(
+            pystray.MenuItem('启动', start, enabled=stopped),
+            pystray.MenuItem('停止', stop, enabled=running),
+            pystray.MenuItem('重启', restart, enabled=running)
+        )
+        return pystray.MenuItem(label, service_submenu)
+    
+    def on_services_changed(self, changes):
+        """服务状态变化（主线程）：重新读取菜单项的文本和可用状态"""
+        if self.tray_icon:
+            self.tray_icon.update_menu()
+    
+    def recently_used(self, seconds):
+        """最近 seconds 秒内是否点击过托盘图标或使用过托盘菜单"""
+        return time.monotonic() - self.last_used < seconds
+    
+    def console_label(self, name, tab):
+        """控制台菜单项文本：状态标志、名称、重启次数和最后的退出码"""
+        if tab.is_running:
+            status_icon = '▶ '
+        elif tab.crash_looping:
+            status_icon = '⚠ '
+        else:
+            status_icon = '◼ '
+        details = []
+        if tab.crash_looping:
+            details.append('崩溃循环')
+        elif tab.restart_timer is not None and not tab.is_running:
+            details.append('等待重启')
+        if tab.restart_count:
+            details.append(f'重启 {tab.restart_count} 次')
+        if tab.last_exit_code not in (None, 0):
+            details.append(f'退出码 {tab.last_exit_code}')
+        suffix = f" ({'，'.join(details)})" if details else ''
+        return f"{status_icon}{name}{suffix}"
+    
     def create_console_submenu(self):
         """创建控制台管理子菜单"""
         console_items = []
         
         # 获取控制台列表
         for name, tab in self.app.current_tabs.items():
-            # 根据状态添加标志
-            if tab.is_running:
-                status_icon = '▶ '
-            else:
-                status_icon = '◼ '
-            
             # 创建控制台子菜单
             console_submenu = pystray.Menu(
                 pystray.MenuItem('启动', lambda t=tab: self.start_console(t), enabled=not tab.is_running),
@@ -236,7 +268,7 @@ class TrayManager:
             )
             
             console_items.append(
-                pystray.MenuItem(f"{status_icon}{name}", console_submenu)
+                pystray.MenuItem(self.console_label(name, tab), console_submenu)
             )
         
         if not console_items:
@@ -245,57 +277,45 @@ class TrayManager:
         return pystray.Menu(*console_items)
     
     def start_service(self, service):
-        """启动服务"""
-        if hasattr(self.app, 'start_service_by_name'):
-            service_name = service.get('name')
-            if service_name:
-                self.app.start_service_by_name(service_name)
-                # 更新托盘菜单
-                self.update_menu()
+        """启动服务（托盘回调不在主线程，交给主线程在后台执行，菜单随状态变化更新）"""
+        self.last_used = time.monotonic()
+        service_name = service.get('name')
+        if service_name:
+            self.app.output_dispatcher.post(self.app.start_service_by_name, service_name)
 
     def stop_service(self, service):
-        """停止服务"""
-        if hasattr(self.app, 'stop_service_by_name'):
-            service_name = service.get('name')
-            if service_name:
-                self.app.stop_service_by_name(service_name)
-                # 更新托盘菜单
-                self.update_menu()
+        """停止服务（托盘回调不在主线程，交给主线程在后台执行，菜单随状态变化更新）"""
+        self.last_used = time.monotonic()
+        service_name = service.get('name')
+        if service_name:
+            self.app.output_dispatcher.post(self.app.stop_service_by_name, service_name)
 
     def restart_service(self, service):
-        """重启服务"""
-        if hasattr(self.app, 'restart_service_by_name'):
-            service_name = service.get('name')
-            if service_name:
-                self.app.restart_service_by_name(service_name)
-                # 等待服务状态完全更新
-                import time
-                time.sleep(1)
-                # 更新托盘菜单
-                self.update_menu()
+        """重启服务（托盘回调不在主线程，交给主线程在后台执行，菜单随状态变化更新）"""
+        self.last_used = time.monotonic()
+        service_name = service.get('name')
+        if service_name:
+            self.app.output_dispatcher.post(self.app.restart_service_by_name, service_name)
     
     def start_console(self, tab):
         """启动控制台"""
         if not tab.is_running:
-            tab.run()
+            # 托盘回调不在主线程，交给主线程启动
+            self.app.output_dispatcher.post(tab.run)
             # 更新托盘菜单
             self.update_menu()
 
     def stop_console(self, tab):
         """停止控制台"""
         if tab.is_running:
-            tab.stop()
+            # 托盘回调不在主线程，交给主线程按停止策略停止
+            self.app.output_dispatcher.post(tab.stop)
             # 更新托盘菜单
             self.update_menu()
 
     def restart_console(self, tab):
-        """重启控制台"""
-        tab.stop()
-        import threading
-        threading.Thread(target=tab.run, daemon=True).start()
-        # 等待控制台状态完全更新
-        import time
-        time.sleep(0.5)
+        """重启控制台（进程退出后再启动，不等待）"""
+        self.app.output_dispatcher.post(tab.restart)
         # 更新托盘菜单
         self.update_menu()
     
@@ -315,45 +335,7 @@ class TrayManager:
         services = getattr(self.app, 'services', [])
         if services:
             for service in services:
-                # 获取服务状态
-                status = service.get('status', 'stopped')
-                
-                # 根据状态添加标志
-                if status == 'running':
-                    status_icon = '▶ '
-                elif status == 'stopped':
-                    status_icon = '◼ '
-                else:
-                    status_icon = '◾ '
-                
-                # 创建服务子菜单
-                def create_service_start_callback(svc):
-                    def callback(icon=None):
-                        self.start_service(svc)
-                        self.update_menu()
-                    return callback
-                
-                def create_service_stop_callback(svc):
-                    def callback(icon=None):
-                        self.stop_service(svc)
-                        self.update_menu()
-                    return callback
-                
-                def create_service_restart_callback(svc):
-                    def callback(icon=None):
-                        self.restart_service(svc)
-                        self.update_menu()
-                    return callback
-                
-                service_submenu = pystray.Menu(
-                    pystray.MenuItem('启动', create_service_start_callback(service), enabled=status != 'running'),
-                    pystray.MenuItem('停止', create_service_stop_callback(service), enabled=status == 'running'),
-                    pystray.MenuItem('重启', create_service_restart_callback(service), enabled=status == 'running')
-                )
-                
-                menu_items.append(
-                    pystray.MenuItem(f"{status_icon}{service.get('name', '未知服务')}", service_submenu)
-                )
+                menu_items.append(self.service_menu_item(service))
             menu_items.append(pystray.Menu.SEPARATOR)
         else:
             menu_items.append(pystray.MenuItem('无服务', None, enabled=False))
@@ -363,12 +345,6 @@ class TrayManager:
         consoles = self.app.current_tabs
         if consoles:
             for name, tab in consoles.items():
-                # 根据状态添加标志
-                if tab.is_running:
-                    status_icon = '▶ '
-                else:
-                    status_icon = '◼ '
-                
                 # 创建控制台子菜单
                 def create_console_start_callback(t):
                     def callback(icon=None):
@@ -395,7 +371,7 @@ class TrayManager:
                 )
                 
                 menu_items.append(
-                    pystray.MenuItem(f"{status_icon}{name}", console_submenu)
+                    pystray.MenuItem(self.console_label(name, tab), console_submenu)
                 )
             menu_items.append(pystray.Menu.SEPARATOR)
         else:
@@ -416,29 +392,21 @@ class TrayManager:
     
     def run_all_consoles(self):
         """运行所有控制台"""
-        for name, tab in self.app.current_tabs.items():
-            if not tab.is_running:
-                import threading
-                threading.Thread(target=tab.run, daemon=True).start()
+        # 托盘回调不在主线程，交给主线程按依赖顺序启动
+        self.app.output_dispatcher.post(self.app.run_all_consoles)
     
     def stop_all_consoles(self):
         """停止所有控制台"""
-        for name, tab in self.app.current_tabs.items():
-            if tab.is_running:
-                tab.stop()
+        self.app.output_dispatcher.post(self.app.stop_all_consoles)
     
     def exit_app(self):
-        """退出应用程序"""
-        # 先停止所有控制台
-        self.stop_all_consoles()
-        
-        # 停止托盘图标
+        """退出应用程序（由主线程停止所有控制台后退出）"""
+        self.app.output_dispatcher.post(self.app.exit_app)
+    
+    def shutdown(self):
+        """停止托盘图标"""
         if self.tray_icon:
             self.tray_icon.stop()
-        
-        # 退出应用
-        self.app.root.quit()
-        self.app.root.destroy()
     
     def run(self):
         """运行托盘图标"""
@@ -0,0 +1,143 @@
+import tkinter as tk
+from tkinter import ttk
+import tkinter.font as tkfont
+
+class VirtualOutputView(tk.Frame):
+    """虚拟化输出视图
+
+    行数据保存在回滚缓冲区中，文本控件只装载当前可见的一屏（加少量余量），
+    滚动条根据缓冲区的总行数自行计算，因此历史再长 Tk 也只处理几十行。
+    """
+    def __init__(self, parent, store, margin=20, **text_options):
+        tk.Frame.__init__(self, parent, bg=text_options.get('bg'))
+        self.store = store
+        self.margin = margin
+
+        # 第一个可见行的序号
+        self.top_serial = 0
+        # 是否跟随最新输出
+        self.follow_tail = True
+        # 当前装载进文本控件的序号范围
+        self.rendered_start = 0
+        self.rendered_end = 0
+
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        text_options.setdefault('wrap', tk.NONE)
+        self.text = tk.Text(self, **text_options)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        font = tkfont.Font(font=self.text.cget('font'))
+        self.line_height = max(1, font.metrics('linespace'))
+
+        # 接管所有滚动操作
+        self.text.bind('<MouseWheel>', self.on_mousewheel)
+        self.text.bind('<Button-4>', lambda e: self.scroll_lines(-3) or 'break')
+        self.text.bind('<Button-5>', lambda e: self.scroll_lines(3) or 'break')
+        self.text.bind('<Prior>', lambda e: self.scroll_pages(-1) or 'break')
+        self.text.bind('<Next>', lambda e: self.scroll_pages(1) or 'break')
+        self.text.bind('<Control-Home>', lambda e: self.scroll_to(0.0) or 'break')
+        self.text.bind('<Control-End>', lambda e: self.scroll_to(1.0) or 'break')
+        self.text.bind('<Configure>', lambda e: self.render(force=True))
+
+    def visible_lines(self):
+        """当前窗口能显示的行数"""
+        return max(1, self.text.winfo_height() // self.line_height)
+
+    def max_top(self):
+        """第一个可见行序号的最大值"""
+        return max(self.store.first_serial, self.store.end_serial - self.visible_lines())
+
+    def refresh(self):
+        """缓冲区有新内容时调用"""
+        if self.follow_tail:
+            self.top_serial = self.max_top()
+        self.render()
+
+    def clear(self):
+        """缓冲区被清空时调用"""
+        self.follow_tail = True
+        self.top_serial = self.store.first_serial
+        self.render(force=True)
+
+    def render(self, force=False):
+        """按当前位置装载可见行"""
+        first = self.store.first_serial
+        end = self.store.end_serial
+        self.top_serial = max(first, min(self.top_serial, self.max_top()))
+        visible = self.visible_lines()
+
+        window_start = self.top_serial
+        window_end = min(end, self.top_serial + visible)
+        needs_load = (
+            force
+            or window_start < self.rendered_start
+            or window_end > self.rendered_end
+            or self.rendered_start < first
+            or self.follow_tail
+        )
+
+        if needs_load:
+            start = max(first, self.top_serial - self.margin)
+            lines = self.store.get_segments(start, self.top_serial + visible + self.margin - start)
+
+            args = []
+            for segments, _ in lines:
+                for text, tag in segments:
+                    args.append(text)
+                    args.append(tag or ())
+                args.append('\n')
+                args.append(())
+
+            self.text.delete('1.0', tk.END)
+            if args:
+                self.text.insert(tk.END, *args)
+            self.rendered_start = start
+            self.rendered_end = start + len(lines)
+
+        self.text.yview(f'{self.top_serial - self.rendered_start + 1}.0')
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        """根据总行数设置滚动条位置"""
+        total = self.store.end_serial - self.store.first_serial
+        if total <= 0:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        top = (self.top_serial - self.store.first_serial) / total
+        bottom = min(1.0, top + self.visible_lines() / total)
+        self.scrollbar.set(top, bottom)
+
+    def scroll_lines(self, count):
+        """滚动若干行"""
+        self.top_serial += count
+        self.follow_tail = self.top_serial >= self.max_top()
+        self.render()
+
+    def scroll_pages(self, count):
+        """滚动若干页"""
+        self.scroll_lines(count * max(1, self.visible_lines() - 1))
+
+    def scroll_to(self, fraction):
+        """滚动到指定比例位置"""
+        total = self.store.end_serial - self.store.first_serial
+        self.top_serial = self.store.first_serial + int(total * max(0.0, min(1.0, fraction)))
+        self.follow_tail = self.top_serial >= self.max_top()
+        self.render()
+
+    def on_scrollbar(self, action, *args):
+        """滚动条回调"""
+        if action == 'moveto':
+            self.scroll_to(float(args[0]))
+        elif action == 'scroll':
+            count, unit = int(args[0]), args[1]
+            if unit == 'pages':
+                self.scroll_pages(count)
+            else:
+                self.scroll_lines(count)
+
+    def on_mousewheel(self, event):
+        """鼠标滚轮滚动"""
+        self.scroll_lines(-3 if event.delta > 0 else 3)
+        return 'break'
@@ -0,0 +1,149 @@
+import sys
+import time
+import logging
+import threading
+import traceback
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """计算百分位，返回 {'p50': 值, ..., 'max': 值}，没有数据时返回空字典"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        index = min(len(ordered) - 1, int(len(ordered) * point / 100))
+        result[f'p{point:g}'] = ordered[index]
+    result['max'] = ordered[-1]
+    return result
+
+
+class HandlerStats:
+    """主线程回调的耗时统计，按名称累计次数、总耗时和最长耗时"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        # {名称: [次数, 总耗时, 最长耗时]}
+        self.handlers = {}
+
+    def record(self, name, seconds):
+        with self.lock:
+            entry = self.handlers.get(name)
+            if entry is None:
+                self.handlers[name] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+
+    def timed(self, name, func):
+        """包装函数，每次调用记录耗时"""
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        wrapper.__name__ = getattr(func, '__name__', name)
+        wrapper.__doc__ = getattr(func, '__doc__', None)
+        return wrapper
+
+    def slowest(self, count=20):
+        """按最长耗时排序，返回 [(名称, 次数, 总耗时, 最长耗时), ...]"""
+        with self.lock:
+            items = [(name, *entry) for name, entry in self.handlers.items()]
+        items.sort(key=lambda item: item[3], reverse=True)
+        return items[:count]
+
+    def reset(self):
+        with self.lock:
+            self.handlers.clear()
+
+
+class StallWatchdog:
+    """Tk 事件循环卡顿检测
+
+    主线程按固定间隔用 after 打心跳，记录每次心跳实际晚到的时间；
+    辅助线程检查心跳是否停滞，超过阈值时抓取主线程当时的调用栈并写入日志，
+    从而知道是哪个回调卡住了界面。每次卡顿只抓取一次。
+    """
+    def __init__(self, root, interval=0.1, threshold=1.0, history=600, max_stalls=20):
+        self.root = root
+        self.interval = interval
+        self.threshold = max(interval * 2, float(threshold))
+        self.lags = deque(maxlen=history)
+        # [{'time': 开始时间, 'duration': 持续秒数, 'stack': 调用栈文本}, ...]
+        self.stalls = deque(maxlen=max_stalls)
+        self.stats = HandlerStats()
+        self.main_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.expected = None
+        self.open_stall = None
+        self.after_id = None
+        self.running = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.stop_event.clear()
+        self.last_beat = time.monotonic()
+        self.expected = self.last_beat + self.interval
+        self.after_id = self.root.after(int(self.interval * 1000), self.heartbeat)
+        self.thread = threading.Thread(target=self.monitor, name='StallWatchdog', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.stop_event.set()
+        if self.after_id is not None:
+            try:
+                self.root.after_cancel(self.after_id)
+            except Exception:
+                pass
+            self.after_id = None
+
+    def heartbeat(self):
+        """主线程心跳"""
+        now = time.monotonic()
+        self.lags.append(max(0.0, now - self.expected))
+        stall = self.open_stall
+        if stall is not None:
+            # 卡顿结束，记录实际持续时间
+            stall['duration'] = now - stall['start']
+            self.open_stall = None
+            logger.warning(f"界面卡顿 {stall['duration']:.2f} 秒")
+        self.last_beat = now
+        self.expected = now + self.interval
+        if self.running:
+            self.after_id = self.root.after(int(self.interval * 1000), self.heartbeat)
+
+    def monitor(self):
+        """辅助线程：心跳停滞超过阈值时抓取主线程调用栈"""
+        while not self.stop_event.wait(self.interval / 2):
+            last_beat = self.last_beat
+            stalled = time.monotonic() - last_beat
+            if stalled < self.threshold or self.open_stall is not None:
+                continue
+            if self.stalls and self.stalls[-1]['start'] == last_beat:
+                continue
+            frame = sys._current_frames().get(self.main_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+            stall = {
+                'start': last_beat,
+                'time': time.time() - stalled,
+                'duration': stalled,
+                'stack': stack,
+            }
+            self.stalls.append(stall)
+            self.open_stall = stall
+            logger.warning(f"界面已卡顿 {stalled:.2f} 秒，主线程调用栈：\n{stack}")
+
+    def lag_percentiles(self):
+        """最近心跳延迟的百分位（秒）"""
+        return percentiles(list(self.lags))
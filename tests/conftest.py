@@ -0,0 +1,14 @@
+import os
+import sys
+import logging
+import tempfile
+
+# 包的 __init__ 会导入托盘（pystray），没有图形环境时使用它自带的空后端
+os.environ.setdefault('PYSTRAY_BACKEND', 'dummy')
+
+# 导入主程序模块时会把日志写到程序目录下的 app.log，测试时先把日志指到临时目录，
+# 主程序的 logging.basicConfig 发现已有处理器就不再添加
+LOG_DIR = tempfile.mkdtemp(prefix='console_manager_test_')
+logging.basicConfig(level=logging.INFO, handlers=[logging.FileHandler(os.path.join(LOG_DIR, 'app.log'))])
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
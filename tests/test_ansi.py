@@ -0,0 +1,44 @@
+from console_manager.ansi import AnsiParser
+
+
+def test_sgr_sets_and_resets_tags():
+    parser = AnsiParser()
+    assert parser.feed('\x1b[1;31mERR\x1b[0m ok') == (
+        False, [('ERR', ('ansi_fg_1', 'ansi_bold')), (' ok', ())]
+    )
+    assert parser.feed('\x1b[4;44mx\x1b[24;49my') == (
+        False, [('x', ('ansi_bg_4', 'ansi_underline')), ('y', ())]
+    )
+
+
+def test_extended_colors_map_to_basic_colors():
+    parser = AnsiParser()
+    assert parser.feed('\x1b[91ma') == (False, [('a', ('ansi_fg_9',))])
+    assert parser.feed('\x1b[38;5;196mb') == (False, [('b', ('ansi_fg_1',))])
+    assert parser.feed('\x1b[39;48;2;0;0;0mc') == (False, [('c', ('ansi_bg_0',))])
+
+
+def test_escape_split_between_chunks():
+    parser = AnsiParser()
+    assert parser.feed('a\x1b[3') == (False, [('a', ())])
+    assert parser.feed('2mb') == (False, [('b', ('ansi_fg_2',))])
+
+
+def test_other_escapes_are_dropped():
+    parser = AnsiParser()
+    assert parser.feed('\x1b]0;title\x07te\x1b[2Kxt') == (False, [('text', ())])
+
+
+def test_carriage_return_keeps_last_rewrite():
+    parser = AnsiParser()
+    assert parser.feed('10%\r50%\r\x1b[32mdone') == (True, [('done', ('ansi_fg_2',))])
+
+
+def test_carriage_return_at_chunk_end_rewrites_next_chunk():
+    parser = AnsiParser()
+    assert parser.feed('abc\r') == (False, [('abc', ())])
+    assert parser.feed('xyz') == (True, [('xyz', ())])
+    # 回车状态不跨行保留
+    parser.feed('abc\r')
+    parser.end_line()
+    assert parser.feed('next') == (False, [('next', ())])
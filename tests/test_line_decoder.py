@@ -0,0 +1,80 @@
+import pytest
+
+from console_manager import line_decoder
+from console_manager.line_decoder import LineDecoder
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(line_decoder.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_lines_split_across_chunks():
+    decoder = LineDecoder('utf-8')
+    assert decoder.feed(b'first\nsec') == ['first']
+    assert decoder.feed(b'ond\r\nthird\n') == ['second', 'third']
+    assert decoder.finish() == ''
+
+
+def test_multibyte_character_split_between_chunks():
+    data = '中文输出\n'.encode('utf-8')
+    decoder = LineDecoder('utf-8')
+    lines = []
+    for index in range(len(data)):
+        lines.extend(decoder.feed(data[index:index + 1]))
+    assert lines == ['中文输出']
+
+    decoder = LineDecoder('gbk')
+    data = '状态\n'.encode('gbk')
+    assert decoder.feed(data[:1]) == []
+    assert decoder.feed(data[1:]) == ['状态']
+
+
+def test_invalid_bytes_are_replaced():
+    assert LineDecoder('utf-8').feed(b'\xff\xfeok\n') == ['��ok']
+
+
+def test_partial_flushed_after_idle(clock):
+    decoder = LineDecoder('utf-8')
+    decoder.feed(b'Password: ')
+    assert decoder.flush_partial(0.15) is None
+    clock[0] += 0.2
+    assert decoder.flush_partial(0.15) == 'Password: '
+    assert decoder.partial_time is None
+    assert decoder.flush_partial(0.15) is None
+
+
+def test_progress_bar_redrawn_faster_than_timeout_is_flushed(clock):
+    # 每 100 ms 重绘一次，比提前输出的等待时间短，也要按这一行开始的时间输出
+    decoder = LineDecoder('utf-8')
+    flushed = []
+    for percent in range(30):
+        assert decoder.feed(f'\rprogress {percent}%'.encode()) == []
+        text = decoder.flush_partial(0.15)
+        if text:
+            flushed.append(text)
+        clock[0] += 0.1
+    assert flushed
+    assert len(decoder.partial) < 40
+
+
+def test_trailing_carriage_return_kept_for_next_chunk(clock):
+    decoder = LineDecoder('utf-8')
+    decoder.feed(b'abc\r')
+    clock[0] += 1
+    assert decoder.flush_partial(0.15) == 'abc'
+    # 留下的 \r 不单独输出
+    clock[0] += 1
+    assert decoder.flush_partial(0.15) is None
+    assert decoder.feed(b'\nnext\n') == ['', 'next']
+
+
+def test_partial_size_cap_forces_flush(clock):
+    decoder = LineDecoder('utf-8', max_partial=16)
+    decoder.feed(b'x' * 10)
+    assert not decoder.partial_full
+    decoder.feed(b'x' * 10)
+    assert decoder.partial_full
+    assert decoder.flush_partial(0.15) == 'x' * 20
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from console_manager import output_rules
+from console_manager.output_rules import RuleSet
+
+RULES = [
+    {'pattern': r'\bERROR\b', 'tag': 'error'},
+    {'pattern': r'[Ww]arn(ing)?', 'tag': 'warning'},
+    {'pattern': r'code\s+\d+', 'foreground': '#ff0000'},
+    {'pattern': r'foo(?=\s)', 'bold': True},
+    {'pattern': r'^start', 'bold': True},
+    {'pattern': r'end$', 'bold': True},
+    {'pattern': 'KEY1', 'literal': True},
+    {'pattern': 'KEY12', 'literal': True},
+    {'pattern': r'timeout \d+', 'ignore_case': True},
+    {'pattern': r'ab+c'},
+    {'pattern': r'(?s)zz.*?qq'},
+]
+
+WORDS = ['ERROR', 'warn', 'Warning', 'code', '12', 'foo', 'start', 'end', 'KEY12', 'KEY1',
+         'TimeOut', '7', 'abbc', 'zz', 'qq', ' ', 'x', '']
+
+
+def random_lines(rng):
+    return [
+        ''.join(rng.choice(WORDS) + rng.choice(['', ' ']) for _ in range(rng.randrange(8)))
+        for _ in range(rng.randrange(1, 40))
+    ]
+
+
+@pytest.mark.parametrize('threshold', [output_rules.BLOCK_MATCH_THRESHOLD, 0])
+def test_scan_lines_matches_per_line_scan(monkeypatch, threshold):
+    # 阈值为 0 时所有规则都走整块匹配，包括跨行、断言等需要退回逐行的情况
+    monkeypatch.setattr(output_rules, 'BLOCK_MATCH_THRESHOLD', threshold)
+    rules = RuleSet(RULES)
+    rng = random.Random(1)
+    for _ in range(500):
+        lines = random_lines(rng)
+        assert rules.scan_lines(lines) == rules.scan_each(lines)
+
+
+def test_rules_use_own_tags():
+    rules = RuleSet([
+        {'pattern': 'a', 'tag': 'error'},
+        {'pattern': 'b', 'foreground': '#ff0000'},
+        {'pattern': 'c', 'action': 'bell'},
+    ])
+    assert [(rule.tag, rule.base_tag) for rule in rules.rules] == [
+        ('rule_0', 'error'), ('rule_1', None), (None, None)
+    ]
+
+
+def test_scan_without_regex_parser(monkeypatch):
+    # 标准库的私有语法树模块不可用时，正则规则不做预筛选，结果不变
+    monkeypatch.setattr(output_rules, 'sre_parse', None)
+    monkeypatch.setattr(output_rules, 'sre_constants', None)
+    rules = RuleSet(RULES)
+    assert all(rule.anchor == '' and not rule.line_local for rule in rules.rules if not rule.literal)
+    rng = random.Random(2)
+    for _ in range(200):
+        lines = random_lines(rng)
+        assert rules.scan_lines(lines) == rules.scan_each(lines)
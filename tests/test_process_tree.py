@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from console_manager.process_tree import ProcessTree, popen_options
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == 'win32' or not os.path.isdir('/proc'), reason='需要 /proc'
+)
+
+# 孙进程切换到新的会话，向进程组发信号找不到它，只能按 /proc 记录的父子关系结束
+ESCAPE = f"{sys.executable} -c 'import os, time; os.setsid(); time.sleep(30)'"
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def start(script):
+    process = subprocess.Popen(['sh', '-c', script], **popen_options())
+    return process, ProcessTree(process)
+
+
+def stop(process, tree):
+    """与控制台停止时相同：请求整棵树退出并等待控制台进程退出"""
+    tree.terminate()
+    process.wait(timeout=5)
+
+
+def test_stop_ends_grandchildren():
+    process, tree = start(f'sleep 30 & {ESCAPE} & wait')
+    try:
+        assert wait_until(lambda: len(tree.refresh()) >= 2)
+        stop(process, tree)
+        assert wait_until(lambda: not tree.survivors())
+    finally:
+        tree.kill()
+
+
+def test_stop_after_leader_exited():
+    # 包装脚本先退出，孙进程被收养，只能靠之前记录的进程号和启动时间找到
+    process, tree = start(f'sleep 30 & {ESCAPE} & sleep 0.3')
+    try:
+        assert wait_until(lambda: len(tree.refresh()) >= 2)
+        process.wait(timeout=5)
+        assert len(tree.survivors()) >= 2
+        stop(process, tree)
+        assert wait_until(lambda: not tree.survivors())
+    finally:
+        tree.kill()
+
+
+def test_reused_pid_is_not_expanded():
+    process, tree = start('exit 0')
+    process.wait(timeout=5)
+    unrelated = subprocess.Popen(['sleep', '30'])
+    try:
+        # 记录的进程号如今属于启动时间不同的进程（当前测试进程），它的子进程与控制台无关
+        tree.known = {os.getpid(): -1}
+        assert unrelated.pid not in tree.refresh()
+    finally:
+        unrelated.kill()
+        unrelated.wait()
+
+
+def test_no_group_signal_after_leader_reaped(monkeypatch):
+    process, tree = start('exit 0')
+    process.wait(timeout=5)
+    calls = []
+    monkeypatch.setattr(os, 'killpg', lambda pgid, sig: calls.append(pgid))
+    # 进程组里已没有记录的后代，控制台的进程号可能已被复用，不能向它的进程组发信号
+    tree.terminate()
+    assert calls == []
@@ -0,0 +1,62 @@
+from console_manager import render_budget
+from console_manager.render_budget import RenderBudget, format_size
+
+
+class Clock:
+    """可手动推进的 monotonic 时钟"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+def make_budget(monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(render_budget, 'time', clock)
+    return RenderBudget(**kwargs), clock
+
+
+def test_suppresses_after_line_budget_until_refilled(monkeypatch):
+    budget, clock = make_budget(monkeypatch, lines_per_second=10, bytes_per_second=10000)
+    assert all(budget.take_line(5) for _ in range(10))
+    assert not budget.take_line(5)
+    # 省略状态要等两个桶都补满才结束，省略的输出集中成一段
+    clock.now += 0.5
+    assert not budget.take_line(7)
+    clock.now += 1.0
+    assert budget.take_line(5)
+    assert budget.pop_summary() == (2, 12)
+    assert budget.pop_summary() is None
+    assert (budget.suppressed_lines, budget.suppressed_bytes) == (2, 12)
+
+
+def test_long_line_overdraws_byte_budget(monkeypatch):
+    budget, clock = make_budget(monkeypatch, lines_per_second=100, bytes_per_second=100)
+    assert budget.take_line(500)
+    assert not budget.take_line(1)
+    # 透支的字节补回并补满后恢复
+    clock.now += 5.0
+    assert budget.take_line(1)
+
+
+def test_continuation_bytes_count_against_budget(monkeypatch):
+    budget, _ = make_budget(monkeypatch, lines_per_second=100, bytes_per_second=100)
+    assert budget.take_line(10)
+    budget.take_bytes(90)
+    assert not budget.take_line(1)
+
+
+def test_from_config():
+    assert RenderBudget.from_config(False) is None
+    assert RenderBudget.from_config({'enabled': False}) is None
+    budget = RenderBudget.from_config({'lines_per_second': 50, 'burst': 2})
+    assert budget.line_capacity == 100
+    assert RenderBudget.from_config(None).line_rate == render_budget.DEFAULT_LINES_PER_SECOND
+
+
+def test_format_size():
+    assert format_size(512) == '512 B'
+    assert format_size(1536) == '1.5 KB'
+    assert format_size(3 * 1024 ** 2) == '3.0 MB'
+    assert format_size(5 * 1024 ** 4) == '5120.0 GB'
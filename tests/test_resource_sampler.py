@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from console_manager import resource_sampler
+from console_manager.resource_sampler import ProcBackend, ResourceSampler
+
+
+class ScriptedBackend:
+    """按顺序返回预先给定的采样结果"""
+    def __init__(self, samples):
+        self.samples = list(samples)
+
+    def sample(self, roots):
+        return {'tab': self.samples.pop(0)}
+
+
+def run(monkeypatch, samples):
+    clock = iter(range(0, 100, 2))
+    monkeypatch.setattr(resource_sampler.time, 'monotonic', lambda: next(clock))
+    sampler = ResourceSampler(backend=ScriptedBackend(samples))
+    sampler.track('tab', 1)
+    results = []
+    for _ in samples:
+        sampler.sample_once()
+        results.append(sampler.usage('tab').cpu_percent)
+    return results
+
+
+def test_new_process_counts_only_cpu_used_since_last_sample(monkeypatch):
+    # 采样间隔 2 秒；进程 2 在这段时间内启动，全部 CPU 时间都计入
+    results = run(monkeypatch, [
+        {(1, 0): (1.0, 0, 100.0)},
+        {(1, 0): (2.0, 0, 102.0), (2, 5): (1.0, 0, 1.5)},
+    ])
+    assert results == [None, pytest.approx(100.0)]
+
+
+def test_late_discovered_process_is_not_counted_at_once(monkeypatch):
+    # 进程 2 早已启动、这次才被采到，累计的 30 秒 CPU 不能算进这 2 秒，下一轮按差值计入
+    results = run(monkeypatch, [
+        {(1, 0): (1.0, 0, 100.0)},
+        {(1, 0): (1.0, 0, 102.0), (2, 5): (30.0, 0, 60.0)},
+        {(1, 0): (1.0, 0, 104.0), (2, 5): (31.0, 0, 62.0)},
+    ])
+    assert results == [None, 0.0, pytest.approx(50.0)]
+
+
+@pytest.mark.skipif(not ProcBackend.available(), reason='需要 /proc')
+def test_children_of_other_threads_are_found():
+    # 子进程由非主线程创建时只出现在该线程的 task/<tid>/children 中（线程退出前）
+    code = (
+        'import subprocess, sys, threading, time\n'
+        'threading.Thread(target=lambda: (subprocess.Popen(["sleep", "30"]), time.sleep(30))).start()\n'
+        'time.sleep(30)\n'
+    )
+    process = subprocess.Popen([sys.executable, '-c', code], start_new_session=True)
+    try:
+        backend = ProcBackend()
+        if not backend.children_supported:
+            pytest.skip('内核不提供 children 文件')
+        deadline = time.monotonic() + 5
+        while len(backend.sample({'tab': process.pid})['tab']) < 2:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+    finally:
+        os.killpg(process.pid, 9)
+        process.wait()
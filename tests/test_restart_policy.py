@@ -0,0 +1,39 @@
+from collections import deque
+
+from console_manager.restart_policy import RestartPolicy
+
+
+def test_backoff_grows_until_max_delay():
+    policy = RestartPolicy(mode='always', delay=1, max_delay=60, multiplier=2, jitter=0)
+    assert [policy.next_delay(attempt) for attempt in range(8)] == [1, 2, 4, 8, 16, 32, 60, 60]
+
+
+def test_backoff_does_not_overflow_after_many_restarts():
+    policy = RestartPolicy(mode='always', delay=1, max_delay=60, multiplier=2, jitter=0)
+    assert policy.next_delay(5000) == 60
+    # 不增长的配置同样不会出错
+    assert RestartPolicy(delay=3, multiplier=1, jitter=0).next_delay(10 ** 6) == 3
+    assert RestartPolicy(delay=0, jitter=0).next_delay(10 ** 6) == 0
+
+
+def test_jitter_stays_within_bounds():
+    policy = RestartPolicy(mode='always', delay=10, max_delay=10, jitter=0.2)
+    delays = [policy.next_delay(3) for _ in range(1000)]
+    assert all(8 <= delay <= 12 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_crash_looping_counts_restarts_in_window():
+    policy = RestartPolicy(mode='always', max_restarts=3, window=60)
+    history = deque([0, 10, 20])
+    assert policy.crash_looping(history, 30)
+    # 窗口外的记录被清除
+    assert not policy.crash_looping(history, 65)
+    assert list(history) == [10, 20]
+
+
+def test_from_config_accepts_mode_string():
+    policy = RestartPolicy.from_config('on-failure')
+    assert policy.should_restart(1)
+    assert not policy.should_restart(0)
+    assert RestartPolicy.from_config({'mode': 'bogus'}).mode == 'never'
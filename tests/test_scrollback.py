@@ -0,0 +1,56 @@
+from console_manager.scrollback import ScrollbackBuffer
+
+
+def texts(buffer):
+    return [text for text, _, _ in buffer.get_lines(buffer.first_serial, len(buffer))]
+
+
+def test_evicts_oldest_lines_over_line_limit():
+    buffer = ScrollbackBuffer(max_lines=3)
+    evicted = buffer.append(''.join(f'line {i}\n' for i in range(5)))
+    assert evicted == 2
+    assert texts(buffer) == ['line 2', 'line 3', 'line 4']
+    # 序号继续递增，不因淘汰改变
+    assert (buffer.first_serial, buffer.end_serial) == (2, 5)
+
+
+def test_evicts_oldest_lines_over_byte_limit():
+    buffer = ScrollbackBuffer(max_lines=100, max_bytes=20)
+    for i in range(6):
+        buffer.append(f'{i}-abcdef\n')
+    assert texts(buffer) == ['4-abcdef', '5-abcdef']
+    assert buffer.byte_size <= 20
+    # 超过字节上限的单行仍然保留
+    buffer.append('x' * 50 + '\n')
+    assert texts(buffer) == ['x' * 50]
+
+
+def test_byte_limit_counts_utf8_bytes():
+    buffer = ScrollbackBuffer(max_bytes=12)
+    buffer.append('中文\n中文\n中文\n')
+    assert len(buffer) == 2
+    assert buffer.byte_size == 12
+
+
+def test_configure_evicts_immediately():
+    buffer = ScrollbackBuffer()
+    buffer.append('a\nb\nc\nd\n')
+    buffer.configure(max_lines=2)
+    assert texts(buffer) == ['c', 'd']
+
+
+def test_eviction_survives_compaction():
+    buffer = ScrollbackBuffer(max_lines=10)
+    for i in range(5000):
+        buffer.append(f'{i}\n', 'error' if i % 2 else None)
+    assert texts(buffer) == [str(i) for i in range(4990, 5000)]
+    assert [tag for _, tag, _ in buffer.tail(2)] == [None, 'error']
+
+
+def test_carriage_return_rewrites_open_line():
+    buffer = ScrollbackBuffer()
+    buffer.append('progress 10%')
+    buffer.append('\rprogress 50%')
+    buffer.append('\rdone\n')
+    assert texts(buffer) == ['done']
+    assert not buffer.line_open
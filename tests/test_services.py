@@ -0,0 +1,176 @@
+import threading
+
+import pytest
+
+from console_manager.services import (
+    MISSING_TTL, RUNNING, START_PENDING, STOPPED, PollSchedule, ScBackend, ScReplayBackend,
+    ServiceBackend, ServiceMonitor, ServiceStatus, parse_sc_query
+)
+
+# 录制的 sc query type= service state= all 输出，第一页缓冲区不够，提示从索引 2 继续
+PAGE_1 = """
+SERVICE_NAME: AJRouter
+DISPLAY_NAME: AllJoyn Router Service
+        TYPE               : 20  WIN32_SHARE_PROCESS
+        STATE              : 1  STOPPED
+        WIN32_EXIT_CODE    : 1077  (0x435)
+        SERVICE_EXIT_CODE  : 0  (0x0)
+        CHECKPOINT         : 0x0
+        WAIT_HINT          : 0x0
+
+SERVICE_NAME: Appinfo
+DISPLAY_NAME: Application Information
+        TYPE               : 30  WIN32
+        STATE              : 4  RUNNING
+                                (STOPPABLE, NOT_PAUSABLE, IGNORES_SHUTDOWN)
+        WIN32_EXIT_CODE    : 0  (0x0)
+        SERVICE_EXIT_CODE  : 0  (0x0)
+        CHECKPOINT         : 0x0
+        WAIT_HINT          : 0x0
+[SC] EnumQueryServicesStatus: more data, need 1822 bytes start resume at index 2
+"""
+
+PAGE_2 = """
+SERVICE_NAME: W32Time
+DISPLAY_NAME: Windows Time
+        TYPE               : 20  WIN32_SHARE_PROCESS
+        STATE              : 2  START_PENDING
+                                (NOT_STOPPABLE, NOT_PAUSABLE, IGNORES_SHUTDOWN)
+        WIN32_EXIT_CODE    : 0  (0x0)
+        SERVICE_EXIT_CODE  : 0  (0x0)
+        CHECKPOINT         : 0x1
+        WAIT_HINT          : 0x7d0
+"""
+
+MISSING = "[SC] EnumQueryServicesStatus:OpenService FAILED 1060:\n\nThe specified service does not exist as an installed service.\n"
+
+
+class RecordedScBackend(ScBackend):
+    """按参数返回录制的 sc 输出，记录每次调用"""
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def run_sc(self, args, check=False):
+        self.calls.append(args)
+        if args[:2] == ['query', 'type=']:
+            return PAGE_2 if 'ri=' in args else PAGE_1
+        return MISSING
+
+
+def test_parse_sc_query():
+    statuses = parse_sc_query(PAGE_1)
+    assert sorted(statuses) == ['ajrouter', 'appinfo']
+    assert statuses['appinfo'].state == RUNNING
+    assert statuses['appinfo'].display_name == 'Application Information'
+    assert statuses['ajrouter'].state == STOPPED
+    assert parse_sc_query(MISSING) == {}
+
+
+def test_query_follows_resume_index_and_reports_missing():
+    backend = RecordedScBackend()
+    result = backend.query(['Appinfo', 'w32time', 'NoSuchService'])
+    assert result['Appinfo'].state == RUNNING
+    assert result['w32time'].state == 'START_PENDING'
+    assert result['NoSuchService'] is None
+    # 第二页从录制输出给出的索引继续，枚举中没有的名称单独查询一次
+    assert backend.calls[1][-2:] == ['ri=', '2']
+    assert backend.calls[2] == ['query', 'NoSuchService']
+    assert len(backend.calls) == 3
+
+
+def test_query_skips_names_known_to_be_missing():
+    backend = RecordedScBackend()
+    backend.query(['Appinfo', 'NoSuchService'])
+    # 下一次轮询只枚举，不再单独查询已确认不存在的名称
+    del backend.calls[:]
+    assert backend.query(['Appinfo', 'NoSuchService'])['NoSuchService'] is None
+    assert len(backend.calls) == 2
+    # 缓存过期后重新确认
+    backend.missing['nosuchservice'] -= MISSING_TTL
+    del backend.calls[:]
+    backend.query(['Appinfo', 'NoSuchService'])
+    assert backend.calls[-1] == ['query', 'NoSuchService']
+
+
+def test_query_without_names_runs_nothing():
+    backend = RecordedScBackend()
+    assert backend.query([]) == {}
+    assert backend.calls == []
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        ServiceBackend()
+
+
+def test_replay_backend_single_query():
+    backend = ScReplayBackend(text=PAGE_1)
+    assert backend.query(['appinfo'])['appinfo'].state == RUNNING
+    assert backend.query(['NoSuchService']) == {'NoSuchService': None}
+
+
+def test_monitor_merges_requests_from_different_callbacks():
+    backend = ScReplayBackend(text=PAGE_1 + PAGE_2)
+    posted = []
+    done = threading.Event()
+
+    def post(callback, *args):
+        posted.append((callback, args))
+        if len(posted) == 2:
+            done.set()
+
+    monitor = ServiceMonitor(backend, post)
+
+    def poll(statuses, error):
+        pass
+
+    def check(statuses, error):
+        pass
+
+    # 后台线程启动前登记的两个请求合并成一次查询，各自只收到自己请求的服务
+    monitor.refresh(['AJRouter', 'Appinfo'], poll)
+    monitor.refresh(['NoSuchService'], check)
+    monitor.start()
+    try:
+        assert done.wait(5)
+    finally:
+        monitor.stop()
+    results = {callback: args for callback, args in posted}
+    assert sorted(results[poll][0]) == ['AJRouter', 'Appinfo']
+    assert results[check] == ({'NoSuchService': None}, None)
+
+
+def test_poll_interval_doubles_while_stable():
+    schedule = PollSchedule(fast_interval=1, slow_interval=30, settle=10)
+    statuses = {'a': ServiceStatus('a', RUNNING)}
+    assert [schedule.next_interval(statuses, False, 100 + i) for i in range(7)] == [2, 4, 8, 16, 30, 30, 30]
+
+
+def test_poll_change_keeps_fast_interval_while_settling():
+    schedule = PollSchedule(fast_interval=1, slow_interval=30, settle=10)
+    statuses = {'a': ServiceStatus('a', STOPPED)}
+    for _ in range(6):
+        schedule.next_interval(statuses, False, 0)
+    assert schedule.next_interval(statuses, True, 100) == 1
+    assert schedule.next_interval(statuses, False, 109) == 1
+    assert schedule.next_interval(statuses, False, 110) == 2
+    # 手动操作服务同样切换到快速轮询
+    schedule.boost(200)
+    assert schedule.interval == 1
+    assert schedule.next_interval(statuses, False, 205) == 1
+
+
+def test_poll_pending_state_keeps_fast_interval():
+    schedule = PollSchedule(fast_interval=1, slow_interval=30, settle=0)
+    statuses = {'a': ServiceStatus('a', START_PENDING), 'gone': None}
+    assert [schedule.next_interval(statuses, False, 100 + i) for i in range(3)] == [1, 1, 1]
+    statuses['a'] = ServiceStatus('a', RUNNING)
+    assert schedule.next_interval(statuses, False, 104) == 2
+
+
+def test_poll_schedule_from_config_clamps_intervals():
+    schedule = PollSchedule.from_config({'fast_interval': 0.01, 'slow_interval': 0.1, 'settle': -5})
+    assert (schedule.fast_interval, schedule.slow_interval, schedule.settle) == (0.2, 0.2, 0.0)
+    schedule = PollSchedule.from_config(None)
+    assert (schedule.fast_interval, schedule.slow_interval, schedule.settle) == (1.0, 30.0, 10.0)
@@ -0,0 +1,131 @@
+from console_manager.startup import StartupScheduler
+
+
+class FakeTab:
+    def __init__(self, app, name, config):
+        self.app = app
+        self.name = name
+        self.config = config
+        self.is_running = False
+        self.is_stopping = False
+        self.ready_check = None
+        self.output = []
+
+    def run(self):
+        if not self.config.get('fails'):
+            self.is_running = True
+        self.app.launched.append(self.name)
+
+    def append_output(self, text, tag=None):
+        self.output.append(text)
+
+
+class FakeApp:
+    """StartupScheduler 用到的主程序接口，root.after 和 post 的回调由 drain 执行"""
+    def __init__(self, consoles):
+        self.consoles = consoles
+        self.current_tabs = {name: FakeTab(self, name, config) for name, config in consoles.items()}
+        self.launched = []
+        self.callbacks = []
+        self.root = self
+        self.output_dispatcher = self
+        self.io_loop = None
+
+    def after(self, delay, callback):
+        self.callbacks.append((callback, ()))
+
+    def post(self, callback, *args):
+        self.callbacks.append((callback, args))
+
+    def drain(self):
+        while self.callbacks:
+            callback, args = self.callbacks.pop(0)
+            callback(*args)
+
+
+def waits_for_output(**config):
+    return dict(config, ready={'output': 'listening', 'timeout': 0})
+
+
+def test_starts_dependencies_first():
+    app = FakeApp({
+        'web': {'depends_on': 'api'},
+        'api': {'depends_on': ['db']},
+        'db': {},
+        'other': {},
+    })
+    StartupScheduler(app).start(['web'])
+    app.drain()
+    assert app.launched == ['db', 'api', 'web']
+
+
+def test_waits_for_readiness_before_starting_dependents():
+    app = FakeApp({'db': waits_for_output(), 'api': {'depends_on': 'db'}})
+    scheduler = StartupScheduler(app)
+    scheduler.start(['api'])
+    app.drain()
+    assert app.launched == ['db']
+    app.current_tabs['db'].ready_check.feed_line('db listening on 5432')
+    app.drain()
+    assert app.launched == ['db', 'api']
+    assert 'db' in scheduler.ready
+
+
+def test_cycles_are_not_started():
+    app = FakeApp({'a': {'depends_on': 'b'}, 'b': {'depends_on': 'a'}, 'c': {}})
+    StartupScheduler(app).start(['a', 'b', 'c'])
+    app.drain()
+    assert app.launched == ['c']
+    for name in ('a', 'b'):
+        assert any('循环依赖' in text for text in app.current_tabs[name].output)
+
+
+def test_missing_dependency_is_reported():
+    app = FakeApp({'api': {'depends_on': 'nope'}})
+    StartupScheduler(app).start(['api'])
+    app.drain()
+    assert app.launched == []
+    assert any('依赖 nope 无法启动' in text for text in app.current_tabs['api'].output)
+
+
+def test_dependents_of_a_failed_launch_are_skipped():
+    app = FakeApp({'db': {'fails': True}, 'api': {'depends_on': 'db'}})
+    StartupScheduler(app).start(['api'])
+    app.drain()
+    assert app.launched == ['db']
+    assert any('启动失败' in text for text in app.current_tabs['db'].output)
+    assert any('依赖 db 未就绪' in text for text in app.current_tabs['api'].output)
+
+
+def test_dependents_of_a_failed_readiness_check_are_skipped():
+    # 就绪超时后依赖的进程仍在运行，依赖它的控制台也不能启动
+    app = FakeApp({'db': waits_for_output(), 'api': {'depends_on': 'db'}})
+    scheduler = StartupScheduler(app)
+    scheduler.start(['api'])
+    app.current_tabs['db'].ready_check.fail('60 秒内未就绪')
+    app.drain()
+    assert app.launched == ['db']
+    assert app.current_tabs['db'].is_running
+    assert any('依赖 db 未就绪' in text for text in app.current_tabs['api'].output)
+    assert not scheduler.waiting and not scheduler.starting
+
+
+def test_max_parallel_limits_consoles_waiting_for_readiness():
+    app = FakeApp({f's{i}': waits_for_output() for i in range(5)})
+    scheduler = StartupScheduler(app, max_parallel=2)
+    scheduler.start(list(app.consoles))
+    app.drain()
+    assert app.launched == ['s0', 's1']
+    app.current_tabs['s0'].ready_check.feed_line('listening')
+    app.drain()
+    assert app.launched == ['s0', 's1', 's2']
+    assert sorted(scheduler.starting) == ['s1', 's2']
+
+
+def test_max_parallel_spreads_launches_across_event_loop_turns():
+    app = FakeApp({f's{i}': {} for i in range(5)})
+    scheduler = StartupScheduler(app, max_parallel=2)
+    scheduler.start(list(app.consoles))
+    assert app.launched == ['s0', 's1']
+    app.drain()
+    assert app.launched == ['s0', 's1', 's2', 's3', 's4']